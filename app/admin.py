@@ -1,5 +1,5 @@
 from django.contrib import admin
-from app.models import Admin, AttendanceBook, AttendanceRecord, Course, CustomUser, Department, Notification, Student, Teacher
+from app.models import Admin, AttendanceBook, AttendanceRecord, AttendanceSession, AttendanceSummary, Course, CustomUser, Department, ImportJob, Notification, SmsJob, SmsMessage, Student, Teacher
 from django.urls import path
 from django.utils.translation import gettext_lazy as _
 from import_export.admin import ImportExportModelAdmin
@@ -34,6 +34,11 @@ admin.site.register(Teacher)
 # admin.site.register(Student)
 admin.site.register(AttendanceBook)
 admin.site.register(AttendanceRecord)
+admin.site.register(AttendanceSession)
+admin.site.register(AttendanceSummary)
 admin.site.register(Department)
 admin.site.register(Course)
 admin.site.register(Notification)
+admin.site.register(SmsJob)
+admin.site.register(SmsMessage)
+admin.site.register(ImportJob)
@@ -0,0 +1,70 @@
+# Term-end analytics from a history file written by app.history.export_attendance_history.
+# Nothing here touches the database; the reports are pandas group-bys over the file. Needs pandas and pyarrow.
+
+# Standard reports: name -> columns the marks are grouped by
+REPORTS = {
+    'weekday': ['weekday'],
+    'session': ['session'],
+    'subject': ['book_code', 'book_name'],
+    'section': ['course_id', 'year', 'section'],
+    'department': ['department'],
+    'week': ['week'],
+    'student': ['userid', 'course_id', 'year', 'section'],
+}
+
+NO_DEPARTMENT = 'No Department'
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+
+def load_history(path, columns=None):
+    """Read a history file into a DataFrame with the derived weekday, week, attended_hours and absent columns."""
+    import numpy as np
+    import pandas as pd
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+
+    if str(path).endswith('.parquet'):
+        table = pq.read_table(path, columns=columns)
+    else:
+        table = feather.read_table(path, columns=columns)
+    # Repeated strings (sections, subjects, sessions) become categoricals, which group fastest
+    history = table.to_pandas(strings_to_categorical=True)
+    for column in history.select_dtypes('category'):
+        history[column] = history[column].cat.reorder_categories(sorted(history[column].cat.categories))
+
+    if 'department' in history and history['department'].isna().any():
+        # Books without a teacher department get a group of their own, labelled as in the shortage list
+        history['department'] = history['department'].astype(object).fillna(NO_DEPARTMENT).astype('category')
+
+    if 'date' in history:
+        dates = pd.to_datetime(history['date'])
+        history['weekday'] = pd.Categorical.from_codes(dates.dt.dayofweek.to_numpy(), categories=WEEKDAYS, ordered=True)
+        history['week'] = dates.dt.to_period('W-SUN').dt.start_time.dt.date
+    if 'present' in history and 'weight' in history:
+        # Hours a student attended: the weight of the book when present, nothing when absent.
+        # The file stores weights as int8; widen them so the sums cannot overflow.
+        history['weight'] = history['weight'].astype(np.int64)
+        history['attended_hours'] = np.where(history['present'].to_numpy(), history['weight'].to_numpy(), 0)
+        history['absent'] = ~history['present']
+    return history
+
+
+def attendance_report(history, by):
+    """Weighted attendance grouped by the columns in by: sessions, absences, hours and percentage.
+
+    Missing values form a group of their own rather than being dropped.
+    """
+    report = history.groupby(by, observed=True, sort=True, dropna=False).agg(
+        sessions=('present', 'size'),
+        absences=('absent', 'sum'),
+        attended_hours=('attended_hours', 'sum'),
+        total_hours=('weight', 'sum'),
+    )
+    report['percentage'] = (report['attended_hours'] * 100 / report['total_hours']).round(2)
+    return report.reset_index()
+
+
+def standard_reports(history, names=None):
+    """{report name: DataFrame} for the named reports, all of them by default."""
+    return {name: attendance_report(history, REPORTS[name]) for name in names or REPORTS}
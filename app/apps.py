@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class AppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app'
+
+    def ready(self):
+        # Connect the cache invalidation and search receivers
+        from app import signals  # noqa: F401
+        from app.search import fill_student_search
+        post_migrate.connect(fill_student_search, sender=self)
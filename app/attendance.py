@@ -0,0 +1,285 @@
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Case, Count, F, IntegerField, Q, Sum, Value, When, Window
+from django.db.models.functions import Cast
+
+from app.models import AttendanceBook, AttendanceRecord, AttendanceSession, AttendanceSummary
+from app.packed import book_marks, mark_packed_attendance, packed_summaries, take_packed_session
+from app.search import STUDENTS_VERSION
+from app.signals import bulk_saved
+from app.versions import book_cache_key
+
+logger = logging.getLogger(__name__)
+
+
+class QueryCounter:
+    """Counts the queries run on a connection while installed as an execute wrapper."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+# Restrict a queryset of attendance records to the sessions after (date, session)
+def after_session(queryset, date, session):
+    return queryset.filter(Q(date__gt=date) | Q(date=date, session__gt=session))
+
+
+# Annotate attendance records with their running present hours within (book, student)
+def with_running_count(queryset):
+    """Annotate ``running_count``: the weighted present hours of the student in the book up to and including the row.
+
+    This is the value ``AttendanceRecord.count`` holds, derived with a window
+    function over the (date, session) order instead of being trusted. Only
+    row-stored sessions are counted; the sessions of a book stored as packed
+    bitsets have no rows to carry a count.
+    """
+    weight = Cast('attendance_book__book_type', IntegerField())
+    return queryset.annotate(running_count=Window(
+        Sum(Case(When(status=True, then=weight), default=Value(0))),
+        partition_by=[F('attendance_book_id'), F('student_id')],
+        order_by=[F('date').asc(), F('session').asc()],
+    ))
+
+
+# Mark (or re-mark) one session of an attendance book for every enrolled student
+def mark_book_attendance(attendance_book, date, session, present_userids):
+    """Upsert the attendance rows of one (book, date, session) in a constant number of queries.
+
+    The book's AttendanceSummary rows are updated with the difference in the
+    same transaction, and so are the running ``count`` of the marked rows and
+    of any later rows of the same students (see ``with_running_count``; the
+    count leaves out the book's packed sessions, which the summary includes).
+    Returns a summary dict with the number of rows created/updated and the
+    number of queries the whole operation took. Books with packed storage
+    are marked by ``mark_packed_attendance`` instead, and a session marked
+    while the book was packed is converted into rows here, so each session
+    is stored in one layout only.
+    """
+    if attendance_book.storage == 'packed':
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            result = mark_packed_attendance(attendance_book, date, session, present_userids)
+        result['queries'] = counter.count
+        logger.debug('Marked packed attendance for book %s on %s session %s: %s', attendance_book.pk, date, session, result)
+        return result
+
+    present_userids = set(present_userids)
+    increment_value = int(attendance_book.book_type)
+
+    counter = QueryCounter()
+    with connection.execute_wrapper(counter):
+        with transaction.atomic():
+            # Marks of one book are serialized on its row, before anything is read: the summaries of a
+            # new book do not exist yet to be locked, and a session read as unmarked must stay so
+            list(AttendanceBook.objects.select_for_update().filter(pk=attendance_book.pk).values_list('pk'))
+
+            # Enrolled students as (student pk, userid) pairs
+            students = list(attendance_book.students.values_list('user_id', 'user__userid'))
+            student_ids = [student_id for student_id, _ in students]
+
+            # Rows already marked for this session
+            existing_rows = dict(AttendanceRecord.objects.filter(
+                attendance_book=attendance_book,
+                date=date,
+                session=session,
+            ).values_list('student_id', 'status'))
+            # The session marked while the book was packed is converted into rows; its marks count as existing
+            packed_marks = take_packed_session(attendance_book, date, session)
+            existing = {**existing_rows, **packed_marks}
+
+            # Present hours of the book's other packed sessions: in the summaries but not in the running count
+            packed_hours = {
+                student_id: attended_hours
+                for (book_id, student_id), (attended_hours, total_hours) in packed_summaries(book_ids=[attendance_book.pk]).items()
+            } if AttendanceSession.objects.filter(attendance_book=attendance_book).exists() else {}
+
+            # Current summaries, locked until the new marks are written
+            summaries = {
+                summary.student_id: summary
+                for summary in AttendanceSummary.objects.select_for_update().filter(attendance_book=attendance_book)
+            }
+
+            # Rows of this book marked after this session; empty unless back-dating or re-marking
+            later_marks = {
+                student_id: (later, later_present)
+                for student_id, later, later_present in after_session(
+                    AttendanceRecord.objects.filter(attendance_book=attendance_book), date, session
+                ).values('student_id').annotate(
+                    later=Count('id'),
+                    later_present=Count('id', filter=Q(status=True)),
+                ).values_list('student_id', 'later', 'later_present')
+            }
+
+            records = []
+            shift_up = []
+            shift_down = []
+            for student_id, userid in students:
+                status = userid in present_userids
+                summary = summaries.setdefault(student_id, AttendanceSummary(
+                    attendance_book=attendance_book,
+                    student_id=student_id,
+                ))
+                if student_id not in existing:
+                    summary.total_hours += increment_value
+                    delta = increment_value if status else 0
+                elif existing[student_id] != status:
+                    delta = increment_value if status else -increment_value
+                else:
+                    delta = 0
+                summary.attended_hours += delta
+
+                # Later rows move with the present hours of this session's row, which a converted mark did not have
+                later, later_present = later_marks.get(student_id, (0, 0))
+                if later and status and not existing_rows.get(student_id):
+                    shift_up.append(student_id)
+                elif later and not status and existing_rows.get(student_id):
+                    shift_down.append(student_id)
+
+                records.append(AttendanceRecord(
+                    attendance_book=attendance_book,
+                    student_id=student_id,
+                    date=date,
+                    session=session,
+                    status=status,
+                    count=summary.attended_hours - packed_hours.get(student_id, 0) - later_present * increment_value,
+                ))
+
+            # Converted marks of students who have left the book are kept as they were
+            enrolled = set(student_ids)
+            carried = []
+            for student_id, status in packed_marks.items():
+                if student_id in enrolled:
+                    continue
+                later, later_present = later_marks.get(student_id, (0, 0))
+                if later and status:
+                    shift_up.append(student_id)
+                carried.append(AttendanceRecord(
+                    attendance_book=attendance_book,
+                    student_id=student_id,
+                    date=date,
+                    session=session,
+                    status=status,
+                    count=(summaries[student_id].attended_hours if student_id in summaries else 0)
+                    - packed_hours.get(student_id, 0) - later_present * increment_value,
+                ))
+
+            AttendanceRecord.objects.bulk_create(
+                records + carried,
+                update_conflicts=True,
+                unique_fields=['attendance_book', 'student', 'date', 'session'],
+                update_fields=['status', 'count'],
+            )
+            AttendanceSummary.objects.bulk_create(
+                [summaries[student_id] for student_id in student_ids],
+                update_conflicts=True,
+                unique_fields=['attendance_book', 'student'],
+                update_fields=['attended_hours', 'total_hours'],
+            )
+
+            # Keep the running count of later rows in step with the change
+            later_rows = after_session(AttendanceRecord.objects.filter(attendance_book=attendance_book), date, session)
+            if shift_up:
+                later_rows.filter(student_id__in=shift_up).update(count=F('count') + increment_value)
+            if shift_down:
+                later_rows.filter(student_id__in=shift_down).update(count=F('count') - increment_value)
+
+            bulk_saved.send(sender=AttendanceRecord, attendance_book=attendance_book, date=date, session=session)
+
+    updated = len(existing.keys() & set(student_ids))
+    result = {
+        'created': len(records) - updated,
+        'updated': updated,
+        'present': sum(1 for record in records if record.status),
+        'absent': sum(1 for record in records if not record.status),
+        'queries': counter.count,
+    }
+    logger.debug('Marked attendance for book %s on %s session %s: %s', attendance_book.pk, date, session, result)
+    return result
+
+
+# Build the student x (date, session) attendance grid of a book
+def build_attendance_matrix(attendance_book):
+    """Return the attendance grid of a book in four queries (five with packed sessions), ready for the templates.
+
+    The result holds the ordered (date, session) ``columns``, the weighted
+    ``total_sessions`` and one row per enrolled student with its ``cells``
+    ('P', 'A' or None when not marked), weighted ``count`` and ``percentage``.
+    """
+    increment_value = int(attendance_book.book_type)
+    students = attendance_book.students.select_related('user').order_by('user__userid')
+
+    # Every mark of the book as plain tuples, in column order, from rows and packed sessions alike
+    marks = book_marks(attendance_book)
+
+    columns = {}
+    statuses = {}
+    for student_id, date, session, status in marks:
+        column = columns.setdefault((date, session), len(columns))
+        statuses[(student_id, column)] = 'P' if status else 'A'
+
+    # Weighted present hours per student from the maintained summaries
+    attended_hours = dict(AttendanceSummary.objects.filter(
+        attendance_book=attendance_book,
+    ).values_list('student_id', 'attended_hours'))
+
+    total_sessions = len(columns) * increment_value
+    rows = []
+    for student in students:
+        count = attended_hours.get(student.pk, 0)
+        rows.append({
+            'student': student,
+            'cells': [statuses.get((student.pk, column)) for column in range(len(columns))],
+            'count': count,
+            'percentage': round(count / total_sessions * 100, 2) if total_sessions > 0 else 0,
+        })
+
+    return {
+        'columns': list(columns),
+        'rows': rows,
+        'total_sessions': total_sessions,
+    }
+
+
+def get_attendance_matrix(attendance_book):
+    """Cached build_attendance_matrix, rebuilt after the book is marked or its students change."""
+    return cache.get_or_set(
+        book_cache_key(f'attendance-matrix:{attendance_book.pk}', [attendance_book.pk], STUDENTS_VERSION),
+        lambda: build_attendance_matrix(attendance_book),
+        getattr(settings, 'ATTENDANCE_CACHE_TIMEOUT', 86400),
+    )
+
+
+# Recompute every AttendanceSummary row from the raw attendance records
+def compute_attendance_summaries(book_ids=None):
+    """Return {(book_id, student_id): (attended_hours, total_hours)} aggregated from the rows and packed sessions.
+
+    Covers every book by default, or only the books in book_ids.
+    """
+    weights = {
+        book_id: int(book_type)
+        for book_id, book_type in AttendanceBook.objects.values_list('id', 'book_type')
+    }
+    records = AttendanceRecord.objects.all()
+    if book_ids is not None:
+        records = records.filter(attendance_book_id__in=list(book_ids))
+    totals = records.values('attendance_book_id', 'student_id').annotate(
+        attended=Count('id', filter=Q(status=True)),
+        total=Count('id'),
+    ).values_list('attendance_book_id', 'student_id', 'attended', 'total')
+
+    summaries = {
+        (book_id, student_id): (attended * weights[book_id], total * weights[book_id])
+        for book_id, student_id, attended, total in totals
+    }
+    for key, (attended_hours, total_hours) in packed_summaries(book_ids=book_ids).items():
+        row_attended, row_total = summaries.get(key, (0, 0))
+        summaries[key] = (row_attended + attended_hours, row_total + total_hours)
+    return summaries
+
@@ -0,0 +1,61 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from app.models import HOD, Admin, AttendanceBook, AttendanceRecord, AttendanceSession, Course, Department, Student, Teacher
+
+
+# Cache key of the admin dashboard counters; today's date is part of it so the absentee count rolls over at midnight
+def dashboard_cache_key(today=None):
+    return f'admin_dashboard_counts:{today or timezone.now().date()}'
+
+
+def compute_dashboard_counts(today):
+    # Books stored as packed sessions have one AttendanceSession per marked session instead of records
+    packed_sessions = AttendanceSession.objects.filter(date=today)
+    absent_students = AttendanceRecord.objects.filter(
+        date=today,
+        status=False
+    ).values('student').distinct()
+    if packed_sessions.exists():
+        # Imported here: app.packed imports the signals module, which imports this one
+        from app.packed import packed_absences
+        absent_today = set(absent_students.values_list('student', flat=True))
+        absent_today.update(absence['student_id'] for absence in packed_absences(today, today))
+        absent_students_today = len(absent_today)
+    else:
+        absent_students_today = absent_students.count()
+    return {
+        'total_students': Student.objects.count(),
+        'total_teachers': Teacher.objects.count(),
+        'total_admins': Admin.objects.count(),
+        'total_hods': HOD.objects.count(),
+        'total_attendance_books': AttendanceBook.objects.count(),
+        'total_departments': Department.objects.count(),
+        'total_courses': Course.objects.count(),
+        # Students absent for at least one session today
+        'absent_students_today': absent_students_today,
+        # (book, session) pairs marked today, and books nobody has marked yet today
+        'sessions_marked_today': AttendanceRecord.objects.filter(
+            date=today
+        ).values('attendance_book', 'session').distinct().count() + packed_sessions.count(),
+        'books_unmarked_today': AttendanceBook.objects.filter(
+            ~Exists(AttendanceRecord.objects.filter(attendance_book=OuterRef('pk'), date=today)),
+            ~Exists(packed_sessions.filter(attendance_book=OuterRef('pk'))),
+        ).count(),
+    }
+
+
+def get_dashboard_counts():
+    """Dashboard counters from the cache, recomputed when a signal dropped them or the TTL ran out."""
+    today = timezone.now().date()
+    return cache.get_or_set(
+        dashboard_cache_key(today),
+        lambda: compute_dashboard_counts(today),
+        settings.DASHBOARD_CACHE_TIMEOUT,
+    )
+
+
+def invalidate_dashboard_counts(**kwargs):
+    cache.delete(dashboard_cache_key())
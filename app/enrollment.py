@@ -0,0 +1,89 @@
+from django.db import connection
+from django.db.models import IntegerField, Q, Value
+from django.db.models.constants import OnConflict
+
+from app.models import AttendanceBook, Student
+from app.signals import bulk_saved
+
+# Student fields a roster rule may constrain
+ROSTER_RULE_FIELDS = {'course': 'course_id', 'year': 'year', 'section': 'section'}
+
+
+# Students matched by any of the rules, e.g. [{'course': 'BCA', 'year': '2', 'section': 'A'}]
+def roster_queryset(rules):
+    """Union of the rules; a rule matches students equal on every field it names.
+
+    Raises ValueError for an unknown field or a rule that names no field,
+    which would otherwise enroll every student.
+    """
+    condition = Q(pk__in=[])
+    for rule in rules:
+        unknown = set(rule) - set(ROSTER_RULE_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown roster rule fields: {', '.join(sorted(unknown))}")
+        lookups = {ROSTER_RULE_FIELDS[field]: value for field, value in rule.items() if value}
+        if not lookups:
+            raise ValueError('A roster rule needs at least one of course, year or section.')
+        condition |= Q(**lookups)
+    return Student.objects.filter(condition)
+
+
+def enroll_students(attendance_book, students):
+    """Add the students of a queryset to the book with one INSERT ... SELECT; return how many were added.
+
+    The selection runs in the database, so no ids travel to Python and back;
+    students already in the book are skipped.
+    """
+    through = AttendanceBook.students.through
+    selection = students.exclude(attendancebook=attendance_book).annotate(
+        enrolled_book_id=Value(attendance_book.pk, output_field=IntegerField()),
+    ).values_list('pk', 'enrolled_book_id')
+    select_sql, params = selection.query.sql_with_params()
+
+    # Same order as the SELECT, where the model column comes before the annotation
+    fields = [through._meta.get_field('student'), through._meta.get_field('attendancebook')]
+    # A concurrent enrollment of the same student is ignored rather than failing on the unique pair
+    insert = connection.ops.insert_statement(on_conflict=OnConflict.IGNORE)
+    suffix = connection.ops.on_conflict_suffix_sql(fields, OnConflict.IGNORE, None, None)
+    columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'{insert} {connection.ops.quote_name(through._meta.db_table)} ({columns}) {select_sql} {suffix}',
+            params,
+        )
+        added = cursor.rowcount
+    bulk_saved.send(sender=AttendanceBook.students.through, attendance_book=attendance_book)
+    return added
+
+
+def enroll_by_rules(attendance_book, rules):
+    return enroll_students(attendance_book, roster_queryset(rules))
+
+
+def add_students(attendance_book, userids):
+    return enroll_students(attendance_book, Student.objects.filter(user__userid__in=list(userids)))
+
+
+def remove_students(attendance_book, userids):
+    """Drop the given students from the book, leaving every other enrollment row untouched."""
+    through = AttendanceBook.students.through
+    removed, _ = through.objects.filter(
+        attendancebook=attendance_book,
+        student__user__userid__in=list(userids),
+    ).delete()
+    bulk_saved.send(sender=AttendanceBook.students.through, attendance_book=attendance_book)
+    return removed
+
+
+def set_roster(attendance_book, rules, userids):
+    """Make the book's students exactly those matched by the rules plus the given students; return (added, removed).
+
+    Only the difference is written: missing students are inserted with
+    enroll_students and students no longer listed are deleted, so the rows
+    of students who stay are untouched.
+    """
+    roster = Student.objects.filter(Q(pk__in=roster_queryset(rules)) | Q(user__userid__in=list(userids)))
+    through = AttendanceBook.students.through
+    removed, _ = through.objects.filter(attendancebook=attendance_book).exclude(student__in=roster).delete()
+    added = enroll_students(attendance_book, roster)
+    return added, removed
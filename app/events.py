@@ -0,0 +1,71 @@
+import asyncio
+import json
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+def deliver(queue, event):
+    # A client that stopped reading loses its oldest events rather than growing the queue
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(event)
+
+
+# Fan-out of dashboard events to the async subscribers of this process
+class InProcessBroker:
+    """Publish from any thread, consume from the event loop of each subscriber.
+
+    Only subscribers in the publishing process see an event; a broker with the
+    same interface over Redis pub/sub can be set in DASHBOARD_EVENT_BROKER
+    when the app runs in several processes.
+    """
+
+    def __init__(self, max_queue=100):
+        self.max_queue = max_queue
+        self.lock = threading.Lock()
+        self.subscribers = set()
+
+    def subscribe(self):
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(maxsize=self.max_queue))
+        with self.lock:
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def publish(self, event_type, data=None):
+        event = {'type': event_type, 'data': data or {}}
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            loop, queue = subscriber
+            try:
+                loop.call_soon_threadsafe(deliver, queue, event)
+            except RuntimeError:
+                # The subscriber's loop is closed
+                self.unsubscribe(subscriber)
+
+    async def listen(self, subscriber, timeout):
+        """Next event of the subscriber, or None if nothing arrived within timeout seconds."""
+        try:
+            return await asyncio.wait_for(subscriber[1].get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def drain(self, subscriber):
+        """Events already queued for the subscriber, without waiting."""
+        events = []
+        while not subscriber[1].empty():
+            events.append(subscriber[1].get_nowait())
+        return events
+
+
+def format_sse(event_type, data):
+    return f'event: {event_type}\ndata: {json.dumps(data, default=str)}\n\n'
+
+
+broker = import_string(getattr(settings, 'DASHBOARD_EVENT_BROKER', 'app.events.InProcessBroker'))()
@@ -1,5 +1,6 @@
 from django import forms
-from django.contrib.auth.forms import AuthenticationForm, UserCreationForm
+from django.conf import settings
+from django.contrib.auth.forms import AuthenticationForm, PasswordChangeForm, UserCreationForm
 from django import forms
 from app.models import Admin, AttendanceBook, CustomUser, Notification, Student, Teacher, Department, Course
 
@@ -98,7 +99,7 @@ class AddCourseForm(forms.ModelForm):
 class AttendanceBookForm(forms.ModelForm):
     class Meta:
         model = AttendanceBook
-        fields = ['name', 'book_code', 'book_type']
+        fields = ['name', 'book_code', 'book_type', 'storage']
 
 class TeacherCSVUploadForm(forms.Form):
     csv_file = forms.FileField(
@@ -143,3 +144,55 @@ class NotificationForm(forms.ModelForm):
             'attachment_link': forms.URLInput(attrs={'class': 'form-control', 'placeholder': 'Attachment Link (optional)'}),
         }
 
+
+
+class AttendanceReportForm(forms.Form):
+    from_date = forms.DateField(widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}))
+    to_date = forms.DateField(widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}))
+    department = forms.ModelChoiceField(
+        queryset=Department.objects.all(), required=False, empty_label='All Departments',
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    course = forms.ModelChoiceField(
+        queryset=Course.objects.all(), required=False, empty_label='All Courses',
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    year = forms.ChoiceField(
+        choices=[('', 'All Years')] + list(Student.YEAR_CHOICES), required=False,
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    section = forms.CharField(
+        max_length=10, required=False,
+        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'All Sections'})
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        from_date = cleaned_data.get('from_date')
+        to_date = cleaned_data.get('to_date')
+        if from_date and to_date and from_date > to_date:
+            raise forms.ValidationError("From date must be on or before To date.")
+        return cleaned_data
+
+
+class ShortageReportForm(AttendanceReportForm):
+    threshold = forms.DecimalField(
+        min_value=0, max_value=100, decimal_places=2,
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'})
+    )
+    # Without dates the shortage is taken over everything marked so far
+    from_date = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}))
+    to_date = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}))
+
+
+# Password change that also ends the forced change of an imported account
+class AccountPasswordChangeForm(PasswordChangeForm):
+    def clean_new_password1(self):
+        password = self.cleaned_data.get('new_password1')
+        if password == settings.DEFAULT_ACCOUNT_PASSWORD:
+            raise forms.ValidationError('Choose a password other than the default account password.')
+        return password
+
+    def save(self, commit=True):
+        self.user.must_change_password = False
+        return super().save(commit)
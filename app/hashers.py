@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.contrib.auth.hashers import BasePasswordHasher, make_password
+from django.utils.crypto import constant_time_compare
+from django.utils.translation import gettext_noop as _
+
+# Stored password of a bulk-provisioned account that has not logged in yet
+PROVISIONED_PASSWORD = 'provisioned$'
+
+
+# Accounts created by the CSV imports start on the shared default password without a hash of their own
+class ProvisionedPasswordHasher(BasePasswordHasher):
+    """Accept the default account password for accounts stored as PROVISIONED_PASSWORD.
+
+    Nothing is hashed at import time. The first successful login finds this
+    hasher is not the preferred one and Django saves the password again with
+    the preferred hasher and a fresh salt, so each account pays for its own
+    PBKDF2 run once, when it is first used. The default password is the one
+    handed out with every account anyway, so the marker reveals nothing; the
+    imports also set must_change_password, so that first login leads straight
+    to a password change (see PasswordChangeRequiredMiddleware).
+    """
+
+    algorithm = 'provisioned'
+
+    def salt(self):
+        return ''
+
+    def encode(self, password, salt):
+        # Only ever stands in for the default password
+        if not constant_time_compare(password, settings.DEFAULT_ACCOUNT_PASSWORD):
+            raise ValueError('Only the default account password can be provisioned.')
+        return PROVISIONED_PASSWORD
+
+    def decode(self, encoded):
+        algorithm, rest = encoded.split('$', 1)
+        assert algorithm == self.algorithm
+        return {'algorithm': algorithm, 'hash': '', 'salt': ''}
+
+    def verify(self, password, encoded):
+        return encoded == PROVISIONED_PASSWORD and constant_time_compare(password, settings.DEFAULT_ACCOUNT_PASSWORD)
+
+    def safe_summary(self, encoded):
+        return {_('algorithm'): self.algorithm, _('hash'): _('set at first login')}
+
+    def must_update(self, encoded):
+        return True
+
+    def harden_runtime(self, password, encoded):
+        pass
+
+
+def default_password():
+    """Stored password of one bulk-created account: the deferred marker, or its own salted hash when deferral is off."""
+    if getattr(settings, 'DEFER_IMPORT_PASSWORD_HASHING', True):
+        return PROVISIONED_PASSWORD
+    return make_password(settings.DEFAULT_ACCOUNT_PASSWORD)
@@ -0,0 +1,141 @@
+import heapq
+
+from django.db.models import IntegerField
+from django.db.models.functions import Cast
+
+from app.models import AttendanceBook, AttendanceRecord, Student, Teacher
+from app.packed import packed_sessions, session_marks, slot_students
+
+# Columns of the history file: (record lookup, column name, Arrow type name); department is filled in per book
+HISTORY_COLUMNS = [
+    ('date', 'date', 'date32'),
+    ('session', 'session', 'string'),
+    ('status', 'present', 'bool_'),
+    ('weight', 'weight', 'int8'),
+    ('attendance_book_id', 'book_id', 'int32'),
+    ('attendance_book__book_code', 'book_code', 'string'),
+    ('attendance_book__name', 'book_name', 'string'),
+    ('attendance_book__book_type', 'book_type', 'string'),
+    ('student__user__userid', 'userid', 'string'),
+    ('student__usn', 'usn', 'string'),
+    ('student__course_id', 'course_id', 'string'),
+    ('student__course__name', 'course_name', 'string'),
+    ('student__year', 'year', 'string'),
+    ('student__section', 'section', 'string'),
+    ('student__gender', 'gender', 'string'),
+]
+
+HISTORY_FORMATS = ('parquet', 'arrow')
+
+
+def history_schema(pa):
+    return pa.schema(
+        [(name, getattr(pa, type_name)()) for lookup, name, type_name in HISTORY_COLUMNS]
+        + [('department', pa.string())]
+    )
+
+
+def book_departments():
+    """{book id: department id} with the first of the departments of each book's teachers."""
+    departments = {}
+    for book_id, department_id in Teacher.objects.filter(
+        attendancebook__isnull=False,
+    ).order_by('department_id').values_list('attendancebook', 'department_id'):
+        departments.setdefault(book_id, department_id)
+    return departments
+
+
+def history_records(from_date=None, to_date=None, chunk_size=2000):
+    """Rows of the history file as tuples in HISTORY_COLUMNS order, by date, book, session and student.
+
+    The marks of packed sessions are merged in, so the file covers every
+    book whatever its storage; each session is in one layout only.
+    """
+    records = AttendanceRecord.objects.all()
+    if from_date:
+        records = records.filter(date__gte=from_date)
+    if to_date:
+        records = records.filter(date__lte=to_date)
+    rows = records.annotate(weight=Cast('attendance_book__book_type', IntegerField())).order_by(
+        'date', 'attendance_book_id', 'session', 'student_id',
+    ).values_list(*[lookup for lookup, name, type_name in HISTORY_COLUMNS]).iterator(chunk_size=chunk_size)
+
+    sessions = packed_sessions(from_date, to_date)
+    if not sessions.exists():
+        return rows
+    # Rows of one session share its date, book and session, whichever layout they come from
+    return heapq.merge(rows, packed_history_records(sessions, chunk_size), key=lambda row: (row[0], row[4], row[1]))
+
+
+def packed_history_records(sessions, chunk_size=2000):
+    """History rows of the packed sessions, in the same column layout and order as the records."""
+    book_ids = set(sessions.order_by().values_list('attendance_book_id', flat=True).distinct())
+    slots = slot_students(book_ids)
+    books = {
+        book_id: (book_code, name, book_type)
+        for book_id, book_code, name, book_type in AttendanceBook.objects.filter(
+            pk__in=book_ids,
+        ).values_list('id', 'book_code', 'name', 'book_type')
+    }
+    students = {
+        student[0]: student[1:]
+        for student in Student.objects.filter(pk__in=set(slots.values())).values_list(
+            'user_id', 'user__userid', 'usn', 'course_id', 'course__name', 'year', 'section', 'gender',
+        )
+    }
+
+    for book_id, date, session, marked, present in sessions.order_by('date', 'attendance_book_id', 'session').values_list(
+        'attendance_book_id', 'date', 'session', 'marked', 'present',
+    ).iterator(chunk_size=chunk_size):
+        book_code, name, book_type = books[book_id]
+        for student_id, date, session, status in sorted(session_marks([(book_id, date, session, marked, present)], slots)):
+            yield (date, session, status, int(book_type), book_id, book_code, name, book_type, *students[student_id])
+
+
+# Attendance history joined with student, course and book details, written as a compressed columnar file
+def export_attendance_history(path, from_date=None, to_date=None, file_format='parquet', chunk_size=50000):
+    """Write the marks of the range to path and return the number of rows written.
+
+    The records are read through a server-side cursor and written one
+    record batch of chunk_size rows at a time, so memory stays flat however
+    long the history is. Parquet files are zstd-compressed with dictionary
+    encoded strings; Arrow IPC files use zstd buffer compression.
+    Needs pyarrow.
+    """
+    import pyarrow as pa
+
+    if file_format not in HISTORY_FORMATS:
+        raise ValueError(f"Unknown history format {file_format!r}; expected one of {', '.join(HISTORY_FORMATS)}.")
+
+    schema = history_schema(pa)
+    departments = book_departments()
+    book_index = [name for lookup, name, type_name in HISTORY_COLUMNS].index('book_id')
+
+    if file_format == 'parquet':
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(path, schema, compression='zstd')
+    else:
+        writer = pa.ipc.new_file(path, schema, options=pa.ipc.IpcWriteOptions(compression='zstd'))
+
+    written = 0
+    with writer:
+        chunk = []
+        for row in history_records(from_date, to_date, chunk_size):
+            chunk.append(row)
+            if len(chunk) == chunk_size:
+                writer.write_batch(history_batch(pa, schema, chunk, departments, book_index))
+                written += len(chunk)
+                chunk = []
+        if chunk:
+            writer.write_batch(history_batch(pa, schema, chunk, departments, book_index))
+            written += len(chunk)
+    return written
+
+
+def history_batch(pa, schema, rows, departments, book_index):
+    columns = [list(column) for column in zip(*rows)]
+    columns.append([departments.get(book_id) for book_id in columns[book_index]])
+    return pa.RecordBatch.from_arrays(
+        [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+        schema=schema,
+    )
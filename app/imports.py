@@ -0,0 +1,320 @@
+import csv
+import io
+import logging
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from itertools import islice
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from app.hashers import default_password
+from app.models import Course, CustomUser, Department, ImportJob, Student, Teacher
+from app.signals import bulk_saved
+
+logger = logging.getLogger(__name__)
+
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+# Streaming CSV import: validate every row first, then insert the valid ones in chunks
+class CsvImport:
+    """Base class of the CSV importers.
+
+    Subclasses name the required columns and implement ``clean_row`` and
+    ``create_chunk``. The file is read twice and never held in memory: the
+    first pass validates every row, with existing userids fetched one batch
+    at a time; the second inserts the valid rows with bulk_create, only when
+    the first pass found no errors. Each chunk of the second pass commits
+    together with the job's checkpoint, so a resumed job picks up after the
+    last committed chunk.
+    """
+
+    required_columns = []
+    batch_size = 500
+
+    def __init__(self, csv_file, job):
+        self.csv_file = csv_file
+        self.job = job
+        self.problems = []
+        self.skipped = 0
+
+    def rows(self):
+        """Yield (line number, row) one line at a time, with the values stripped."""
+        self.csv_file.seek(0)
+        text = io.TextIOWrapper(self.csv_file, encoding='utf-8-sig', newline='')
+        try:
+            reader = csv.DictReader(text)
+            columns = [column.strip() for column in reader.fieldnames or []]
+            missing = [column for column in self.required_columns if column not in columns]
+            if missing:
+                raise ValueError(f"Missing columns: {', '.join(missing)}")
+            for row in reader:
+                yield reader.line_num, {key.strip(): (value or '').strip() for key, value in row.items() if key}
+        finally:
+            # Leave the file open for the next pass
+            text.detach()
+
+    def run(self):
+        """Validate and import the file, or continue an import a worker left unfinished."""
+        job = self.job
+        if job.status in ('queued', 'validating'):
+            self.update_job(status='validating', processed_rows=0)
+            self.validate()
+            self.update_job(
+                total_rows=job.processed_rows,
+                skipped=self.skipped,
+                error_count=len(self.errors),
+                report_name=self.write_report() or '',
+            )
+            if self.errors:
+                self.update_job(status='rejected', finished_at=timezone.now())
+                return
+            self.update_job(status='importing', processed_rows=0)
+        self.write()
+        self.update_job(status='done', finished_at=timezone.now())
+
+    def update_job(self, **fields):
+        for field, value in fields.items():
+            setattr(self.job, field, value)
+        self.job.save(update_fields=list(fields))
+
+    @property
+    def errors(self):
+        return [problem for problem in self.problems if problem['status'] == 'error']
+
+    def validate(self):
+        seen = set()
+        for batch in chunks(self.rows(), self.batch_size):
+            existing = self.existing_userids(batch)
+            for line, row in batch:
+                userid = row.get('userid', '')
+                if userid in existing:
+                    self.problem(line, userid, 'skipped', 'User already exists.')
+                    self.skipped += 1
+                    continue
+                if userid in seen:
+                    self.problem(line, userid, 'error', 'Duplicate userid in the file.')
+                    continue
+                seen.add(userid)
+                for message in self.clean_row(row)[1]:
+                    self.problem(line, userid, 'error', message)
+            self.update_job(processed_rows=self.job.processed_rows + len(batch))
+
+    def write(self):
+        for batch in chunks(self.rows(), self.batch_size):
+            batch = [(line, row) for line, row in batch if line > self.job.checkpoint_line]
+            if not batch:
+                continue
+            # Users that exist now either existed before the import or came from an earlier, committed chunk
+            existing = self.existing_userids(batch)
+            cleaned = [self.clean_row(row)[0] for line, row in batch if row['userid'] not in existing]
+            with transaction.atomic():
+                if cleaned:
+                    self.create_chunk(cleaned)
+                self.update_job(
+                    checkpoint_line=batch[-1][0],
+                    processed_rows=self.job.processed_rows + len(batch),
+                    imported=self.job.imported + len(cleaned),
+                )
+
+    def existing_userids(self, batch):
+        return set(CustomUser.objects.filter(
+            userid__in=[row.get('userid') for line, row in batch]
+        ).values_list('userid', flat=True))
+
+    def problem(self, line, userid, status, message):
+        self.problems.append({'line': line, 'userid': userid, 'status': status, 'message': message})
+
+    def clean_row(self, row):
+        """Return (cleaned values, list of error messages) for one row."""
+        raise NotImplementedError
+
+    def create_chunk(self, cleaned_rows):
+        raise NotImplementedError
+
+    def write_report(self):
+        """Save the per-row problems as CSV under IMPORT_ROOT and return the report name, or None."""
+        if not self.problems:
+            return None
+        name = f'{uuid.uuid4().hex}.csv'
+        with open(os.path.join(settings.IMPORT_ROOT, name), 'w', newline='') as report_file:
+            writer = csv.DictWriter(report_file, fieldnames=['line', 'userid', 'status', 'message'])
+            writer.writeheader()
+            writer.writerows(self.problems)
+        return name
+
+
+def check_length(errors, row, field, max_length):
+    if len(row.get(field, '')) > max_length:
+        errors.append(f'{field} is longer than {max_length} characters.')
+
+
+class StudentCsvImport(CsvImport):
+    required_columns = ['userid', 'fullname', 'usn', 'course_id', 'year', 'section', 'gender', 'dob']
+
+    def __init__(self, csv_file, job):
+        super().__init__(csv_file, job)
+        self.courses = {}
+
+    def clean_row(self, row):
+        errors = []
+        for field in self.required_columns:
+            if not row.get(field):
+                errors.append(f'{field} is required.')
+        for field, max_length in [('userid', 50), ('fullname', 50), ('phone_no', 10), ('parent_phoneno', 10),
+                                  ('usn', 50), ('course_id', 10), ('section', 10), ('photo_url', 100)]:
+            check_length(errors, row, field, max_length)
+
+        dob = None
+        if row.get('dob'):
+            try:
+                dob = datetime.strptime(row['dob'], '%d/%m/%Y').date()
+            except ValueError:
+                errors.append('Invalid date format for dob. Expected DD/MM/YYYY.')
+        if row.get('year') and row['year'] not in dict(Student.YEAR_CHOICES):
+            errors.append(f"Invalid year {row['year']}.")
+        if row.get('gender') and row['gender'] not in dict(Student.GENDER_CHOICES):
+            errors.append(f"Invalid gender {row['gender']}.")
+        if row.get('email'):
+            try:
+                validate_email(row['email'])
+            except ValidationError:
+                errors.append(f"Invalid email {row['email']}.")
+
+        return {**row, 'dob': dob}, errors
+
+    def create_chunk(self, cleaned_rows):
+        # Courses named in the file but not yet known are created, as the upload always did
+        missing = {row['course_id'] for row in cleaned_rows} - set(self.courses)
+        if missing:
+            Course.objects.bulk_create([Course(course_id=course_id) for course_id in missing], ignore_conflicts=True)
+            self.courses.update(Course.objects.in_bulk(list(missing)))
+
+        # Accounts start on the default password, hashed at first login unless DEFER_IMPORT_PASSWORD_HASHING is off,
+        # and must change it before using the site (PasswordChangeRequiredMiddleware)
+        users = [
+            CustomUser(
+                userid=row['userid'],
+                fullname=row['fullname'],
+                phone_no=row.get('phone_no') or None,
+                email=row.get('email') or None,
+                role='student',
+                password=default_password(),
+                must_change_password=True,
+            )
+            for row in cleaned_rows
+        ]
+        CustomUser.objects.bulk_create(users)
+
+        Student.objects.bulk_create([
+            Student(
+                user=user,
+                usn=row['usn'],
+                parent_phoneno=row.get('parent_phoneno') or None,
+                course=self.courses[row['course_id']],
+                year=row['year'],
+                section=row['section'],
+                gender=row['gender'],
+                dob=row['dob'],
+                photo_url=row.get('photo_url', ''),
+            )
+            for user, row in zip(users, cleaned_rows)
+        ])
+        bulk_saved.send(sender=Student)
+
+
+class TeacherCsvImport(CsvImport):
+    required_columns = ['userid', 'fullname', 'dept_id']
+
+    def __init__(self, csv_file, job):
+        super().__init__(csv_file, job)
+        self.departments = {}
+
+    def clean_row(self, row):
+        errors = []
+        for field in self.required_columns:
+            if not row.get(field):
+                errors.append(f'{field} is required.')
+        for field, max_length in [('userid', 50), ('fullname', 50), ('phone_no', 10), ('dept_id', 10), ('photo_url', 100)]:
+            check_length(errors, row, field, max_length)
+        if row.get('email'):
+            try:
+                validate_email(row['email'])
+            except ValidationError:
+                errors.append(f"Invalid email {row['email']}.")
+        return row, errors
+
+    def create_chunk(self, cleaned_rows):
+        # Departments named in the file but not yet known are created, as the upload always did
+        missing = {row['dept_id'] for row in cleaned_rows} - set(self.departments)
+        if missing:
+            Department.objects.bulk_create([Department(dept_id=dept_id) for dept_id in missing], ignore_conflicts=True)
+            self.departments.update(Department.objects.in_bulk(list(missing)))
+
+        # Accounts start on the default password, hashed at first login unless DEFER_IMPORT_PASSWORD_HASHING is off,
+        # and must change it before using the site (PasswordChangeRequiredMiddleware)
+        users = [
+            CustomUser(
+                userid=row['userid'],
+                fullname=row['fullname'],
+                phone_no=row.get('phone_no') or None,
+                email=row.get('email') or None,
+                role='teacher',
+                password=default_password(),
+                must_change_password=True,
+            )
+            for row in cleaned_rows
+        ]
+        CustomUser.objects.bulk_create(users)
+
+        Teacher.objects.bulk_create([
+            Teacher(user=user, department=self.departments[row['dept_id']], photo_url=row.get('photo_url', ''))
+            for user, row in zip(users, cleaned_rows)
+        ])
+        bulk_saved.send(sender=Teacher)
+
+
+IMPORTERS = {
+    'students': StudentCsvImport,
+    'teachers': TeacherCsvImport,
+}
+
+
+def create_import_job(kind, uploaded_file):
+    """Save the upload under IMPORT_ROOT and create its queued job."""
+    os.makedirs(settings.IMPORT_ROOT, exist_ok=True)
+    file_name = f'{uuid.uuid4().hex}.csv'
+    with open(os.path.join(settings.IMPORT_ROOT, file_name), 'wb') as destination:
+        for chunk in uploaded_file.chunks():
+            destination.write(chunk)
+    return ImportJob.objects.create(kind=kind, file_name=file_name)
+
+
+# One import at a time per process, so two uploads never compete for the same userids
+import_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='csv-import')
+
+
+def enqueue_import_job(job):
+    """Run the job in the background once the transaction that created it has committed."""
+    transaction.on_commit(lambda: import_executor.submit(run_import_job, job.pk))
+
+
+def run_import_job(job_id):
+    try:
+        job = ImportJob.objects.get(pk=job_id)
+        with open(os.path.join(settings.IMPORT_ROOT, job.file_name), 'rb') as csv_file:
+            IMPORTERS[job.kind](csv_file, job).run()
+    except Exception as e:
+        logger.exception('Import job %s failed', job_id)
+        ImportJob.objects.filter(pk=job_id).update(status='failed', error=str(e), finished_at=timezone.now())
+    finally:
+        close_old_connections()
@@ -0,0 +1,31 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.analytics import REPORTS, load_history, standard_reports
+
+
+class Command(BaseCommand):
+    help = 'Compute the term-end attendance reports from a history file written by export_attendance_history.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('history', help='Parquet or Arrow file written by export_attendance_history.')
+        parser.add_argument('--report', action='append', choices=list(REPORTS), help='Report to compute; repeat for several. Defaults to all.')
+        parser.add_argument('--output-dir', help='Write each report as <name>.csv here instead of printing it.')
+
+    def handle(self, *args, **options):
+        try:
+            history = load_history(options['history'])
+        except ImportError as e:
+            raise CommandError(f'The analytics need pandas and pyarrow ({e}).')
+
+        reports = standard_reports(history, options['report'])
+        if options['output_dir']:
+            os.makedirs(options['output_dir'], exist_ok=True)
+        for name, report in reports.items():
+            if options['output_dir']:
+                report.to_csv(os.path.join(options['output_dir'], f'{name}.csv'), index=False)
+            else:
+                self.stdout.write(f'\n== {name} ==\n{report.to_string(index=False)}')
+        if options['output_dir']:
+            self.stdout.write(self.style.SUCCESS(f"Wrote {len(reports)} reports to {options['output_dir']}."))
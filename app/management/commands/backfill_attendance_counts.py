@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from app.attendance import with_running_count
+from app.models import AttendanceBook, AttendanceRecord
+
+
+class Command(BaseCommand):
+    help = 'Recompute AttendanceRecord.count as the running present hours per (book, student), in small batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help='Students per batch.')
+        parser.add_argument('--pause', type=float, default=0, help='Seconds to sleep between batches.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        fixed = 0
+
+        for book_id in AttendanceBook.objects.order_by('id').values_list('id', flat=True):
+            student_ids = list(
+                AttendanceRecord.objects.filter(attendance_book_id=book_id)
+                .order_by('student_id').values_list('student_id', flat=True).distinct()
+            )
+            for start in range(0, len(student_ids), batch_size):
+                batch = student_ids[start:start + batch_size]
+                # Each batch is its own short transaction so the table is never locked for long
+                with transaction.atomic():
+                    rows = with_running_count(
+                        AttendanceRecord.objects.filter(attendance_book_id=book_id, student_id__in=batch)
+                    ).values_list('id', 'count', 'running_count')
+                    stale = [
+                        AttendanceRecord(id=record_id, count=running_count)
+                        for record_id, count, running_count in rows
+                        if count != running_count
+                    ]
+                    AttendanceRecord.objects.bulk_update(stale, ['count'], batch_size=1000)
+                fixed += len(stale)
+                if options['pause']:
+                    time.sleep(options['pause'])
+
+        self.stdout.write(self.style.SUCCESS(f'Updated the running count of {fixed} attendance records.'))
@@ -0,0 +1,143 @@
+import datetime
+import json
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, transaction
+from django.template.loader import render_to_string
+
+from app.attendance import build_attendance_matrix, mark_book_attendance
+from app.models import AttendanceBook, AttendanceRecord, AttendanceSession, AttendanceSlot, Student
+
+# Tables each layout writes its marks to; AttendanceSummary is maintained the same way by both
+LAYOUT_MODELS = {
+    'rows': [AttendanceRecord],
+    'packed': [AttendanceSession, AttendanceSlot],
+}
+
+
+class Command(BaseCommand):
+    help = 'Mark the same sessions into a row-per-student book and a packed book and compare table size and matrix time.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=120, help='Students enrolled in both books.')
+        parser.add_argument('--sessions', type=int, default=60, help='Sessions marked in each book.')
+        parser.add_argument('--present-rate', type=float, default=0.8)
+        parser.add_argument('--repeat', type=int, default=5, help='Matrix builds per layout; the first one warms up.')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed, for reproducible marks.')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout.')
+
+    def handle(self, *args, **options):
+        students = list(Student.objects.order_by('user__userid').values_list('user_id', 'user__userid')[:options['students']])
+        if not students:
+            raise CommandError('Seed the database first (seed_attendance_data).')
+
+        rng = random.Random(options['seed'])
+        today = datetime.date.today()
+        sessions = [
+            (today - datetime.timedelta(days=n // 4), str(n % 4 + 1))
+            for n in range(options['sessions'])
+        ]
+        # Both books get exactly the same marks
+        marks = [
+            [userid for _, userid in students if rng.random() < options['present_rate']]
+            for _ in sessions
+        ]
+        self.repeat = max(options['repeat'], 2)
+
+        report = {
+            'database': connection.vendor,
+            'students': len(students),
+            'sessions': len(sessions),
+            'results': {},
+        }
+        # Everything runs in a transaction that is rolled back, so the database is left untouched
+        books = {}
+        with transaction.atomic():
+            for storage, models in LAYOUT_MODELS.items():
+                book = AttendanceBook.objects.create(
+                    name=f'Benchmark {storage}', book_code='BENCH', book_type='1', storage=storage,
+                )
+                book.students.set([student_id for student_id, _ in students])
+                books[storage] = book
+
+                size_before = self.table_bytes(models)
+                rows_before = sum(model.objects.count() for model in models)
+                start = time.perf_counter()
+                for (date, session), present in zip(sessions, marks):
+                    mark_book_attendance(book, date, session, present)
+                mark_ms = (time.perf_counter() - start) * 1000
+                size_after = self.table_bytes(models)
+
+                report['results'][storage] = {
+                    'tables': [model._meta.db_table for model in models],
+                    'rows': sum(model.objects.count() for model in models) - rows_before,
+                    'table_bytes': size_after - size_before if size_after is not None else None,
+                    'mark_ms_per_session': round(mark_ms / len(sessions), 2),
+                    'matrix': self.measure(lambda: build_attendance_matrix(book)),
+                    'render': self.measure(lambda: render_to_string('administrator/view_attendance_records.html', {
+                        'attendance_book': book,
+                        'matrix': build_attendance_matrix(book),
+                    })),
+                }
+                result = report['results'][storage]
+                self.stderr.write(
+                    f"{storage}: {result['rows']} rows, {result['table_bytes']} bytes, "
+                    f"matrix {result['matrix']['median_ms']} ms, render {result['render']['median_ms']} ms"
+                )
+
+            # The translation layer must give both layouts the same grid
+            rows_matrix = build_attendance_matrix(books['rows'])
+            packed_matrix = build_attendance_matrix(books['packed'])
+            report['matrices_match'] = (
+                rows_matrix['columns'] == packed_matrix['columns']
+                and [row['cells'] for row in rows_matrix['rows']] == [row['cells'] for row in packed_matrix['rows']]
+            )
+            transaction.set_rollback(True)
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as report_file:
+                report_file.write(output)
+        else:
+            self.stdout.write(output)
+
+    def measure(self, run):
+        timings = []
+        for attempt in range(self.repeat):
+            start = time.perf_counter()
+            run()
+            elapsed = (time.perf_counter() - start) * 1000
+            # The first run warms caches and is not counted
+            if attempt:
+                timings.append(elapsed)
+        return {
+            'median_ms': round(statistics.median(timings), 2),
+            'min_ms': round(min(timings), 2),
+            'max_ms': round(max(timings), 2),
+        }
+
+    def table_bytes(self, models):
+        """Bytes on disk of the models' tables and their indexes, or None when the database cannot tell."""
+        tables = [model._meta.db_table for model in models]
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    'SELECT SUM(pg_total_relation_size(table_name::regclass)) FROM unnest(%s) AS table_name',
+                    [tables],
+                )
+                return int(cursor.fetchone()[0] or 0)
+            if connection.vendor == 'sqlite':
+                # dbstat is only there when SQLite was built with SQLITE_ENABLE_DBSTAT_VTAB
+                try:
+                    cursor.execute(
+                        f'SELECT SUM(pgsize) FROM dbstat WHERE name IN '
+                        f'(SELECT name FROM sqlite_master WHERE tbl_name IN ({", ".join(["%s"] * len(tables))}))',
+                        tables,
+                    )
+                except DatabaseError:
+                    return None
+                return int(cursor.fetchone()[0] or 0)
+        return None
@@ -0,0 +1,142 @@
+import datetime
+import json
+import statistics
+import subprocess
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections, connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from app.models import AttendanceBook, AttendanceRecord, CustomUser, Student
+from app.tasks import get_absent_details_by_date
+
+
+class Command(BaseCommand):
+    help = 'Time the hot views through the test client and write a JSON report of latency and query counts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per benchmark; the first one warms up.')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout.')
+        parser.add_argument('--compare', help='Print the change against an earlier JSON report.')
+
+    def handle(self, *args, **options):
+        admin = CustomUser.objects.filter(role='admin').first()
+        book = AttendanceBook.objects.order_by('-id').first()
+        student = Student.objects.filter(attendancebook=book).first() if book else None
+        if admin is None or student is None:
+            raise CommandError('Seed the database first (an admin user and at least one attendance book with students).')
+
+        # Any concrete host the settings accept; wildcard entries are not valid Host headers
+        host = next((host for host in settings.ALLOWED_HOSTS if not host.startswith(('*', '.'))), 'localhost')
+        self.client = Client(HTTP_HOST=host)
+        self.client.force_login(admin)
+        self.repeat = max(options['repeat'], 2)
+
+        absent_date = AttendanceRecord.objects.filter(status=False).values_list('date', flat=True).first() or timezone.now().date()
+        present = list(book.students.values_list('user__userid', flat=True)[::2])
+        ajax = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+        # Userid ten students before the end, where the last page of the list starts
+        deep_cursor = Student.objects.order_by('-user__userid').values_list('user__userid', flat=True)[10:11].first() or ''
+
+        benchmarks = [
+            ('mark_attendance GET', lambda: self.client.get(reverse('mark_attendance', args=[book.pk]))),
+            ('mark_attendance POST', lambda: self.client.post(reverse('mark_attendance', args=[book.pk]), {
+                'date': timezone.now().date().isoformat(), 'session': '8', 'attendance': present,
+            })),
+            ('view_attendance_records', lambda: self.client.get(reverse('view_attendance_records', args=[book.pk]))),
+            ('view_students AJAX', lambda: self.client.get(reverse('view_students'), {
+                'draw': 1, 'start': 0, 'length': 10, 'search[value]': 'Stud',
+            }, **ajax)),
+            ('view_students AJAX deep page', lambda: self.client.get(reverse('view_students'), {
+                'draw': 1, 'after': deep_cursor, 'length': 10, 'search[value]': '',
+            }, **ajax)),
+            ('filter_students', lambda: self.client.get(reverse('filter_students'), {'query': 'Stud', 'queryYear': '2'})),
+            ('admin_dashboard', lambda: self.client.get(reverse('admin_dashboard'))),
+            ('student_login', lambda: self.client.post(reverse('student_login'), {'usn': student.usn, 'dob': student.dob.isoformat()})),
+            ('get_absent_details_by_date', lambda: get_absent_details_by_date(absent_date.isoformat())),
+        ]
+
+        report = {
+            'commit': self.git_commit(),
+            'generated_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'database': connection.vendor,
+            'rows': {
+                'students': Student.objects.count(),
+                'attendance_books': AttendanceBook.objects.count(),
+                'attendance_records': AttendanceRecord.objects.count(),
+            },
+            'results': {},
+        }
+        # Everything runs in a transaction that is rolled back, so the seeded data is left untouched.
+        # Like TestCase, keep the request signals from closing the connection mid-transaction.
+        request_started.disconnect(close_old_connections)
+        request_finished.disconnect(close_old_connections)
+        try:
+            with transaction.atomic():
+                for name, run in benchmarks:
+                    report['results'][name] = self.measure(run)
+                    self.stderr.write(f'{name}: {report["results"][name]["median_ms"]} ms, {report["results"][name]["queries"]} queries')
+                transaction.set_rollback(True)
+        finally:
+            request_started.connect(close_old_connections)
+            request_finished.connect(close_old_connections)
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as report_file:
+                report_file.write(output)
+        else:
+            self.stdout.write(output)
+
+        if options['compare']:
+            with open(options['compare']) as baseline_file:
+                self.compare(json.load(baseline_file), report)
+
+    def measure(self, run):
+        timings = []
+        queries = 0
+        status_code = None
+        for attempt in range(self.repeat):
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = run()
+                elapsed = (time.perf_counter() - start) * 1000
+            status_code = getattr(response, 'status_code', None)
+            # The first run warms caches and is not counted
+            if attempt:
+                timings.append(elapsed)
+                queries = len(captured)
+        return {
+            'status_code': status_code,
+            'queries': queries,
+            'median_ms': round(statistics.median(timings), 2),
+            'min_ms': round(min(timings), 2),
+            'max_ms': round(max(timings), 2),
+        }
+
+    def compare(self, baseline, report):
+        self.stderr.write(f'Compared with {baseline.get("commit") or "baseline"}:')
+        for name, result in report['results'].items():
+            before = baseline.get('results', {}).get(name)
+            if before is None:
+                continue
+            change = (result['median_ms'] - before['median_ms']) / before['median_ms'] * 100 if before['median_ms'] else 0
+            self.stderr.write(
+                f'{name}: {before["median_ms"]} -> {result["median_ms"]} ms ({change:+.1f}%), '
+                f'{before["queries"]} -> {result["queries"]} queries'
+            )
+
+    def git_commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'],
+                cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
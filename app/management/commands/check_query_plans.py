@@ -0,0 +1,66 @@
+import datetime
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from app.models import AttendanceBook, AttendanceRecord, AttendanceSummary, Student
+
+# Plan lines that mean a table is read in full instead of through an index
+SEQUENTIAL_SCAN_PATTERNS = {
+    'postgresql': re.compile(r'Seq Scan on "?(\w+)'),
+    'sqlite': re.compile(r'\bSCAN (\w+)(?! USING (?:COVERING )?INDEX)'),
+}
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the attendance hot-path queries and fail if any of them falls back to a sequential scan.'
+
+    def handle(self, *args, **options):
+        pattern = SEQUENTIAL_SCAN_PATTERNS.get(connection.vendor)
+        if pattern is None:
+            raise CommandError(f'Query plan checks are not supported on {connection.vendor}.')
+
+        failures = []
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                # Small or freshly seeded tables make the planner prefer a seq scan; only ask whether an index is usable
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+
+            for name, queryset in self.hot_queries():
+                plan = queryset.explain()
+                scanned = [table for table in pattern.findall(plan) if table.startswith('app_')]
+                if scanned:
+                    failures.append(name)
+                    self.stderr.write(f'{name}: sequential scan on {", ".join(scanned)}\n{plan}')
+                else:
+                    self.stdout.write(f'{name}: ok')
+
+        if failures:
+            raise CommandError(f'{len(failures)} hot queries fall back to a sequential scan: {", ".join(failures)}')
+        self.stdout.write(self.style.SUCCESS('All hot queries use an index.'))
+
+    def hot_queries(self):
+        # Sample keys from the seeded data; the plans do not depend on the rows existing
+        book_id = AttendanceBook.objects.values_list('id', flat=True).first() or 1
+        student_id = Student.objects.values_list('user_id', flat=True).first() or 1
+        date = AttendanceRecord.objects.values_list('date', flat=True).first() or datetime.date.today()
+
+        return [
+            ('student percentage', AttendanceRecord.objects.filter(
+                attendance_book_id=book_id, student_id=student_id, status=True,
+            )),
+            ('absentees by date', AttendanceRecord.objects.filter(date=date, status=False)),
+            ('absent students today', AttendanceRecord.objects.filter(
+                date=date, status=False,
+            ).values('student').distinct()),
+            ('mark session', AttendanceRecord.objects.filter(
+                attendance_book_id=book_id, date=date, session='1',
+            )),
+            ('book matrix', AttendanceRecord.objects.filter(
+                attendance_book_id=book_id,
+            ).order_by('date', 'session')),
+            ('book summaries', AttendanceSummary.objects.filter(attendance_book_id=book_id)),
+            ('student summaries', AttendanceSummary.objects.filter(student_id=student_id)),
+        ]
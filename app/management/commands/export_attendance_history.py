@@ -0,0 +1,34 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.history import HISTORY_FORMATS, export_attendance_history
+
+
+class Command(BaseCommand):
+    help = 'Write the attendance history, joined with student, course and book details, to a Parquet or Arrow file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='File to write, e.g. attendance_2024.parquet')
+        parser.add_argument('--from-date', type=datetime.date.fromisoformat)
+        parser.add_argument('--to-date', type=datetime.date.fromisoformat)
+        parser.add_argument('--format', choices=HISTORY_FORMATS, help='Defaults to arrow for .arrow/.feather files, else parquet.')
+        parser.add_argument('--chunk-size', type=int, default=50000)
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or ('arrow' if options['output'].endswith(('.arrow', '.feather')) else 'parquet')
+        start = time.perf_counter()
+        try:
+            written = export_attendance_history(
+                options['output'],
+                from_date=options['from_date'],
+                to_date=options['to_date'],
+                file_format=file_format,
+                chunk_size=options['chunk_size'],
+            )
+        except ImportError as e:
+            raise CommandError(f'The history export needs pyarrow ({e}).')
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {written} attendance records to {options['output']} in {time.perf_counter() - start:.1f} s."
+        ))
@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from app.attendance import compute_attendance_summaries
+from app.models import AttendanceBook, AttendanceSummary
+from app.signals import bulk_saved
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the AttendanceSummary table from the attendance records and verify it.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify-only', action='store_true', help='Only compare the table against the records.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if not options['verify_only']:
+            rebuilt = 0
+            for book_id in AttendanceBook.objects.order_by('pk').values_list('pk', flat=True):
+                rebuilt += self.rebuild(book_id, options['batch_size'])
+            bulk_saved.send(sender=AttendanceSummary)
+            self.stdout.write(f'Rebuilt {rebuilt} attendance summaries.')
+
+        mismatches = self.verify()
+        if mismatches:
+            for key, expected_value, actual_value in mismatches[:20]:
+                self.stderr.write(f'Book {key[0]}, student {key[1]}: expected {expected_value}, found {actual_value}')
+            raise CommandError(f'{len(mismatches)} attendance summaries do not match the attendance records.')
+        self.stdout.write(self.style.SUCCESS('Attendance summaries match the attendance records.'))
+
+    def rebuild(self, book_id, batch_size):
+        """Recount the summaries of one book under the row lock mark_book_attendance takes, so no mark is lost."""
+        with transaction.atomic():
+            if not list(AttendanceBook.objects.select_for_update().filter(pk=book_id).values_list('pk')):
+                # Deleted since the list was read; its summaries went with it
+                return 0
+            expected = compute_attendance_summaries(book_ids=[book_id])
+            AttendanceSummary.objects.filter(attendance_book_id=book_id).delete()
+            AttendanceSummary.objects.bulk_create(
+                [
+                    AttendanceSummary(
+                        attendance_book_id=book_id,
+                        student_id=student_id,
+                        attended_hours=attended_hours,
+                        total_hours=total_hours,
+                    )
+                    for (_, student_id), (attended_hours, total_hours) in expected.items()
+                ],
+                batch_size=batch_size,
+            )
+        return len(expected)
+
+    def verify(self):
+        expected = compute_attendance_summaries()
+        actual = {
+            (book_id, student_id): (attended_hours, total_hours)
+            for book_id, student_id, attended_hours, total_hours in AttendanceSummary.objects.values_list(
+                'attendance_book_id', 'student_id', 'attended_hours', 'total_hours'
+            )
+        }
+        mismatches = []
+        for key in expected.keys() | actual.keys():
+            # A summary with nothing recorded is equivalent to a missing one
+            expected_value = expected.get(key, (0, 0))
+            actual_value = actual.get(key, (0, 0))
+            if expected_value != actual_value:
+                mismatches.append((key, expected_value, actual_value))
+        return mismatches
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from app.models import Student
+from app.search import get_search_backend, refresh_student_search
+
+
+class Command(BaseCommand):
+    help = 'Recompute the search text of every student and rebuild the student search index.'
+
+    def handle(self, *args, **options):
+        updated = refresh_student_search(Student.objects.all())
+        get_search_backend().rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt the search text of {updated} students.'))
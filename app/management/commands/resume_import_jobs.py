@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from app.imports import run_import_job
+from app.models import ImportJob
+
+
+class Command(BaseCommand):
+    help = 'Finish CSV import jobs left queued or unfinished by a stopped worker, continuing from their checkpoints.'
+
+    def handle(self, *args, **options):
+        jobs = list(ImportJob.objects.filter(status__in=['queued', 'validating', 'importing']).order_by('id'))
+        for job in jobs:
+            self.stdout.write(f'Resuming import job {job.pk} ({job.kind}) after line {job.checkpoint_line}')
+            run_import_job(job.pk)
+            job.refresh_from_db()
+            self.stdout.write(f'Import job {job.pk}: {job.status}, {job.imported} imported')
+        self.stdout.write(self.style.SUCCESS(f'{len(jobs)} import jobs resumed.'))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from app.models import SmsJob
+from app.sms import expire_stale_messages, run_sms_job
+
+
+class Command(BaseCommand):
+    help = 'Finish SMS jobs left queued or running by a stopped process, sending only the messages still pending.'
+
+    def handle(self, *args, **options):
+        # Messages claimed by the stopped process may have reached the provider; they are failed, never resent
+        expired = expire_stale_messages()
+        if expired:
+            self.stdout.write(f'{expired} messages left sending were marked failed')
+
+        jobs = list(SmsJob.objects.filter(status__in=['queued', 'running']).order_by('id'))
+        for job in jobs:
+            self.stdout.write(f'Resuming SMS job {job.pk} ({job.source}) for {job.date}')
+            run_sms_job(job.pk)
+            job.refresh_from_db()
+            self.stdout.write(f'SMS job {job.pk}: {job.status}, {job.messages.filter(status="sent").count()} sent')
+        self.stdout.write(self.style.SUCCESS(f'{len(jobs)} SMS jobs resumed.'))
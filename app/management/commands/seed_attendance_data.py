@@ -0,0 +1,133 @@
+import datetime
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from app.models import AttendanceBook, AttendanceRecord, Course, CustomUser, Department, Student, Teacher
+from app.signals import bulk_saved
+
+
+class Command(BaseCommand):
+    help = 'Seed departments, courses, teachers, students and attendance books with a semester of attendance history.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--departments', type=int, default=5)
+        parser.add_argument('--courses', type=int, default=10)
+        parser.add_argument('--teachers', type=int, default=50)
+        parser.add_argument('--students', type=int, default=3000)
+        parser.add_argument('--books', type=int, default=100)
+        parser.add_argument('--days', type=int, default=90, help='Teaching days of history per book.')
+        parser.add_argument('--section-size', type=int, default=60)
+        parser.add_argument('--present-rate', type=float, default=0.8)
+        parser.add_argument('--prefix', default='SEED', help='Prefix for every generated id.')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed, for reproducible data.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        prefix = options['prefix']
+        batch_size = options['batch_size']
+        # Hash the shared password once; every seeded account can log in with it
+        password = make_password('Welcome@12345')
+
+        with transaction.atomic():
+            departments = Department.objects.bulk_create([
+                Department(dept_id=f'{prefix[:4]}D{i}', name=f'Department {i}')
+                for i in range(options['departments'])
+            ])
+            courses = Course.objects.bulk_create([
+                Course(course_id=f'{prefix[:4]}C{i}', name=f'Course {i}')
+                for i in range(options['courses'])
+            ])
+
+            teacher_users = CustomUser.objects.bulk_create([
+                CustomUser(userid=f'{prefix}T{i:05d}', fullname=f'Teacher {i}', role='teacher',
+                           phone_no=f'9{i:09d}', email=f'teacher{i}@example.com', password=password)
+                for i in range(options['teachers'])
+            ], batch_size=batch_size)
+            teachers = Teacher.objects.bulk_create([
+                Teacher(user=user, department=rng.choice(departments), photo_url='')
+                for user in teacher_users
+            ], batch_size=batch_size)
+
+            student_users = CustomUser.objects.bulk_create([
+                CustomUser(userid=f'{prefix}S{i:06d}', fullname=f'Student {i}', role='student',
+                           phone_no=f'8{i:09d}', email=f'student{i}@example.com', password=password)
+                for i in range(options['students'])
+            ], batch_size=batch_size)
+            students = Student.objects.bulk_create([
+                Student(
+                    user=user,
+                    usn=f'{prefix}U{i:06d}',
+                    parent_phoneno=f'7{i:09d}',
+                    course=courses[i % len(courses)],
+                    year=str(i // len(courses) % 4 + 1),
+                    section=chr(ord('A') + i // (len(courses) * 4 * options['section_size']) % 26),
+                    gender=rng.choice('MF'),
+                    dob=datetime.date(2000, 1, 1) + datetime.timedelta(days=rng.randrange(2000)),
+                    photo_url='',
+                )
+                for i, user in enumerate(student_users)
+            ], batch_size=batch_size)
+
+            # Group students into class sections; every book is taught to one section
+            sections = {}
+            for student in students:
+                sections.setdefault((student.course_id, student.year, student.section), []).append(student)
+            sections = list(sections.values())
+
+            books = AttendanceBook.objects.bulk_create([
+                AttendanceBook(name=f'Subject {i}', book_code=f'SUB{i:04d}', book_type=rng.choice('11234'))
+                for i in range(options['books'])
+            ])
+            book_students = {book.id: sections[i % len(sections)] for i, book in enumerate(books)}
+
+            AttendanceBook.teachers.through.objects.bulk_create([
+                AttendanceBook.teachers.through(attendancebook_id=book.id, teacher_id=teacher.pk)
+                for book in books
+                for teacher in rng.sample(teachers, min(2, len(teachers)))
+            ], batch_size=batch_size)
+            AttendanceBook.students.through.objects.bulk_create([
+                AttendanceBook.students.through(attendancebook_id=book.id, student_id=student.pk)
+                for book in books
+                for student in book_students[book.id]
+            ], batch_size=batch_size)
+
+        # History goes in one transaction per book to keep each one short
+        start = datetime.date.today() - datetime.timedelta(days=options['days'] * 7 // 5 + 1)
+        teaching_days = [
+            day for day in (start + datetime.timedelta(days=n) for n in range(options['days'] * 7 // 5 + 1))
+            if day.weekday() < 5
+        ][:options['days']]
+        total_records = 0
+        for book in books:
+            weight = int(book.book_type)
+            session = str(rng.randrange(1, 8))
+            attended = {}
+            records = []
+            for day in teaching_days:
+                for student in book_students[book.id]:
+                    status = rng.random() < options['present_rate']
+                    attended[student.pk] = attended.get(student.pk, 0) + (weight if status else 0)
+                    records.append(AttendanceRecord(
+                        attendance_book_id=book.id,
+                        student_id=student.pk,
+                        date=day,
+                        session=session,
+                        status=status,
+                        count=attended[student.pk],
+                    ))
+            with transaction.atomic():
+                AttendanceRecord.objects.bulk_create(records, batch_size=batch_size)
+            total_records += len(records)
+
+        # Fill the search text of the new students and drop cached counters
+        bulk_saved.send(sender=Student)
+        call_command('rebuild_attendance_summary', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {len(departments)} departments, {len(courses)} courses, {len(teachers)} teachers, '
+            f'{len(students)} students, {len(books)} books and {total_records} attendance records.'
+        ))
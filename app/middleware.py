@@ -0,0 +1,137 @@
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib import messages
+from django.db import connections
+from django.shortcuts import redirect
+from django.urls import reverse
+
+slow_request_logger = logging.getLogger('app.slow_requests')
+
+# Parameter lists of varying length collapse to one shape, e.g. "IN (%s, %s, %s)" -> "IN (...)"
+PARAMETER_LIST = re.compile(r'\((?:\s*%s\s*,)+\s*%s\s*\)')
+
+
+# Query count, time and statements of one request, installed as a DB execute wrapper
+class QueryCollector:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.statements.append(sql)
+
+    def top_shapes(self, limit=5):
+        shapes = Counter(PARAMETER_LIST.sub('(...)', sql) for sql in self.statements)
+        return [{'sql': sql, 'count': count} for sql, count in shapes.most_common(limit) if count > 1]
+
+
+# Rolling window of request durations per view, shared by the threads of one worker process
+class RequestStats:
+    def __init__(self, window):
+        self.window = window
+        self.lock = threading.Lock()
+        self.durations = {}
+
+    def record(self, view_name, duration_ms):
+        with self.lock:
+            self.durations.setdefault(view_name, deque(maxlen=self.window)).append(duration_ms)
+
+    def snapshot(self):
+        with self.lock:
+            durations = {view_name: sorted(values) for view_name, values in self.durations.items()}
+
+        return {
+            view_name: {
+                'requests': len(values),
+                'p50_ms': percentile(values, 50),
+                'p95_ms': percentile(values, 95),
+                'p99_ms': percentile(values, 99),
+            }
+            for view_name, values in sorted(durations.items())
+        }
+
+
+def percentile(sorted_values, percent):
+    index = max(0, min(len(sorted_values) - 1, round(percent / 100 * len(sorted_values)) - 1))
+    return round(sorted_values[index], 2)
+
+
+request_stats = RequestStats(getattr(settings, 'REQUEST_METRICS_WINDOW', 1000))
+
+
+class RequestMetricsMiddleware:
+    """Time every request, count its queries and log the slow ones with their repeated SQL shapes."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_ms = getattr(settings, 'REQUEST_METRICS_SLOW_MS', 500)
+        self.slow_queries = getattr(settings, 'REQUEST_METRICS_SLOW_QUERIES', 50)
+
+    def __call__(self, request):
+        collector = QueryCollector()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(collector))
+            response = self.get_response(request)
+        duration_ms = (time.perf_counter() - start) * 1000
+
+        resolver_match = getattr(request, 'resolver_match', None)
+        view_name = resolver_match.view_name if resolver_match else '<unresolved>'
+        request_stats.record(view_name, duration_ms)
+
+        if duration_ms >= self.slow_ms or collector.count >= self.slow_queries:
+            slow_request_logger.warning(json.dumps({
+                'event': 'slow_request',
+                'view': view_name,
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'duration_ms': round(duration_ms, 2),
+                'queries': collector.count,
+                'db_ms': round(collector.duration * 1000, 2),
+                'repeated_sql': collector.top_shapes(),
+            }))
+        return response
+
+
+# Change-password view of each role; roles without one of their own use the teacher's, which any user may open
+PASSWORD_CHANGE_VIEWS = {'admin': 'admin_change_password', 'teacher': 'teacher_change_password'}
+
+
+def password_change_url(user):
+    return reverse(PASSWORD_CHANGE_VIEWS.get(user.role, 'teacher_change_password'))
+
+
+class PasswordChangeRequiredMiddleware:
+    """Send users still on the shared default password of an import to their change-password page.
+
+    Only that page and logout are served until the password is changed, so
+    the well-known default password cannot be kept by skipping the form.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        user = request.user
+        if user.is_authenticated and user.must_change_password:
+            change_url = password_change_url(user)
+            if request.path not in (change_url, reverse('logout')):
+                messages.warning(request, 'Please choose a new password before continuing.')
+                return redirect(change_url)
+        return self.get_response(request)
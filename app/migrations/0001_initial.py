@@ -0,0 +1,248 @@
+# Generated by Django 5.1 on 2026-10-18 11:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomUser',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('password', models.CharField(max_length=128, verbose_name='password')),
+                ('last_login', models.DateTimeField(blank=True, null=True, verbose_name='last login')),
+                ('is_superuser', models.BooleanField(default=False, help_text='Designates that this user has all permissions without explicitly assigning them.', verbose_name='superuser status')),
+                ('userid', models.CharField(max_length=50, unique=True)),
+                ('role', models.CharField(choices=[('admin', 'Admin'), ('teacher', 'Teacher'), ('hod', 'HOD'), ('student', 'Student')], max_length=10)),
+                ('fullname', models.CharField(max_length=50)),
+                ('phone_no', models.CharField(max_length=10, null=True)),
+                ('email', models.EmailField(max_length=254, null=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('is_staff', models.BooleanField(default=False)),
+                ('groups', models.ManyToManyField(blank=True, help_text='The groups this user belongs to. A user will get all permissions granted to each of their groups.', related_name='user_set', related_query_name='user', to='auth.group', verbose_name='groups')),
+                ('user_permissions', models.ManyToManyField(blank=True, help_text='Specific permissions for this user.', related_name='user_set', related_query_name='user', to='auth.permission', verbose_name='user permissions')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='AttendanceBook',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=100)),
+                ('book_code', models.CharField(max_length=10)),
+                ('book_type', models.CharField(choices=[('1', 'Theory'), ('1', 'Practicle-1 Hr'), ('2', 'Practicle-2 Hr'), ('3', 'Practicle-3 Hr'), ('4', 'Practicle-4 Hr')], max_length=10)),
+                ('storage', models.CharField(choices=[('rows', 'One row per student'), ('packed', 'Packed bitset per session')], default='rows', max_length=10)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Course',
+            fields=[
+                ('course_id', models.CharField(max_length=10, primary_key=True, serialize=False, unique=True)),
+                ('name', models.CharField(max_length=50)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Department',
+            fields=[
+                ('dept_id', models.CharField(max_length=10, primary_key=True, serialize=False, unique=True)),
+                ('name', models.CharField(max_length=50)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('students', 'Students'), ('teachers', 'Teachers')], max_length=10)),
+                ('file_name', models.CharField(max_length=100)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('validating', 'Validating'), ('importing', 'Importing'), ('done', 'Done'), ('rejected', 'Rejected'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('total_rows', models.IntegerField(default=0)),
+                ('processed_rows', models.IntegerField(default=0)),
+                ('imported', models.IntegerField(default=0)),
+                ('skipped', models.IntegerField(default=0)),
+                ('error_count', models.IntegerField(default=0)),
+                ('checkpoint_line', models.IntegerField(default=0)),
+                ('report_name', models.CharField(blank=True, max_length=100)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=100)),
+                ('description', models.TextField()),
+                ('attachment_link', models.URLField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Admin',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('photo_url', models.CharField(max_length=100)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SmsJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('source', models.CharField(choices=[('manual', 'Manual'), ('scheduled', 'Scheduled')], default='manual', max_length=10)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(condition=models.Q(('source', 'scheduled')), fields=('date',), name='one_scheduled_sms_job_per_date')],
+            },
+        ),
+        migrations.CreateModel(
+            name='HOD',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('photo_url', models.CharField(max_length=100)),
+                ('department', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.department')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Student',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('usn', models.CharField(max_length=50)),
+                ('parent_phoneno', models.CharField(max_length=10, null=True)),
+                ('year', models.CharField(choices=[('1', 'I Year'), ('2', 'II Year'), ('3', 'III Year'), ('4', 'IV Year')], max_length=10)),
+                ('section', models.CharField(max_length=10)),
+                ('gender', models.CharField(choices=[('M', 'Male'), ('F', 'Female')], max_length=10)),
+                ('dob', models.DateField()),
+                ('photo_url', models.CharField(max_length=100)),
+                ('search_text', models.TextField(blank=True, default='', editable=False)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.course')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SmsMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('phone_no', models.CharField(max_length=15)),
+                ('message', models.TextField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('sending', 'Sending'), ('sent', 'Sent'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('attempts', models.IntegerField(default=0)),
+                ('response', models.TextField(blank=True)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='app.smsjob')),
+                ('student', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='app.student')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AttendanceSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('attended_hours', models.IntegerField(default=0)),
+                ('total_hours', models.IntegerField(default=0)),
+                ('attendance_book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.attendancebook')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.student')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AttendanceSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ordinal', models.PositiveIntegerField()),
+                ('attendance_book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.attendancebook')),
+                ('student', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='app.student')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AttendanceRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('session', models.CharField(max_length=100)),
+                ('status', models.BooleanField(default=False)),
+                ('count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('attendance_book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.attendancebook')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.student')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='attendancebook',
+            name='students',
+            field=models.ManyToManyField(to='app.student'),
+        ),
+        migrations.CreateModel(
+            name='Teacher',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('photo_url', models.CharField(max_length=100)),
+                ('department', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.department')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='attendancebook',
+            name='teachers',
+            field=models.ManyToManyField(to='app.teacher'),
+        ),
+        migrations.CreateModel(
+            name='AttendanceSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('session', models.CharField(max_length=100)),
+                ('marked', models.BinaryField()),
+                ('present', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('attendance_book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.attendancebook')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date'], name='session_date')],
+                'unique_together': {('attendance_book', 'date', 'session')},
+            },
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['usn', 'dob'], name='student_usn_dob'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='smsmessage',
+            unique_together={('job', 'student')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='attendancesummary',
+            unique_together={('attendance_book', 'student')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='attendanceslot',
+            unique_together={('attendance_book', 'ordinal'), ('attendance_book', 'student')},
+        ),
+        migrations.AddIndex(
+            model_name='attendancerecord',
+            index=models.Index(fields=['attendance_book', 'student', 'status'], name='record_book_student_status'),
+        ),
+        migrations.AddIndex(
+            model_name='attendancerecord',
+            index=models.Index(fields=['attendance_book', 'date', 'session'], name='record_book_date_session'),
+        ),
+        migrations.AddIndex(
+            model_name='attendancerecord',
+            index=models.Index(condition=models.Q(('status', False)), fields=['date', 'student'], name='record_absent_date_student'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='attendancerecord',
+            unique_together={('attendance_book', 'student', 'date', 'session')},
+        ),
+    ]
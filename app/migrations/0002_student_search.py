@@ -0,0 +1,72 @@
+import sqlite3
+
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+SEARCH_INDEX = GinIndex(OpClass('search_text', name='gin_trgm_ops'), name='student_search_text_trgm')
+
+# SQLite: an FTS5 trigram table over search_text, kept in step with app_student by triggers
+SQLITE_SEARCH = [
+    "CREATE VIRTUAL TABLE app_student_search USING fts5("
+    "search_text, content='app_student', content_rowid='user_id', tokenize='trigram')",
+    "CREATE TRIGGER app_student_search_insert AFTER INSERT ON app_student BEGIN "
+    "INSERT INTO app_student_search(rowid, search_text) VALUES (new.user_id, new.search_text); END",
+    "CREATE TRIGGER app_student_search_delete AFTER DELETE ON app_student BEGIN "
+    "INSERT INTO app_student_search(app_student_search, rowid, search_text) "
+    "VALUES ('delete', old.user_id, old.search_text); END",
+    "CREATE TRIGGER app_student_search_update AFTER UPDATE OF search_text ON app_student BEGIN "
+    "INSERT INTO app_student_search(app_student_search, rowid, search_text) "
+    "VALUES ('delete', old.user_id, old.search_text); "
+    "INSERT INTO app_student_search(rowid, search_text) VALUES (new.user_id, new.search_text); END",
+    "INSERT INTO app_student_search(app_student_search) VALUES ('rebuild')",
+]
+SQLITE_SEARCH_REVERSE = [
+    'DROP TRIGGER app_student_search_update',
+    'DROP TRIGGER app_student_search_delete',
+    'DROP TRIGGER app_student_search_insert',
+    'DROP TABLE app_student_search',
+]
+
+
+class PostgresTrigramExtension(TrigramExtension):
+    # CreateExtension only checks the database vendor when applied
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+def sqlite_search(schema_editor):
+    # The trigram tokenizer arrived in SQLite 3.34; older versions search with LIKE (see app.search)
+    return schema_editor.connection.vendor == 'sqlite' and sqlite3.sqlite_version_info >= (3, 34)
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.add_index(apps.get_model('app', 'Student'), SEARCH_INDEX)
+    elif sqlite_search(schema_editor):
+        for statement in SQLITE_SEARCH:
+            schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.remove_index(apps.get_model('app', 'Student'), SEARCH_INDEX)
+    elif sqlite_search(schema_editor):
+        for statement in SQLITE_SEARCH_REVERSE:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0001_initial'),
+    ]
+
+    operations = [
+        PostgresTrigramExtension(),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[migrations.AddIndex(model_name='student', index=SEARCH_INDEX)],
+            database_operations=[migrations.RunPython(create_search_index, drop_search_index)],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1 on 2026-10-18 11:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0002_student_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='must_change_password',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -1,6 +1,7 @@
 # models.py
 from django import forms
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.db import models
 from django.utils import timezone
 from django.core.mail import send_mass_mail
@@ -43,6 +44,7 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     email = models.EmailField(unique=False,null=True)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
+    must_change_password = models.BooleanField(default=False)  # Set on imported accounts, which start on the shared default password
 
     USERNAME_FIELD = 'userid'
     REQUIRED_FIELDS = ['fullname','role']
@@ -120,6 +122,16 @@ class Student(models.Model):
     gender = models.CharField(max_length=10, choices=GENDER_CHOICES)
     dob = models.DateField()
     photo_url = models.CharField(max_length=100)
+    # Lower-cased ids, names, contact details and class the student search matches; kept current by app.search
+    search_text = models.TextField(blank=True, default='', editable=False)
+
+    class Meta:
+        indexes = [
+            # Student self-service lookup
+            models.Index(fields=['usn', 'dob'], name='student_usn_dob'),
+            # Substring search on PostgreSQL; created by migration 0002 only there, after the pg_trgm extension
+            GinIndex(OpClass('search_text', name='gin_trgm_ops'), name='student_search_text_trgm'),
+        ]
 
 
 # Attendance Book Model
@@ -131,10 +143,16 @@ class AttendanceBook(models.Model):
         ('3', 'Practicle-3 Hr'),
         ('4', 'Practicle-4 Hr'),
     )
+    STORAGE_CHOICES = (
+        ('rows', 'One row per student'),
+        ('packed', 'Packed bitset per session'),
+    )
     id = models.AutoField(primary_key=True)
     name = models.CharField(max_length=100, blank=False)
     book_code = models.CharField(max_length=10)
     book_type = models.CharField(max_length=10, choices=BOOK_TYPE)
+    # Where new marks of the book are written; both layouts are always read (see app.packed)
+    storage = models.CharField(max_length=10, choices=STORAGE_CHOICES, default='rows')
     teachers = models.ManyToManyField(Teacher, blank=False)
     students = models.ManyToManyField(Student, blank=False)
     # created_at = models.DateTimeField(auto_now_add=True)
@@ -162,16 +180,140 @@ class AttendanceRecord(models.Model):
     date = models.DateField()
     session = models.CharField(max_length=100)
     status = models.BooleanField(default=False)
-    count = models.IntegerField(default=0)
+    count = models.IntegerField(default=0)  # Running present hours of the student over the book's row-stored sessions
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         unique_together = ('attendance_book', 'student', 'date', 'session')
+        indexes = [
+            models.Index(fields=['attendance_book', 'student', 'status'], name='record_book_student_status'),
+            models.Index(fields=['attendance_book', 'date', 'session'], name='record_book_date_session'),
+            models.Index(fields=['date', 'student'], name='record_absent_date_student', condition=models.Q(status=False)),
+        ]
 
     @property
     def get_status_display(self):
         return 'P' if self.status else 'A'
 
+
+# Enrollment ordinal of a student in a packed book. Ordinals are never reused, so a deleted student's
+# slot stays taken and old bitsets keep their meaning
+class AttendanceSlot(models.Model):
+    attendance_book = models.ForeignKey(AttendanceBook, on_delete=models.CASCADE)
+    student = models.ForeignKey(Student, on_delete=models.SET_NULL, null=True)
+    ordinal = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = [('attendance_book', 'student'), ('attendance_book', 'ordinal')]
+
+
+# One marked session of a packed book: bit n of marked/present is the student in slot n
+class AttendanceSession(models.Model):
+    attendance_book = models.ForeignKey(AttendanceBook, on_delete=models.CASCADE)
+    date = models.DateField()
+    session = models.CharField(max_length=100)
+    marked = models.BinaryField()
+    present = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('attendance_book', 'date', 'session')
+        indexes = [
+            models.Index(fields=['date'], name='session_date'),
+        ]
+
+
+# Attendance Summary Model (per student per book, weighted by book_type)
+class AttendanceSummary(models.Model):
+    attendance_book = models.ForeignKey(AttendanceBook, on_delete=models.CASCADE)
+    student = models.ForeignKey(Student, on_delete=models.CASCADE)
+    attended_hours = models.IntegerField(default=0)
+    total_hours = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('attendance_book', 'student')
+
+    @property
+    def percentage(self):
+        return round(self.attended_hours / self.total_hours * 100, 2) if self.total_hours > 0 else 0
+
+# SMS Job Model (one absentee notification run)
+class SmsJob(models.Model):
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+    SOURCE_CHOICES = (
+        ('manual', 'Manual'),
+        ('scheduled', 'Scheduled'),
+    )
+    date = models.DateField()
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES, default='manual')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            # The daily beat run is idempotent: a second run for the same date reuses the first job
+            models.UniqueConstraint(fields=['date'], condition=models.Q(source='scheduled'), name='one_scheduled_sms_job_per_date'),
+        ]
+
+
+# SMS Message Model (per-recipient outcome of an SmsJob)
+class SmsMessage(models.Model):
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    )
+    job = models.ForeignKey(SmsJob, on_delete=models.CASCADE, related_name='messages')
+    student = models.ForeignKey(Student, on_delete=models.SET_NULL, null=True)
+    phone_no = models.CharField(max_length=15)
+    message = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.IntegerField(default=0)
+    response = models.TextField(blank=True)
+    # When a worker claimed the message for sending; 'sending' rows older than SMS_SENDING_TIMEOUT are stale
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('job', 'student')
+
+
+# CSV Import Job Model (an uploaded file imported in the background in committed chunks)
+class ImportJob(models.Model):
+    KIND_CHOICES = (
+        ('students', 'Students'),
+        ('teachers', 'Teachers'),
+    )
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('validating', 'Validating'),
+        ('importing', 'Importing'),
+        ('done', 'Done'),
+        ('rejected', 'Rejected'),
+        ('failed', 'Failed'),
+    )
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    file_name = models.CharField(max_length=100)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    total_rows = models.IntegerField(default=0)
+    processed_rows = models.IntegerField(default=0)
+    imported = models.IntegerField(default=0)
+    skipped = models.IntegerField(default=0)
+    error_count = models.IntegerField(default=0)
+    # Last CSV line whose chunk is committed; a resumed import continues after it
+    checkpoint_line = models.IntegerField(default=0)
+    report_name = models.CharField(max_length=100, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
 # Notification Model
 class Notification(models.Model):
     title = models.CharField(max_length=100)
@@ -0,0 +1,315 @@
+import heapq
+import itertools
+
+from django.db import transaction
+from django.db.models import F, Max, Q
+
+from app.models import AttendanceBook, AttendanceRecord, AttendanceSession, AttendanceSlot, AttendanceSummary, Student
+from app.signals import bulk_saved
+
+
+# Bitsets are stored little-endian: bit n of the bytes is the student in slot n
+def pack(value):
+    return value.to_bytes((value.bit_length() + 7) // 8, 'little')
+
+
+def bits(data):
+    return int.from_bytes(bytes(data or b''), 'little')
+
+
+def unpack_ordinals(value):
+    """Yield the set bit positions of an int, lowest first."""
+    while value:
+        lowest = value & -value
+        yield lowest.bit_length() - 1
+        value ^= lowest
+
+
+def book_slots(attendance_book, student_ids):
+    """{student id: ordinal} for the given students, assigning the next ordinals to students without one.
+
+    Call it inside the marking transaction after locking the book row, so two
+    concurrent marks never hand out the same ordinal.
+    """
+    slots = dict(AttendanceSlot.objects.filter(
+        attendance_book=attendance_book, student__isnull=False,
+    ).values_list('student_id', 'ordinal'))
+    new_students = [student_id for student_id in student_ids if student_id not in slots]
+    if new_students:
+        highest = AttendanceSlot.objects.filter(attendance_book=attendance_book).aggregate(highest=Max('ordinal'))['highest']
+        start = -1 if highest is None else highest
+        new_slots = [
+            AttendanceSlot(attendance_book=attendance_book, student_id=student_id, ordinal=start + offset)
+            for offset, student_id in enumerate(new_students, start=1)
+        ]
+        AttendanceSlot.objects.bulk_create(new_slots)
+        slots.update((slot.student_id, slot.ordinal) for slot in new_slots)
+    return slots
+
+
+# Mark one session of a packed book: one AttendanceSession row instead of a row per student
+def mark_packed_attendance(attendance_book, date, session, present_userids):
+    """Store the session as two bitsets and update the book's AttendanceSummary rows by the difference.
+
+    Re-marking a session only changes the bits of the students enrolled
+    now, as re-marking a row-per-student session only updates their rows.
+    A session first marked as rows, before the book switched storage, is
+    converted: its rows count as the existing marks and are deleted, so a
+    session is never stored (or counted) twice. Returns the same summary
+    dict as ``mark_book_attendance``.
+    """
+    present_userids = set(present_userids)
+    increment_value = int(attendance_book.book_type)
+
+    with transaction.atomic():
+        # Marks of one packed book are serialized on its row: they share the slots and the session bitsets
+        list(AttendanceBook.objects.select_for_update().filter(pk=attendance_book.pk).values_list('pk'))
+        students = list(attendance_book.students.values_list('user_id', 'user__userid'))
+        student_ids = [student_id for student_id, _ in students]
+
+        # Rows of the session marked while the book used rows; they are converted into the bitsets below
+        rows = dict(AttendanceRecord.objects.filter(
+            attendance_book=attendance_book, date=date, session=session,
+        ).values_list('student_id', 'status'))
+        enrolled = set(student_ids)
+        slots = book_slots(attendance_book, student_ids + [student_id for student_id in rows if student_id not in enrolled])
+
+        existing = AttendanceSession.objects.select_for_update().filter(
+            attendance_book=attendance_book, date=date, session=session,
+        ).first()
+        old_marked = bits(existing.marked) if existing else 0
+        old_present = bits(existing.present) if existing else 0
+        for student_id, status in rows.items():
+            old_marked |= 1 << slots[student_id]
+            if status:
+                old_present |= 1 << slots[student_id]
+
+        summaries = {
+            summary.student_id: summary
+            for summary in AttendanceSummary.objects.select_for_update().filter(attendance_book=attendance_book)
+        }
+
+        marked_now = 0
+        present_now = 0
+        updated = 0
+        for student_id, userid in students:
+            bit = 1 << slots[student_id]
+            status = userid in present_userids
+            marked_now |= bit
+            if status:
+                present_now |= bit
+
+            summary = summaries.setdefault(student_id, AttendanceSummary(
+                attendance_book=attendance_book,
+                student_id=student_id,
+            ))
+            if not old_marked & bit:
+                summary.total_hours += increment_value
+                summary.attended_hours += increment_value if status else 0
+            else:
+                updated += 1
+                if bool(old_present & bit) != status:
+                    summary.attended_hours += increment_value if status else -increment_value
+
+        # Students enrolled now are overwritten; bits of students who have left the book are kept
+        if rows:
+            AttendanceRecord.objects.filter(attendance_book=attendance_book, date=date, session=session).delete()
+            # The running count of later rows covers row-stored sessions only, so it loses the converted present rows
+            AttendanceRecord.objects.filter(
+                Q(date__gt=date) | Q(date=date, session__gt=session),
+                attendance_book=attendance_book,
+                student_id__in=[student_id for student_id, status in rows.items() if status],
+            ).update(count=F('count') - increment_value)
+        AttendanceSession.objects.update_or_create(
+            attendance_book=attendance_book, date=date, session=session,
+            defaults={
+                'marked': pack(old_marked | marked_now),
+                'present': pack(old_present & ~marked_now | present_now),
+            },
+        )
+        AttendanceSummary.objects.bulk_create(
+            [summaries[student_id] for student_id in student_ids],
+            update_conflicts=True,
+            unique_fields=['attendance_book', 'student'],
+            update_fields=['attended_hours', 'total_hours'],
+        )
+
+        bulk_saved.send(sender=AttendanceSession, attendance_book=attendance_book, date=date, session=session)
+
+    present_count = sum(1 for _, userid in students if userid in present_userids)
+    return {
+        'created': len(students) - updated,
+        'updated': updated,
+        'present': present_count,
+        'absent': len(students) - present_count,
+    }
+
+
+def session_marks(sessions, slots):
+    """Yield (student id, date, session, status) for every marked bit of the sessions; slots as from slot_students."""
+    for book_id, date, session, marked, present in sessions:
+        marked = bits(marked)
+        present = bits(present)
+        for ordinal in unpack_ordinals(marked):
+            student_id = slots.get((book_id, ordinal))
+            if student_id is not None:
+                yield student_id, date, session, bool(present >> ordinal & 1)
+
+
+def take_packed_session(attendance_book, date, session):
+    """{student id: status} of one packed session of the book, deleting its AttendanceSession.
+
+    Used when the session is marked again as rows after the book switched
+    storage; call it inside the marking transaction with the book row locked.
+    """
+    packed = AttendanceSession.objects.filter(attendance_book=attendance_book, date=date, session=session).first()
+    if packed is None:
+        return {}
+    marks = {
+        student_id: status
+        for student_id, _, _, status in session_marks(
+            [(attendance_book.pk, date, session, packed.marked, packed.present)], slot_students([attendance_book.pk]),
+        )
+    }
+    packed.delete()
+    return marks
+
+
+def slot_students(book_ids):
+    """{(book id, ordinal): student id} of the books' slots still held by a student."""
+    return {
+        (book_id, ordinal): student_id
+        for book_id, ordinal, student_id in AttendanceSlot.objects.filter(
+            attendance_book_id__in=list(book_ids), student__isnull=False,
+        ).values_list('attendance_book_id', 'ordinal', 'student_id')
+    }
+
+
+# Translation layer: every reader gets the marks of both layouts in the same shape
+def book_marks(attendance_book):
+    """(student id, date, session, status) of every mark of the book, in (date, session) order.
+
+    Sessions marked while the book used rows and while it used bitsets are
+    merged, so switching a book's storage never hides its history.
+    """
+    rows = AttendanceRecord.objects.filter(
+        attendance_book=attendance_book
+    ).order_by('date', 'session').values_list('student_id', 'date', 'session', 'status')
+    sessions = list(AttendanceSession.objects.filter(
+        attendance_book=attendance_book
+    ).order_by('date', 'session').values_list('attendance_book_id', 'date', 'session', 'marked', 'present'))
+    if not sessions:
+        return rows
+    packed = session_marks(sessions, slot_students([attendance_book.pk]))
+    return heapq.merge(rows.iterator(), packed, key=lambda mark: (mark[1], mark[2]))
+
+
+def absence_sessions(from_date, to_date, department=None):
+    """Packed sessions the absentee report reads: in the range, of books taught in the department when it is set."""
+    sessions = packed_sessions(from_date, to_date)
+    if department:
+        sessions = sessions.filter(attendance_book__in=AttendanceBook.objects.filter(teachers__department=department))
+    return sessions
+
+
+def packed_absences(from_date, to_date, department=None, course=None, year=None, section=None, chunk_size=2000):
+    """Yield the absent marks of packed sessions matching the report filters, shaped like the absentee report's rows.
+
+    Each row holds the ABSENTEE_EXPORT_FIELDS keys plus student_id, in date,
+    student and session order like the report query. The sessions are read
+    through a server-side cursor and expanded one date at a time, so memory
+    is bounded by a day of absences however long the range.
+    """
+    sessions = absence_sessions(from_date, to_date, department).order_by('date').values_list(
+        'attendance_book_id', 'date', 'session', 'marked', 'present',
+    ).iterator(chunk_size=chunk_size)
+
+    slots = {}
+    books = {}
+    for date, day_sessions in itertools.groupby(sessions, key=lambda session: session[1]):
+        absent = [
+            (book_id, session, ordinal)
+            for book_id, _, session, marked, present in day_sessions
+            for ordinal in unpack_ordinals(bits(marked) & ~bits(present))
+        ]
+        # Slots and details of each book are read the first time one of its sessions is met
+        new_books = {book_id for book_id, session, ordinal in absent} - books.keys()
+        if new_books:
+            slots.update(slot_students(new_books))
+            books.update(AttendanceBook.objects.in_bulk(new_books))
+
+        students = Student.objects.filter(pk__in={slots.get((book_id, ordinal)) for book_id, session, ordinal in absent} - {None})
+        if course:
+            students = students.filter(course=course)
+        if year:
+            students = students.filter(year=year)
+        if section:
+            students = students.filter(section=section)
+        students = {
+            student['user_id']: student
+            for student in students.values(
+                'user_id', 'user__userid', 'user__fullname', 'course_id', 'year', 'section', 'parent_phoneno',
+            )
+        } if absent else {}
+
+        rows = []
+        for book_id, session, ordinal in absent:
+            student = students.get(slots.get((book_id, ordinal)))
+            if student is None:
+                continue
+            rows.append({
+                'date': date,
+                'student_id': student['user_id'],
+                'student__user__userid': student['user__userid'],
+                'student__user__fullname': student['user__fullname'],
+                'student__course_id': student['course_id'],
+                'student__year': student['year'],
+                'student__section': student['section'],
+                'student__parent_phoneno': student['parent_phoneno'],
+                'attendance_book__book_code': books[book_id].book_code,
+                'attendance_book__name': books[book_id].name,
+                'session': session,
+            })
+        rows.sort(key=lambda row: (row['student__user__userid'], row['session']))
+        yield from rows
+
+
+def packed_sessions(from_date=None, to_date=None, book_ids=None):
+    """AttendanceSession rows in the date range (either end optional), of the given books when book_ids is set."""
+    sessions = AttendanceSession.objects.all()
+    if from_date:
+        sessions = sessions.filter(date__gte=from_date)
+    if to_date:
+        sessions = sessions.filter(date__lte=to_date)
+    if book_ids is not None:
+        sessions = sessions.filter(attendance_book_id__in=list(book_ids))
+    return sessions
+
+
+def packed_book_ids(from_date=None, to_date=None):
+    """Ids of the books with packed sessions in the date range."""
+    return set(packed_sessions(from_date, to_date).order_by().values_list('attendance_book_id', flat=True).distinct())
+
+
+def packed_summaries(from_date=None, to_date=None, book_ids=None):
+    """{(book id, student id): (attended hours, total hours)} counted from the packed sessions, weighted by book_type.
+
+    Takes every session by default, or those of packed_sessions(from_date, to_date, book_ids).
+    """
+    sessions = packed_sessions(from_date, to_date, book_ids)
+    weights = {
+        book_id: int(book_type)
+        for book_id, book_type in AttendanceBook.objects.values_list('id', 'book_type')
+    }
+    slots = slot_students(sessions.order_by().values_list('attendance_book_id', flat=True).distinct())
+    sessions = sessions.values_list(
+        'attendance_book_id', 'date', 'session', 'marked', 'present',
+    ).iterator(chunk_size=2000)
+
+    totals = {}
+    for book_id, date, session, marked, present in sessions:
+        weight = weights[book_id]
+        for student_id, date, session, status in session_marks([(book_id, date, session, marked, present)], slots):
+            attended, total = totals.get((book_id, student_id), (0, 0))
+            totals[(book_id, student_id)] = (attended + (weight if status else 0), total + weight)
+    return totals
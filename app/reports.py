@@ -0,0 +1,442 @@
+import bisect
+import csv
+import heapq
+import itertools
+
+from django.db import connection
+from django.db.models import Case, Count, F, FloatField, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Collate
+
+from app.models import AttendanceBook, AttendanceRecord, AttendanceSummary, Student, Teacher
+from app.packed import absence_sessions, packed_absences, packed_book_ids, packed_summaries
+
+# Columns of the absentee export, one row per missed session
+ABSENTEE_EXPORT_FIELDS = [
+    ('date', 'Date'),
+    ('student__user__userid', 'Student ID'),
+    ('student__user__fullname', 'Full Name'),
+    ('student__course_id', 'Course'),
+    ('student__year', 'Year'),
+    ('student__section', 'Section'),
+    ('student__parent_phoneno', 'Parent Phone No'),
+    ('attendance_book__book_code', 'Subject Code'),
+    ('attendance_book__name', 'Subject Name'),
+    ('session', 'Session'),
+]
+
+
+# Absent records matching the report filters (from_date and to_date are required, the rest optional)
+def filter_absent_records(from_date, to_date, department=None, course=None, year=None, section=None):
+    records = AttendanceRecord.objects.filter(status=False, date__range=(from_date, to_date))
+    if department:
+        # A book belongs to the departments of the teachers who take it
+        records = records.filter(attendance_book__in=AttendanceBook.objects.filter(teachers__department=department))
+    if course:
+        records = records.filter(student__course=course)
+    if year:
+        records = records.filter(student__year=year)
+    if section:
+        records = records.filter(student__section=section)
+    return records
+
+
+# Absences of the report filters: the AttendanceRecord queryset plus the absent marks of packed sessions
+def filter_absences(from_date, to_date, department=None, course=None, year=None, section=None):
+    filters = dict(department=department, course=course, year=year, section=section)
+    return filter_absent_records(from_date, to_date, **filters), PackedAbsences(from_date, to_date, **filters)
+
+
+class PackedAbsences:
+    """The absent marks of packed sessions for the report filters, streamed by packed_absences each time they are read.
+
+    It is false when no packed session falls in the range, so the reports
+    can keep to their plain queryset path.
+    """
+
+    def __init__(self, from_date, to_date, **filters):
+        self.from_date = from_date
+        self.to_date = to_date
+        self.filters = filters
+        self.exists = None
+
+    def __bool__(self):
+        if self.exists is None:
+            self.exists = absence_sessions(self.from_date, self.to_date, self.filters.get('department')).exists()
+        return self.exists
+
+    def __iter__(self):
+        return self.between(self.from_date, self.to_date)
+
+    def between(self, from_date, to_date):
+        return packed_absences(max(from_date, self.from_date), min(to_date, self.to_date), **self.filters)
+
+
+SUMMARY_FIELDS = [
+    'date', 'student_id', 'student__user__userid', 'student__user__fullname',
+    'student__course_id', 'student__year', 'student__section', 'student__parent_phoneno',
+]
+
+
+def absentee_summary(records, packed=()):
+    """One row per student and day, grouped in the database so it can be paginated there.
+
+    When packed sessions add absences (see filter_absences) the two sources
+    are merged a day at a time by AbsenteeSummary, which Paginator reads
+    like the queryset.
+    """
+    summary = records.values(*SUMMARY_FIELDS).annotate(absent_count=Count('id')).order_by('date', 'student__user__userid')
+    if not packed:
+        return summary
+    return AbsenteeSummary(records, summary, packed)
+
+
+class AbsenteeSummary:
+    """The summary rows of the records merged with the packed absences, read one day at a time.
+
+    The rows of each day are counted first, the records with a GROUP BY on
+    the date and the packed absences in one streamed pass; a page then reads
+    the summary rows and packed absences of only the days it spans.
+    """
+
+    def __init__(self, records, summary, packed):
+        self.records = records
+        self.summary = summary
+        self.packed = packed
+        self.day_rows = None
+
+    def days(self):
+        """[(date, number of summary rows)] in date order."""
+        if self.day_rows is None:
+            rows = dict(self.records.order_by().values_list('date').annotate(rows=Count('student', distinct=True)))
+            for date, absences in itertools.groupby(self.packed, key=lambda absence: absence['date']):
+                # Students absent in records on the same day already have their row
+                students = {absence['student_id'] for absence in absences}
+                students -= set(self.records.filter(date=date).values_list('student_id', flat=True))
+                rows[date] = rows.get(date, 0) + len(students)
+            self.day_rows = sorted(rows.items())
+        return self.day_rows
+
+    def count(self):
+        return sum(rows for date, rows in self.days())
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if isinstance(index, int):
+            return self[index:index + 1][0]
+        start = index.start or 0
+        stop = self.count() if index.stop is None else index.stop
+        # The days the slice spans, and the position of the first of their rows
+        dates = []
+        position = first = 0
+        for date, rows in self.days():
+            if position + rows > start and position < stop:
+                if not dates:
+                    first = position
+                dates.append(date)
+            position += rows
+        if not dates:
+            return []
+        return self.merged(dates[0], dates[-1])[start - first:stop - first]
+
+    def __iter__(self):
+        for date, rows in self.days():
+            if rows:
+                yield from self.merged(date, date)
+
+    def merged(self, from_date, to_date):
+        """The summary rows from from_date to to_date, with the packed absences counted in."""
+        rows = {(row['date'], row['student_id']): row for row in self.summary.filter(date__range=(from_date, to_date))}
+        for absence in self.packed.between(from_date, to_date):
+            row = rows.setdefault((absence['date'], absence['student_id']), dict(
+                {field: absence[field] for field in SUMMARY_FIELDS}, absent_count=0,
+            ))
+            row['absent_count'] += 1
+        return sorted(rows.values(), key=lambda row: (row['date'], row['student__user__userid']))
+
+
+def attach_absent_sessions(rows, records, packed=()):
+    """Add the missed sessions to each summary row of one page, with a single query."""
+    page = {(row['date'], row['student_id']) for row in rows}
+    sessions = {}
+    for record in records.filter(
+        date__in={row['date'] for row in rows},
+        student_id__in={row['student_id'] for row in rows},
+    ).values('date', 'student_id', 'session', 'attendance_book__book_code', 'attendance_book__name').order_by('session'):
+        sessions.setdefault((record['date'], record['student_id']), []).append({
+            'subject_code': record['attendance_book__book_code'],
+            'subject_name': record['attendance_book__name'],
+            'session': record['session'],
+        })
+    # Only the packed absences of the page's days are read
+    absences = packed.between(min(row['date'] for row in rows), max(row['date'] for row in rows)) if packed and rows else ()
+    for absence in absences:
+        key = (absence['date'], absence['student_id'])
+        if key in page:
+            sessions.setdefault(key, []).append({
+                'subject_code': absence['attendance_book__book_code'],
+                'subject_name': absence['attendance_book__name'],
+                'session': absence['session'],
+            })
+    for row in rows:
+        row['absent_sessions'] = sorted(sessions.get((row['date'], row['student_id']), []), key=lambda session: session['session'])
+    return rows
+
+
+# csv.writer only needs an object with write(); returning the line lets the rows be streamed
+class Echo:
+    def write(self, value):
+        return value
+
+
+def stream_absentee_csv(records, packed=(), chunk_size=2000):
+    """Yield the export as CSV lines, reading the records through a server-side cursor.
+
+    Absences of packed sessions are merged into the stream in the same order.
+    """
+    fields = [field for field, label in ABSENTEE_EXPORT_FIELDS]
+    writer = csv.writer(Echo())
+    yield writer.writerow([label for field, label in ABSENTEE_EXPORT_FIELDS])
+    rows = records.order_by('date', 'student__user__userid', 'session').values_list(*fields).iterator(chunk_size=chunk_size)
+    if packed:
+        order = [fields.index('date'), fields.index('student__user__userid'), fields.index('session')]
+        rows = heapq.merge(
+            rows,
+            (tuple(absence[field] for field in fields) for absence in packed),
+            key=lambda row: tuple(row[index] for index in order),
+        )
+    for row in rows:
+        yield writer.writerow(row)
+
+
+# Columns of the shortage list and its export, one row per (student, book) below the threshold
+SHORTAGE_FIELDS = [
+    ('department', 'Department'),
+    ('student__course_id', 'Course'),
+    ('student__year', 'Year'),
+    ('student__section', 'Section'),
+    ('student__user__userid', 'Student ID'),
+    ('student__user__fullname', 'Full Name'),
+    ('student__parent_phoneno', 'Parent Phone No'),
+    ('attendance_book__book_code', 'Subject Code'),
+    ('attendance_book__name', 'Subject Name'),
+    ('attended_hours', 'Attended Hours'),
+    ('total_hours', 'Total Hours'),
+    ('percentage', 'Percentage'),
+]
+
+# Fields the rows are grouped on; the hours and percentage are computed per group
+SHORTAGE_GROUP_FIELDS = [field for field, label in SHORTAGE_FIELDS[:9]] + ['student_id', 'attendance_book_id']
+
+
+# A book belongs to the departments of the teachers who take it; the list files it under the first of them
+def book_department(book='attendance_book_id'):
+    return Subquery(
+        Teacher.objects.filter(attendancebook=OuterRef(book)).order_by('department_id').values('department_id')[:1]
+    )
+
+
+SHORTAGE_ORDER = [
+    'department', 'student__course_id', 'student__year', 'student__section',
+    'student__user__userid', 'attendance_book__book_code',
+]
+
+# Collations comparing strings by code point, as Python does; SQLite's default BINARY already does
+CODE_POINT_COLLATIONS = {'postgresql': 'C', 'mysql': 'utf8mb4_bin'}
+
+
+def shortage_ordering():
+    """ORDER BY of the shortage list, in the order shortage_order gives rows merged in Python.
+
+    The database's own collation may order letters, case or punctuation
+    differently, which would interleave the merged rows and shift pages.
+    """
+    collation = CODE_POINT_COLLATIONS.get(connection.vendor)
+    if collation is None:
+        return SHORTAGE_ORDER
+    return [Collate(field, collation) for field in SHORTAGE_ORDER]
+
+
+def filter_pairs(pairs, department=None, course=None, year=None, section=None):
+    # Filtered on the same department the rows are filed under, so every row shows under the chosen heading
+    pairs = pairs.annotate(department=book_department())
+    if department:
+        pairs = pairs.filter(department=getattr(department, 'pk', department))
+    if course:
+        pairs = pairs.filter(student__course=course)
+    if year:
+        pairs = pairs.filter(student__year=year)
+    if section:
+        pairs = pairs.filter(student__section=section)
+    return pairs
+
+
+def record_hours(records):
+    """Weighted attended and total hours of the records, grouped per (student, book)."""
+    weight = Cast('attendance_book__book_type', IntegerField())
+    return records.values(*SHORTAGE_GROUP_FIELDS).annotate(
+        attended_hours=Sum(Case(When(status=True, then=weight), default=Value(0))),
+        total_hours=Sum(weight),
+    )
+
+
+def shortage_list(threshold, from_date=None, to_date=None, department=None, course=None, year=None, section=None):
+    """(student, book) pairs whose weighted attendance is below threshold percent, as one set-based query.
+
+    Without dates the maintained AttendanceSummary rows are read as they are;
+    with a date range the marks in the range are grouped per pair, each
+    session weighted by its book's book_type. Rows come ordered by
+    department, class and student, ready to be shown in groups.
+
+    Books with packed sessions in the range are counted in Python (see
+    packed_shortage) and merged into the query's rows; the result is then
+    a MergedRows, which paginates and streams like the queryset.
+    """
+    filters = dict(department=department, course=course, year=year, section=section)
+    packed_books = set()
+    if from_date or to_date:
+        records = AttendanceRecord.objects.all()
+        if from_date:
+            records = records.filter(date__gte=from_date)
+        if to_date:
+            records = records.filter(date__lte=to_date)
+        packed_books = packed_book_ids(from_date, to_date)
+        pairs = record_hours(filter_pairs(records.exclude(attendance_book_id__in=packed_books), **filters))
+    else:
+        pairs = filter_pairs(AttendanceSummary.objects.filter(total_hours__gt=0), **filters).values(
+            *SHORTAGE_GROUP_FIELDS, 'attended_hours', 'total_hours',
+        )
+
+    rows = pairs.annotate(
+        percentage=Cast('attended_hours', FloatField()) * 100 / F('total_hours'),
+    ).filter(percentage__lt=threshold).order_by(*shortage_ordering())
+    if not packed_books:
+        return rows
+    return MergedRows(
+        rows,
+        packed_shortage(threshold, records, from_date, to_date, packed_books, **filters),
+        key=shortage_order,
+    )
+
+
+def packed_shortage(threshold, records, from_date, to_date, book_ids, department=None, course=None, year=None, section=None):
+    """Shortage rows of books with packed sessions in the range: hours of their records plus their packed sessions."""
+    rows = {
+        (row['attendance_book_id'], row['student_id']): row
+        for row in record_hours(filter_pairs(
+            records.filter(attendance_book_id__in=book_ids), department=department, course=course, year=year, section=section,
+        ))
+    }
+    packed = packed_summaries(from_date, to_date, book_ids)
+
+    # Pairs marked only in packed sessions need the details the record query would have joined
+    books = {
+        book['id']: book
+        for book in AttendanceBook.objects.filter(pk__in=book_ids).annotate(department=book_department('pk')).values(
+            'id', 'book_code', 'name', 'department',
+        )
+    }
+    students = Student.objects.filter(pk__in={student_id for book_id, student_id in packed.keys() - rows.keys()})
+    if course:
+        students = students.filter(course=course)
+    if year:
+        students = students.filter(year=year)
+    if section:
+        students = students.filter(section=section)
+    students = {
+        student['user_id']: student
+        for student in students.values('user_id', 'course_id', 'year', 'section', 'user__userid', 'user__fullname', 'parent_phoneno')
+    }
+
+    department = getattr(department, 'pk', department)
+    for (book_id, student_id), (attended_hours, total_hours) in packed.items():
+        row = rows.get((book_id, student_id))
+        if row is None:
+            book, student = books[book_id], students.get(student_id)
+            if student is None or (department and book['department'] != department):
+                continue
+            row = rows[(book_id, student_id)] = {
+                'department': book['department'],
+                'student__course_id': student['course_id'],
+                'student__year': student['year'],
+                'student__section': student['section'],
+                'student__user__userid': student['user__userid'],
+                'student__user__fullname': student['user__fullname'],
+                'student__parent_phoneno': student['parent_phoneno'],
+                'attendance_book__book_code': book['book_code'],
+                'attendance_book__name': book['name'],
+                'student_id': student_id,
+                'attendance_book_id': book_id,
+                'attended_hours': 0,
+                'total_hours': 0,
+            }
+        row['attended_hours'] += attended_hours
+        row['total_hours'] += total_hours
+
+    shortage = []
+    for row in rows.values():
+        row['percentage'] = row['attended_hours'] * 100 / row['total_hours'] if row['total_hours'] else None
+        if row['percentage'] is not None and row['percentage'] < threshold:
+            shortage.append(row)
+    return shortage
+
+
+def shortage_order(row):
+    # The list's ORDER BY in Python; NULL departments sort where the database puts them
+    nulls_last = connection.features.nulls_order_largest
+    return tuple(
+        ((row[field] is None) == nulls_last, row[field] if row[field] is not None else '')
+        for field in SHORTAGE_ORDER
+    )
+
+
+# A queryset of dict rows plus a smaller list of rows computed in Python, read as one ordered sequence
+class MergedRows:
+    """Rows of queryset and extra merged in key order, for Paginator and the CSV export.
+
+    A page is read as one slice of the queryset: the rows before it are
+    skipped in the database, as with a plain queryset, and at most
+    len(extra) more rows than the page holds are fetched.
+    """
+
+    def __init__(self, queryset, extra, key):
+        self.queryset = queryset
+        self.key = key
+        self.extra = sorted(extra, key=key)
+        self.extra_keys = [key(row) for row in self.extra]
+
+    def count(self):
+        return self.queryset.count() + len(self.extra)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if isinstance(index, int):
+            return self[index:index + 1][0]
+        start = index.start or 0
+        stop = self.count() if index.stop is None else index.stop
+        # Rows of the queryset from `skip` on, with the extra rows that sort after the first of them
+        skip = max(0, start - len(self.extra))
+        rows = list(self.queryset[skip:stop])
+        if skip and not rows:
+            # Past the end: start >= queryset rows + extra rows
+            return []
+        before = bisect.bisect_left(self.extra_keys, self.key(rows[0])) if skip else 0
+        merged = heapq.merge(rows, self.extra[before:], key=self.key)
+        return list(itertools.islice(merged, start - skip - before, stop - skip - before))
+
+    def iterator(self, chunk_size=2000):
+        return heapq.merge(self.queryset.iterator(chunk_size=chunk_size), self.extra, key=self.key)
+
+
+def stream_shortage_csv(rows, chunk_size=2000):
+    """Yield the shortage list as CSV lines, reading it through a server-side cursor."""
+    writer = csv.writer(Echo())
+    yield writer.writerow([label for field, label in SHORTAGE_FIELDS])
+    for row in rows.iterator(chunk_size=chunk_size):
+        yield writer.writerow([
+            round(row[field], 2) if field == 'percentage' else row[field]
+            for field, label in SHORTAGE_FIELDS
+        ])
@@ -2,6 +2,7 @@ from import_export import resources, fields
 from import_export.widgets import ForeignKeyWidget
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ObjectDoesNotExist
+from .hashers import default_password
 from .models import Student, Course
 from datetime import datetime
 
@@ -44,7 +45,7 @@ class StudentResource(resources.ModelResource):
         userid = row['userid']
         fullname = row['fullname']
         role = 'student'
-        password = row.get('password', 'Welcome@12345')  # Use a default password if not provided
+        password = row.get('password')  # The default password is used if not provided
 
         # Create or update CustomUser
         user, created = CustomUser.objects.update_or_create(
@@ -58,8 +59,12 @@ class StudentResource(resources.ModelResource):
         )
 
         if created:
-            user.set_password(password)
-            user.save()
+            if password:
+                user.set_password(password)
+            else:
+                user.password = default_password()
+                user.must_change_password = True
+            user.save(update_fields=['password', 'must_change_password'])
 
         # Update the row with the user's primary key
         row['user'] = user.pk
@@ -79,7 +84,9 @@ class StudentResource(resources.ModelResource):
                     fullname=row['fullname'],
                     role='student',
                     phone_no=row.get('phone_no'),
-                    email=row.get('email')
+                    email=row.get('email'),
+                    password=default_password(),
+                    must_change_password=True,
                 )
                 users_to_create.append(user)
 
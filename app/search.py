@@ -0,0 +1,157 @@
+import hashlib
+import sqlite3
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, connections
+from django.db.models import CharField, F, OuterRef, Subquery, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce, Concat, Lower
+
+from app.models import CustomUser, Student
+from app.versions import get_version
+
+# Version counter bumped whenever a student, its user or a course changes
+STUDENTS_VERSION = 'students'
+
+# Columns of a student search result
+STUDENT_SEARCH_FIELDS = [
+    'user__userid', 'photo_url', 'user__fullname', 'course_id', 'year', 'section',
+    'user__email', 'parent_phoneno', 'user__phone_no',
+]
+
+
+# SQL expression of Student.search_text, for use in an UPDATE
+def search_document():
+    user_document = CustomUser.objects.filter(pk=OuterRef('pk')).annotate(document=Concat(
+        F('userid'), Value(' '), F('fullname'), Value(' '),
+        Coalesce(F('email'), Value('')), Value(' '), Coalesce(F('phone_no'), Value('')),
+        output_field=CharField(),
+    )).values('document')
+    return Lower(Concat(
+        Subquery(user_document), Value(' '), Coalesce(F('parent_phoneno'), Value('')), Value(' '),
+        F('course_id'), Value(' '), F('year'), Value(' '), F('section'),
+        output_field=CharField(),
+    ))
+
+
+def refresh_student_search(queryset):
+    """Recompute search_text of the students in queryset with one UPDATE."""
+    return queryset.update(search_text=search_document())
+
+
+# Substring search over search_text; the plain LIKE is the fallback for databases without a text index
+class StudentSearchBackend:
+    def rebuild(self):
+        pass
+
+    def filter(self, queryset, term):
+        return queryset.filter(search_text__contains=term.lower())
+
+    def estimate_total(self):
+        return cache.get_or_set(
+            f'student_search_total:{get_version(STUDENTS_VERSION)}',
+            Student.objects.count,
+            settings.STUDENT_SEARCH_COUNT_TIMEOUT,
+        )
+
+
+# PostgreSQL: a trigram GIN index (migration 0002) serves LIKE '%term%' for terms of three characters or more
+class PostgresStudentSearch(StudentSearchBackend):
+    def estimate_total(self):
+        # The planner's row estimate, kept current by autovacuum; -1 or 0 before the first ANALYZE
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = 'app_student'::regclass")
+            estimate = cursor.fetchone()[0]
+        return estimate if estimate > 0 else super().estimate_total()
+
+
+# SQLite: an FTS5 trigram table over search_text, kept in step with app_student by triggers (migration 0002)
+class SqliteStudentSearch(StudentSearchBackend):
+    min_term_length = 3  # Shorter terms have no trigram and fall back to LIKE
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO app_student_search(app_student_search) VALUES ('rebuild')")
+
+    def filter(self, queryset, term):
+        if len(term) < self.min_term_length:
+            return super().filter(queryset, term)
+        phrase = '"' + term.replace('"', '""') + '"'
+        return queryset.filter(pk__in=RawSQL('SELECT rowid FROM app_student_search WHERE search_text MATCH %s', [phrase]))
+
+
+def get_search_backend(using='default'):
+    vendor = connections[using].vendor
+    if vendor == 'postgresql':
+        return PostgresStudentSearch()
+    # The trigram tokenizer arrived in SQLite 3.34
+    if vendor == 'sqlite' and sqlite3.sqlite_version_info >= (3, 34):
+        return SqliteStudentSearch()
+    return StudentSearchBackend()
+
+
+def fill_student_search(using='default', **kwargs):
+    """Fill search_text of students that have none, e.g. rows written before it existed (post_migrate)."""
+    refresh_student_search(Student.objects.using(using).filter(search_text=''))
+
+
+# One page of students ordered by userid, continuing after the userid given as cursor
+def search_students(term='', after='', limit=10):
+    """Return (rows, next_cursor); next_cursor is None on the last page.
+
+    Keyset pagination: the page starts with an index seek on userid, so
+    late pages cost the same as the first one.
+    """
+    students = Student.objects.all()
+    if term:
+        students = get_search_backend().filter(students, term)
+    if after:
+        students = students.filter(user__userid__gt=after)
+    rows = list(students.order_by('user__userid').values(*STUDENT_SEARCH_FIELDS)[:limit + 1])
+    next_cursor = rows[limit - 1]['user__userid'] if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def count_students(term=''):
+    """Number of students matching term: estimated when unfiltered, cached until the students change otherwise."""
+    backend = get_search_backend()
+    if not term:
+        return backend.estimate_total()
+    key = f'student_search_count:{get_version(STUDENTS_VERSION)}:' + hashlib.md5(term.lower().encode()).hexdigest()
+    return cache.get_or_set(
+        key,
+        lambda: backend.filter(Student.objects.all(), term).count(),
+        settings.STUDENT_SEARCH_COUNT_TIMEOUT,
+    )
+
+
+# Columns of a filter_students result
+STUDENT_FILTER_FIELDS = ['user__userid', 'user__fullname', 'photo_url', 'course__name', 'year', 'section']
+
+
+def filter_students_page(query='', course='', year='', section='', after='', limit=150):
+    """One keyset page of the students picker as (rows, next_cursor), cached per filter combination.
+
+    The cache key carries the students version, so any change to a student,
+    user or course retires every cached page at once.
+    """
+    params = '|'.join([query.lower(), course.lower(), year, section.lower(), after, str(limit)])
+    key = f'filter_students:{get_version(STUDENTS_VERSION)}:' + hashlib.md5(params.encode()).hexdigest()
+    page = cache.get(key)
+    if page is None:
+        students = Student.objects.all()
+        if query:
+            students = get_search_backend().filter(students, query)
+        if course:
+            students = students.filter(course__name__icontains=course)
+        if year:
+            students = students.filter(year=year)
+        if section:
+            students = students.filter(section__icontains=section)
+        if after:
+            students = students.filter(user__userid__gt=after)
+        rows = list(students.order_by('user__userid').values(*STUDENT_FILTER_FIELDS)[:limit + 1])
+        page = (rows[:limit], rows[limit - 1]['user__userid'] if len(rows) > limit else None)
+        cache.set(key, page, settings.STUDENT_FILTER_CACHE_TIMEOUT)
+    return page
@@ -0,0 +1,102 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import Signal
+
+from app.dashboard import invalidate_dashboard_counts
+from app.events import broker
+from app.models import (
+    HOD, Admin, AttendanceBook, AttendanceRecord, AttendanceSession, AttendanceSummary, Course, CustomUser, Department,
+    Student, Teacher,
+)
+from app.search import STUDENTS_VERSION, refresh_student_search
+from app.versions import ATTENDANCE_BOOKS_VERSION, book_version_name, bump_version
+
+# Sent after bulk writes that skip post_save (bulk_create/update), with the model class as sender
+bulk_saved = Signal()
+
+# Models the admin dashboard counts
+DASHBOARD_MODELS = [Student, Teacher, Admin, HOD, AttendanceBook, Department, Course, AttendanceRecord, AttendanceSession]
+
+
+# Drop the cached counters once the change is committed, so the next load cannot cache the old state again,
+# then tell the live dashboards to fetch them
+def dashboard_changed(sender, **kwargs):
+    transaction.on_commit(invalidate_dashboard_counts)
+    transaction.on_commit(lambda: broker.publish('metrics'))
+
+
+def attendance_marked(sender, attendance_book=None, date=None, session=None, **kwargs):
+    if attendance_book is None:
+        return
+    transaction.on_commit(lambda: broker.publish('attendance_marked', {
+        'book': attendance_book.name,
+        'book_code': attendance_book.book_code,
+        'date': str(date),
+        'session': session,
+    }))
+
+
+for model in DASHBOARD_MODELS:
+    post_save.connect(dashboard_changed, sender=model, dispatch_uid=f'dashboard_save_{model.__name__}')
+    post_delete.connect(dashboard_changed, sender=model, dispatch_uid=f'dashboard_delete_{model.__name__}')
+    bulk_saved.connect(dashboard_changed, sender=model, dispatch_uid=f'dashboard_bulk_{model.__name__}')
+
+bulk_saved.connect(attendance_marked, sender=AttendanceRecord, dispatch_uid='dashboard_attendance_marked')
+bulk_saved.connect(attendance_marked, sender=AttendanceSession, dispatch_uid='dashboard_packed_attendance_marked')
+
+
+# Keep Student.search_text in step with the student and user rows it is built from
+def student_search_changed(sender, instance, raw=False, **kwargs):
+    if raw or (sender is CustomUser and instance.role != 'student'):
+        return
+    refresh_student_search(Student.objects.filter(pk=instance.pk))
+
+
+def students_bulk_saved(sender, **kwargs):
+    refresh_student_search(Student.objects.filter(search_text=''))
+
+
+# Retire cached student lists and counts once the change is committed
+def students_changed(sender, instance=None, **kwargs):
+    if sender is CustomUser and instance is not None and instance.role != 'student':
+        return
+    transaction.on_commit(lambda: bump_version(STUDENTS_VERSION))
+
+
+post_save.connect(student_search_changed, sender=Student, dispatch_uid='student_search_student')
+post_save.connect(student_search_changed, sender=CustomUser, dispatch_uid='student_search_user')
+bulk_saved.connect(students_bulk_saved, sender=Student, dispatch_uid='student_search_bulk')
+
+for model in [Student, CustomUser, Course]:
+    post_save.connect(students_changed, sender=model, dispatch_uid=f'students_version_save_{model.__name__}')
+    post_delete.connect(students_changed, sender=model, dispatch_uid=f'students_version_delete_{model.__name__}')
+bulk_saved.connect(students_changed, sender=Student, dispatch_uid='students_version_bulk')
+
+
+# Retire every cached value derived from the marks of the book once the change is committed
+def attendance_book_marked(sender, instance=None, attendance_book=None, **kwargs):
+    if instance is not None:
+        book_id = instance.attendance_book_id
+    elif attendance_book is not None:
+        book_id = attendance_book.pk
+    else:
+        # A bulk change across books, such as a summary rebuild
+        transaction.on_commit(lambda: bump_version(ATTENDANCE_BOOKS_VERSION))
+        return
+    transaction.on_commit(lambda: bump_version(book_version_name(book_id)))
+
+
+# Books and enrollments decide which books a student sees and which students a book lists
+def attendance_books_changed(sender, **kwargs):
+    transaction.on_commit(lambda: bump_version(ATTENDANCE_BOOKS_VERSION))
+
+
+for model in [AttendanceRecord, AttendanceSession, AttendanceSummary]:
+    post_save.connect(attendance_book_marked, sender=model, dispatch_uid=f'attendance_book_save_{model.__name__}')
+    post_delete.connect(attendance_book_marked, sender=model, dispatch_uid=f'attendance_book_delete_{model.__name__}')
+    bulk_saved.connect(attendance_book_marked, sender=model, dispatch_uid=f'attendance_book_bulk_{model.__name__}')
+
+post_save.connect(attendance_books_changed, sender=AttendanceBook, dispatch_uid='attendance_books_save')
+post_delete.connect(attendance_books_changed, sender=AttendanceBook, dispatch_uid='attendance_books_delete')
+m2m_changed.connect(attendance_books_changed, sender=AttendanceBook.students.through, dispatch_uid='attendance_books_students')
+bulk_saved.connect(attendance_books_changed, sender=AttendanceBook.students.through, dispatch_uid='attendance_books_bulk')
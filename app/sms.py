@@ -0,0 +1,353 @@
+import json
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import requests
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+
+from app.models import SmsJob, SmsMessage, Student
+
+logger = logging.getLogger(__name__)
+
+
+# Failure the provider reported or that happened on the way there.
+# retryable is False when the provider may have accepted the message anyway, e.g. after a read timeout.
+class SmsSendError(Exception):
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+# Base provider: one round trip per message unless a subclass knows how to batch
+class SmsProvider:
+    batch_size = 1
+
+    def send(self, phone_number, message):
+        """Send one SMS; return the provider response or raise SmsSendError."""
+        raise NotImplementedError
+
+    def send_batch(self, items):
+        """Send [(phone_number, message), ...]; return one (sent, detail) pair per item, in order.
+
+        sent is True, False when the message can be sent again, or None when
+        the provider may have accepted it and it must not be resent.
+        """
+        results = []
+        for phone_number, message in items:
+            try:
+                results.append((True, self.send(phone_number, message)))
+            except SmsSendError as e:
+                results.append((False if e.retryable else None, str(e)))
+        return results
+
+
+# Textlocal over one pooled HTTP session shared by all worker threads
+class TextlocalProvider(SmsProvider):
+    url = 'https://api.textlocal.in/send/'
+    bulk_url = 'https://api.textlocal.in/bulk_json/'
+
+    def __init__(self):
+        self.batch_size = settings.SMS_BATCH_SIZE
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.SMS_MAX_CONCURRENCY)
+        self.session.mount('https://', adapter)
+
+    def post(self, url, data):
+        try:
+            response = self.session.post(url, data=data, timeout=settings.SMS_TIMEOUT)
+            response_json = response.json()
+        except requests.ConnectTimeout as e:
+            # Nothing reached the provider
+            raise SmsSendError(str(e)) from e
+        except (requests.RequestException, ValueError) as e:
+            # The request may have been delivered and acted on before the failure
+            raise SmsSendError(str(e), retryable=False) from e
+
+        if response_json.get('status') != 'success':
+            raise SmsSendError(error_message(response_json))
+        return response_json
+
+    def send(self, phone_number, message):
+        return self.post(self.url, {
+            'apikey': settings.TEXTLOCAL_API_KEY,
+            'numbers': phone_number,
+            'message': message,
+            'sender': settings.TEXTLOCAL_SENDER_ID,
+        })
+
+    def send_batch(self, items):
+        # Identical bodies go out as one send/ call with many numbers; the rest are packed into bulk_json/ calls
+        by_body = {}
+        for index, (phone_number, message) in enumerate(items):
+            by_body.setdefault(message, []).append(index)
+
+        results = [None] * len(items)
+        singles = []
+        for message, indexes in by_body.items():
+            if len(indexes) == 1:
+                singles.extend(indexes)
+                continue
+            for chunk in chunked(indexes, self.batch_size):
+                self.deliver(results, items, chunk, lambda chunk=chunk, message=message: self.post(self.url, {
+                    'apikey': settings.TEXTLOCAL_API_KEY,
+                    'numbers': ','.join(items[index][0] for index in chunk),
+                    'message': message,
+                    'sender': settings.TEXTLOCAL_SENDER_ID,
+                }))
+        for chunk in chunked(singles, self.batch_size):
+            self.deliver(results, items, chunk, lambda chunk=chunk: self.post(self.bulk_url, {
+                'apikey': settings.TEXTLOCAL_API_KEY,
+                'data': json.dumps({
+                    'sender': settings.TEXTLOCAL_SENDER_ID,
+                    'messages': [{'number': items[index][0], 'text': items[index][1]} for index in chunk],
+                }),
+            }))
+        return results
+
+    def deliver(self, results, items, chunk, call):
+        """Run one bulk call and map its outcome back onto the chunk's items.
+
+        A successful call sends every number of the chunk except those the
+        response explicitly rejects.
+        """
+        try:
+            response_json = call()
+        except SmsSendError as e:
+            for index in chunk:
+                results[index] = (False if e.retryable else None, str(e))
+            return
+
+        rejected = rejected_numbers(response_json)
+        for index in chunk:
+            if number_key(items[index][0]) in rejected:
+                results[index] = (False, error_message(response_json, 'Rejected by provider'))
+            else:
+                results[index] = (True, {'status': 'success', 'batch_id': response_json.get('batch_id')})
+
+
+# Local stand-in for load tests and development; nothing leaves the process
+class FakeProvider(SmsProvider):
+    outbox = []
+    calls = 0
+    outbox_lock = threading.Lock()
+
+    def __init__(self, latency=0.0, failure_rate=0.0):
+        self.batch_size = settings.SMS_BATCH_SIZE
+        self.latency = getattr(settings, 'SMS_FAKE_LATENCY', latency)
+        self.failure_rate = getattr(settings, 'SMS_FAKE_FAILURE_RATE', failure_rate)
+
+    def send(self, phone_number, message):
+        return self.send_batch([(phone_number, message)])[0][1]
+
+    def send_batch(self, items):
+        # One simulated round trip per batch, with per-number failures
+        if self.latency:
+            time.sleep(self.latency)
+        results = []
+        with self.outbox_lock:
+            FakeProvider.calls += 1
+            for phone_number, message in items:
+                if random.random() < self.failure_rate:
+                    results.append((False, 'Simulated failure'))
+                else:
+                    self.outbox.append({'numbers': phone_number, 'message': message})
+                    results.append((True, {'status': 'success'}))
+        return results
+
+
+def chunked(values, size):
+    return [values[start:start + size] for start in range(0, len(values), size)]
+
+
+def normalize_number(phone_number):
+    return ''.join(ch for ch in str(phone_number) if ch.isdigit())
+
+
+def number_key(phone_number):
+    """Last 10 digits of a number: Textlocal reports 91XXXXXXXXXX whether or not the request had the country code."""
+    return normalize_number(phone_number)[-10:]
+
+
+def rejected_numbers(response_json):
+    """Numbers a successful Textlocal send/ or bulk_json/ response explicitly reports as not queued."""
+    rejected = set()
+    for batch in response_json.get('batches', []):
+        if batch.get('status', 'success') != 'success':
+            # A failed batch of a bulk_json/ call: none of its messages were queued
+            rejected.update(number_key(message.get('recipient') or message.get('number') or '') for message in batch.get('messages', []))
+        else:
+            rejected.update(rejected_numbers(batch))
+    for message in response_json.get('messages', []):
+        if message.get('status', 'success') != 'success':
+            rejected.add(number_key(message.get('recipient') or message.get('number') or ''))
+    for number in response_json.get('invalid_numbers', []):
+        rejected.add(number_key(number))
+    rejected.discard('')
+    return rejected
+
+
+def error_message(response_json, default='Unknown error'):
+    for key in ('errors', 'warnings'):
+        if response_json.get(key):
+            return response_json[key][0].get('message', default)
+    return default
+
+
+def get_sms_provider():
+    return import_string(settings.SMS_PROVIDER)()
+
+
+# Parent message for one absentee, in the format approved for the Textlocal template
+def build_absentee_message(student_id, student_data, selected_date):
+    formatted_date = datetime.strptime(str(selected_date), '%Y-%m-%d').strftime('%d/%m/%Y')
+    absent_class_count = len(student_data['absent_sessions'])
+    absent_sessions = ",".join(
+        [f"{session['session']}" for session in student_data['absent_sessions']]
+    )
+    return (
+        f"Dear Parent,\nThis is to inform you that {student_data['full_name'][:20]} ( {student_id[:15]}) was absent for {str(absent_class_count)[:1]} classes ( {absent_sessions[:14]}) on {formatted_date[:8]}.\nRegards,\nPrincipal, BCK"
+    )
+
+
+# Persist one SmsJob with a pending message per absentee that has a parent number
+@transaction.atomic
+def create_absentee_sms_job(absentee_details, selected_date, source='manual'):
+    """Create the job of a manual send, or reuse the scheduled job of the date.
+
+    Scheduled jobs skip students whose parents were already sent an SMS for
+    that date, so a retried or repeated beat run never notifies them twice.
+    """
+    student_pks = dict(Student.objects.filter(
+        user__userid__in=list(absentee_details)
+    ).values_list('user__userid', 'user_id'))
+
+    if source == 'scheduled':
+        job, created = SmsJob.objects.get_or_create(date=selected_date, source='scheduled')
+        notified = set(SmsMessage.objects.filter(
+            job__date=selected_date, status='sent',
+        ).values_list('student_id', flat=True))
+    else:
+        job = SmsJob.objects.create(date=selected_date)
+        notified = set()
+
+    SmsMessage.objects.bulk_create([
+        SmsMessage(
+            job=job,
+            student_id=student_pks.get(student_id),
+            phone_no="91" + student_data['parent_phoneno'],
+            message=build_absentee_message(student_id, student_data, selected_date),
+        )
+        for student_id, student_data in absentee_details.items()
+        if student_data['parent_phoneno'] and student_pks.get(student_id) not in notified
+    ], ignore_conflicts=source == 'scheduled')
+    return job
+
+
+# One job at a time per process; each job fans out to SMS_MAX_CONCURRENCY sender threads.
+# Jobs a stopped process leaves queued or running are finished by the resume_sms_jobs command.
+job_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sms-job')
+
+
+def enqueue_sms_job(job):
+    """Run the job in the background once the transaction that created it has committed."""
+    transaction.on_commit(lambda: job_executor.submit(run_sms_job, job.pk))
+
+
+def run_sms_job(job_id):
+    try:
+        job = SmsJob.objects.get(pk=job_id)
+        job.status = 'running'
+        job.save(update_fields=['status'])
+
+        provider = get_sms_provider()
+        pending = claim_messages(job.messages.values_list('id', flat=True))
+        # Sender threads only talk to the provider; outcomes are saved here as each batch completes
+        with ThreadPoolExecutor(max_workers=settings.SMS_MAX_CONCURRENCY, thread_name_prefix='sms-send') as senders:
+            batches = chunked(pending, provider.batch_size)
+            for batch in senders.map(lambda batch: send_with_retry(provider, batch), batches):
+                save_outcomes(batch)
+
+        finish_job(job_id)
+    except Exception:
+        logger.exception('SMS job %s failed', job_id)
+        SmsJob.objects.filter(pk=job_id).update(status='failed', finished_at=timezone.now())
+    finally:
+        close_old_connections()
+
+
+# Checkpointing: a message is claimed ('sending') before it is sent and saved as 'sent'/'failed' after
+@transaction.atomic
+def claim_messages(message_ids):
+    """Mark the still-pending messages among message_ids as being sent and return them.
+
+    The rows are locked while they are claimed, so two workers given the same
+    ids never both send a message; rows another worker already claimed or
+    finished are skipped.
+    """
+    claimed = list(SmsMessage.objects.select_for_update().filter(id__in=list(message_ids), status='pending'))
+    SmsMessage.objects.filter(id__in=[message.id for message in claimed]).update(status='sending', claimed_at=timezone.now())
+    return claimed
+
+
+def save_outcomes(batch):
+    SmsMessage.objects.bulk_update(batch, ['status', 'attempts', 'response', 'sent_at'])
+
+
+def finish_job(job_id):
+    """Mark the job done once none of its messages is waiting or in flight."""
+    if not SmsMessage.objects.filter(job_id=job_id, status__in=['pending', 'sending']).exists():
+        SmsJob.objects.filter(pk=job_id).update(status='done', finished_at=timezone.now())
+
+
+# Messages a crashed or failing worker claimed but never saved an outcome for
+def expire_stale_messages():
+    """Fail the messages left 'sending' longer than SMS_SENDING_TIMEOUT and finish their jobs.
+
+    The provider may have accepted them before the worker stopped, so they
+    are reported as failed rather than sent again. Returns how many expired.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.SMS_SENDING_TIMEOUT)
+    stale = SmsMessage.objects.filter(Q(claimed_at__lt=cutoff) | Q(claimed_at__isnull=True), status='sending')
+    job_ids = set(stale.values_list('job_id', flat=True))
+    expired = stale.update(status='failed', response='No outcome saved before SMS_SENDING_TIMEOUT; not resent')
+    for job_id in job_ids:
+        finish_job(job_id)
+    return expired
+
+
+def send_with_retry(provider, batch):
+    """Send a batch of messages, retrying the failed ones with exponential backoff; set their outcome fields (unsaved).
+
+    Messages whose outcome is unknown (sent is None) are marked failed and
+    never retried, since the provider may already have delivered them.
+    """
+    remaining = batch
+    for attempt in range(1, settings.SMS_MAX_ATTEMPTS + 1):
+        results = provider.send_batch([(message.phone_no, message.message) for message in remaining])
+        failed = []
+        for message, (sent, detail) in zip(remaining, results):
+            message.attempts = attempt
+            if sent:
+                message.response = json.dumps(detail)
+                message.status = 'sent'
+                message.sent_at = timezone.now()
+            else:
+                message.response = detail if sent is False else f'Outcome unknown, not resent: {detail}'
+                message.status = 'failed'
+                if sent is False:
+                    failed.append(message)
+        remaining = failed
+        if not remaining:
+            break
+        if attempt < settings.SMS_MAX_ATTEMPTS:
+            time.sleep(settings.SMS_RETRY_BACKOFF * 2 ** (attempt - 1))
+    return batch
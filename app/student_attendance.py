@@ -0,0 +1,69 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import FilteredRelation, Q
+from django.db.models.functions import Coalesce
+
+from app.models import AttendanceBook
+from app.versions import ATTENDANCE_BOOKS_VERSION, book_cache_key, get_version
+
+
+def percentage(attended_hours, total_hours):
+    return round(attended_hours / total_hours * 100, 2) if total_hours > 0 else 0
+
+
+# Totals of one student across all the books they are enrolled in
+def compute_student_attendance(student_id):
+    """Return the student's books with weighted total/attended hours, plus the overall figures, in one query.
+
+    Hours come from the maintained AttendanceSummary rows, already weighted by
+    book_type, joined onto the student's books; a book not marked yet counts
+    as zero hours. The overall percentage adds up the hours of every book, so
+    a 3 hour practical weighs three times a theory class.
+    """
+    books = list(AttendanceBook.objects.filter(students=student_id).annotate(
+        summary=FilteredRelation('attendancesummary', condition=Q(attendancesummary__student=student_id)),
+    ).values(
+        'id', 'name', 'book_code', 'book_type',
+        attended_hours=Coalesce('summary__attended_hours', 0),
+        total_hours=Coalesce('summary__total_hours', 0),
+    ).order_by('id'))
+
+    attendance_data = [
+        {
+            'book': {'id': book['id'], 'name': book['name'], 'book_code': book['book_code'], 'book_type': book['book_type']},
+            'total_classes': book['total_hours'],
+            'attended_classes': book['attended_hours'],
+            'percentage': percentage(book['attended_hours'], book['total_hours']),
+        }
+        for book in books
+    ]
+    total_hours = sum(book['total_hours'] for book in books)
+    attended_hours = sum(book['attended_hours'] for book in books)
+    return {
+        'books': attendance_data,
+        'total_classes': total_hours,
+        'attended_classes': attended_hours,
+        'percentage': percentage(attended_hours, total_hours),
+    }
+
+
+def student_book_ids(student_id):
+    """Ids of the books the student is enrolled in, cached until books or enrollments change."""
+    return cache.get_or_set(
+        f'student-books:{get_version(ATTENDANCE_BOOKS_VERSION)}:{student_id}',
+        lambda: list(AttendanceBook.objects.filter(students=student_id).order_by('id').values_list('id', flat=True)),
+        getattr(settings, 'ATTENDANCE_CACHE_TIMEOUT', 86400),
+    )
+
+
+def get_student_attendance(student_id):
+    """Cached compute_student_attendance, keyed on the versions of the student's books.
+
+    The versions are read before the totals are computed, so totals computed
+    while a session is being marked are stored under a key no later read uses.
+    """
+    return cache.get_or_set(
+        book_cache_key(f'student-attendance:{student_id}', student_book_ids(student_id)),
+        lambda: compute_student_attendance(student_id),
+        getattr(settings, 'ATTENDANCE_CACHE_TIMEOUT', 86400),
+    )
@@ -1,35 +1,101 @@
 from django.utils import timezone
 from app.models import AttendanceRecord
+from app.packed import packed_absences
 from django.conf import settings
 from twilio.rest import Client
+from celery import group, shared_task
+from app.sms import (
+    chunked, claim_messages, create_absentee_sms_job, expire_stale_messages, finish_job, get_sms_provider, save_outcomes,
+    send_with_retry,
+)
 
 # USED
 def get_absent_details_by_date(selected_date):
-    # Fetch all attendance records for the selected date where status is False (absent)
-    print(selected_date)
-    absentees = AttendanceRecord.objects.filter(date=selected_date, status=False)
-    
+    # Fetch all attendance records for the selected date where status is False (absent),
+    # joined with the student, user and book columns in one query and streamed in chunks
+    absentees = AttendanceRecord.objects.filter(date=selected_date, status=False).order_by(
+        'student__user__userid', 'session'
+    ).values_list(
+        'student__user__userid',
+        'student__user__fullname',
+        'student__parent_phoneno',
+        'attendance_book__book_code',
+        'attendance_book__name',
+        'session',
+    )
+
     absentee_details = {}
-    for record in absentees:
-        student = record.student
-        student_key = student.user.userid
-        
-        if student_key not in absentee_details:
-            absentee_details[student_key] = {
-                'full_name': student.user.fullname,
-                'parent_phoneno': student.parent_phoneno,
+    for userid, fullname, parent_phoneno, book_code, book_name, session in absentees.iterator(chunk_size=2000):
+        if userid not in absentee_details:
+            absentee_details[userid] = {
+                'full_name': fullname,
+                'parent_phoneno': parent_phoneno,
                 'absent_sessions': []
             }
-        
-        absentee_details[student_key]['absent_sessions'].append({
-            'subject_code': record.attendance_book.book_code,
-            'subject_name': record.attendance_book.name,
-            'session': record.session
+
+        absentee_details[userid]['absent_sessions'].append({
+            'subject_code': book_code,
+            'subject_name': book_name,
+            'session': session
         })
-    
+
+    # Absences of books stored as packed sessions
+    for absence in packed_absences(selected_date, selected_date):
+        absentee_details.setdefault(absence['student__user__userid'], {
+            'full_name': absence['student__user__fullname'],
+            'parent_phoneno': absence['student__parent_phoneno'],
+            'absent_sessions': []
+        })['absent_sessions'].append({
+            'subject_code': absence['attendance_book__book_code'],
+            'subject_name': absence['attendance_book__name'],
+            'session': absence['session']
+        })
+    for details in absentee_details.values():
+        details['absent_sessions'].sort(key=lambda session: session['session'])
+
     return absentee_details
 
 
+# Scheduled daily (CELERY_BEAT_SCHEDULE): notify the parents of the day's absentees
+@shared_task
+def send_bulk_sms_to_absentees(selected_date=None):
+    selected_date = selected_date or timezone.localdate().isoformat()
+    absentee_details = get_absent_details_by_date(selected_date)
+
+    # Reuses the date's job on a retry or a repeated beat; already notified students are not queued again
+    job = create_absentee_sms_job(absentee_details, selected_date, source='scheduled')
+    pending = list(job.messages.filter(status='pending').values_list('id', flat=True))
+    chunks = chunked(pending, settings.SMS_BATCH_SIZE)
+
+    if chunks:
+        job.status = 'running'
+        job.save(update_fields=['status'])
+        group(send_absentee_sms_chunk.s(job.pk, chunk) for chunk in chunks).apply_async()
+    else:
+        job.status = 'done'
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'finished_at'])
+    return {'job_id': job.pk, 'messages': len(pending), 'chunks': len(chunks)}
+
+
+# One provider batch of a scheduled job, run by any worker
+@shared_task(autoretry_for=(Exception,), retry_backoff=True, max_retries=3)
+def send_absentee_sms_chunk(job_id, message_ids):
+    # Only messages still pending are claimed, so a redelivered or retried chunk never re-sends.
+    # A worker dying or failing mid-send leaves its rows 'sending'; expire_stale_sms fails them, unsent.
+    batch = claim_messages(message_ids)
+    if batch:
+        save_outcomes(send_with_retry(get_sms_provider(), batch))
+    finish_job(job_id)
+    return {'job_id': job_id, 'sent': sum(1 for message in batch if message.status == 'sent'), 'claimed': len(batch)}
+
+
+# Scheduled (CELERY_BEAT_SCHEDULE): close out messages whose chunk never saved an outcome
+@shared_task
+def expire_stale_sms():
+    return {'expired': expire_stale_messages()}
+
+
 def send_sms_to_absentees(absentee_details,selected_date):
 
     # Initialize Twilio client
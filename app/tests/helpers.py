@@ -0,0 +1,25 @@
+import datetime
+
+from app.models import AttendanceBook, Course, CustomUser, Department, Student, Teacher
+
+
+# A department, course and teacher, and one book taught to `students` new students
+def make_book(students=3, book_type='1', storage='rows', prefix='T'):
+    department = Department.objects.create(dept_id=f'{prefix}D', name=f'Department {prefix}')
+    course = Course.objects.create(course_id=f'{prefix}C', name=f'Course {prefix}')
+    teacher = Teacher.objects.create(
+        user=CustomUser.objects.create_user(f'{prefix}T', 'password', role='teacher', fullname='Teacher'),
+        department=department, photo_url='',
+    )
+    enrolled = [
+        Student.objects.create(
+            user=CustomUser.objects.create_user(f'{prefix}S{i:03d}', 'password', role='student', fullname=f'Student {i}'),
+            usn=f'{prefix}U{i:03d}', parent_phoneno=f'98765{i:05d}', course=course, year='1', section='A',
+            gender='M', dob=datetime.date(2005, 1, 1), photo_url='',
+        )
+        for i in range(students)
+    ]
+    book = AttendanceBook.objects.create(name=f'Book {prefix}', book_code=f'{prefix}B', book_type=book_type, storage=storage)
+    book.teachers.add(teacher)
+    book.students.set(enrolled)
+    return book, enrolled
@@ -0,0 +1,35 @@
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from app.hashers import PROVISIONED_PASSWORD
+from app.models import CustomUser
+from app.tests.helpers import make_book
+
+
+# A teacher imported on the shared default password, as upload_teachers_csv creates them
+@override_settings(DEFAULT_ACCOUNT_PASSWORD='Welcome@12345')
+class ProvisionedAccountTests(TestCase):
+    def setUp(self):
+        make_book(students=1)
+        CustomUser.objects.filter(userid='TT').update(password=PROVISIONED_PASSWORD, must_change_password=True)
+        self.change_url = reverse('teacher_change_password')
+
+    def change(self, password):
+        return self.client.post(self.change_url, {
+            'old_password': 'Welcome@12345', 'new_password1': password, 'new_password2': password,
+        })
+
+    def test_first_login_leads_to_a_password_change(self):
+        response = self.client.post(reverse('login'), {'username': 'TT', 'password': 'Welcome@12345'})
+        self.assertRedirects(response, self.change_url, fetch_redirect_response=False)
+        # Nothing else is served until the password is changed
+        self.assertRedirects(self.client.get(reverse('teacher_dashboard')), self.change_url, fetch_redirect_response=False)
+
+        self.change('Welcome@12345')
+        self.assertTrue(CustomUser.objects.get(userid='TT').must_change_password)
+
+        self.change('A-new-passw0rd')
+        user = CustomUser.objects.get(userid='TT')
+        self.assertFalse(user.must_change_password)
+        self.assertTrue(user.check_password('A-new-passw0rd'))
+        self.assertEqual(self.client.get(reverse('teacher_dashboard')).status_code, 200)
@@ -0,0 +1,40 @@
+import datetime
+import importlib.util
+import os
+import tempfile
+import unittest
+
+from django.test import SimpleTestCase
+
+from app.analytics import NO_DEPARTMENT, attendance_report, load_history, standard_reports
+
+HAS_ANALYTICS = all(importlib.util.find_spec(name) for name in ('numpy', 'pandas', 'pyarrow'))
+
+
+@unittest.skipUnless(HAS_ANALYTICS, 'needs numpy, pandas and pyarrow')
+class AttendanceReportTests(SimpleTestCase):
+    def load(self, **columns):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        path = os.path.join(tempfile.mkdtemp(), 'history.parquet')
+        self.addCleanup(os.remove, path)
+        pq.write_table(pa.table(columns), path)
+        return load_history(path)
+
+    def test_missing_values_are_reported_not_dropped(self):
+        import pyarrow as pa
+
+        history = self.load(
+            date=[datetime.date(2024, 7, 1)] * 3,
+            session=['1', '1', '2'],
+            present=[True, False, True],
+            weight=pa.array([1, 1, 2], pa.int8()),
+            section=[None, 'A', 'A'],
+            department=['D1', None, None],
+        )
+        departments = standard_reports(history, ['department'])['department'].set_index('department')
+        self.assertEqual(departments.loc[NO_DEPARTMENT, 'total_hours'], 3)
+        self.assertEqual(departments['total_hours'].sum(), 4)
+        # Any other missing key keeps its rows too
+        self.assertEqual(attendance_report(history, ['section'])['total_hours'].sum(), 4)
@@ -0,0 +1,34 @@
+import json
+
+from django.test import TestCase
+from django.urls import reverse
+
+from app.models import CustomUser
+from app.tests.helpers import make_book
+
+
+class RosterFormTests(TestCase):
+    def setUp(self):
+        self.book, self.students = make_book(students=4)
+        self.userids = [student.user.userid for student in self.students]
+        self.book.students.remove(self.students[3])
+        self.client.force_login(CustomUser.objects.create_user('AD', 'password', role='admin', fullname='Admin'))
+        self.url = reverse('add_attendance_book_student', args=[self.book.pk])
+
+    def roster(self):
+        return set(self.book.students.values_list('user__userid', flat=True))
+
+    def test_form_replaces_the_roster(self):
+        # Students 0 and 1 stay, 2 is unticked, 3 is added
+        self.client.post(self.url, {'students': ','.join([self.userids[0], self.userids[1], self.userids[3]])})
+        self.assertEqual(self.roster(), {self.userids[0], self.userids[1], self.userids[3]})
+
+    def test_rules_and_picked_students_are_both_kept(self):
+        self.client.post(self.url, {'students': self.userids[0], 'rules': json.dumps([{'section': 'B'}])})
+        self.assertEqual(self.roster(), {self.userids[0]})
+        self.client.post(self.url, {'rules': json.dumps([{'course': 'TC', 'section': 'A'}])})
+        self.assertEqual(self.roster(), set(self.userids))
+
+    def test_empty_submission_keeps_the_roster(self):
+        self.client.post(self.url, {'students': '', 'rules': '[]'})
+        self.assertEqual(self.roster(), set(self.userids[:3]))
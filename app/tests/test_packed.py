@@ -0,0 +1,204 @@
+import datetime
+import random
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from app.attendance import build_attendance_matrix, compute_attendance_summaries, mark_book_attendance, with_running_count
+from app.history import HISTORY_COLUMNS, history_records
+from app.models import AttendanceRecord, AttendanceSession, AttendanceSummary
+from app.reports import absentee_summary, attach_absent_sessions, filter_absences, shortage_list, stream_absentee_csv
+from app.tests.helpers import make_book
+
+DATE = datetime.date(2024, 7, 1)
+
+
+class PackedStorageTests(TestCase):
+    def setUp(self):
+        self.book, self.students = make_book(students=3)
+        self.userids = [student.user.userid for student in self.students]
+
+    def summaries(self):
+        return {
+            summary.student_id: (summary.attended_hours, summary.total_hours)
+            for summary in AttendanceSummary.objects.filter(attendance_book=self.book)
+        }
+
+    def switch(self, storage):
+        self.book.storage = storage
+        self.book.save()
+
+    def assert_marked_once(self, cells):
+        matrix = build_attendance_matrix(self.book)
+        self.assertEqual(matrix['columns'], [(DATE, '1')])
+        self.assertEqual([row['cells'] for row in matrix['rows']], cells)
+        self.assertTrue(all(row['percentage'] <= 100 for row in matrix['rows']))
+        self.assertEqual(self.summaries(), {
+            student.pk: (1 if cell == ['P'] else 0, 1) for student, cell in zip(self.students, cells)
+        })
+        # The maintained summaries agree with a recount of both layouts
+        self.assertEqual(
+            {student_id: hours for (book_id, student_id), hours in compute_attendance_summaries().items()},
+            self.summaries(),
+        )
+        records, packed = filter_absences(DATE, DATE)
+        self.assertEqual(
+            sum(row['absent_count'] for row in absentee_summary(records, packed)),
+            sum(cell == ['A'] for cell in cells),
+        )
+
+    def test_layouts_give_the_same_matrix(self):
+        packed_book, packed_students = make_book(students=3, storage='packed', prefix='P')
+        mark_book_attendance(self.book, DATE, '1', self.userids[:1])
+        mark_book_attendance(packed_book, DATE, '1', [student.user.userid for student in packed_students[:1]])
+
+        rows = build_attendance_matrix(self.book)
+        packed = build_attendance_matrix(packed_book)
+        self.assertEqual(rows['columns'], packed['columns'])
+        self.assertEqual([row['cells'] for row in rows['rows']], [row['cells'] for row in packed['rows']])
+        self.assertEqual([row['percentage'] for row in rows['rows']], [row['percentage'] for row in packed['rows']])
+
+    def test_remarking_after_switching_to_packed_converts_the_rows(self):
+        mark_book_attendance(self.book, DATE, '1', self.userids[:2])
+        self.switch('packed')
+        result = mark_book_attendance(self.book, DATE, '1', self.userids[:1])
+
+        self.assertEqual((result['created'], result['updated']), (0, 3))
+        self.assertFalse(AttendanceRecord.objects.filter(attendance_book=self.book).exists())
+        self.assertEqual(AttendanceSession.objects.filter(attendance_book=self.book).count(), 1)
+        self.assert_marked_once([['P'], ['A'], ['A']])
+
+    def test_remarking_after_switching_to_rows_converts_the_session(self):
+        self.switch('packed')
+        mark_book_attendance(self.book, DATE, '1', self.userids[:2])
+        self.switch('rows')
+        result = mark_book_attendance(self.book, DATE, '1', self.userids[:1])
+
+        self.assertEqual((result['created'], result['updated']), (0, 3))
+        self.assertFalse(AttendanceSession.objects.filter(attendance_book=self.book).exists())
+        self.assertEqual(AttendanceRecord.objects.filter(attendance_book=self.book).count(), 3)
+        self.assert_marked_once([['P'], ['A'], ['A']])
+
+    def test_conversion_keeps_the_marks_of_students_who_left(self):
+        self.switch('packed')
+        mark_book_attendance(self.book, DATE, '1', self.userids)
+        self.book.students.remove(self.students[2])
+        self.switch('rows')
+        mark_book_attendance(self.book, DATE, '1', [])
+
+        self.assertEqual(dict(AttendanceRecord.objects.filter(attendance_book=self.book).values_list('student_id', 'status')), {
+            self.students[0].pk: False, self.students[1].pk: False, self.students[2].pk: True,
+        })
+        self.assertEqual(self.summaries()[self.students[2].pk], (1, 1))
+
+    def test_running_count_over_mixed_layouts(self):
+        # Back-dated and repeated marks in both layouts, switching storage between them
+        randomizer = random.Random(25)
+        self.book.book_type = '2'
+        for step in range(60):
+            self.switch(randomizer.choice(['rows', 'packed']))
+            date = DATE + datetime.timedelta(days=randomizer.randrange(6))
+            mark_book_attendance(self.book, date, randomizer.choice('12'), randomizer.sample(self.userids, randomizer.randrange(4)))
+
+            with self.subTest(step=step):
+                records = with_running_count(AttendanceRecord.objects.filter(attendance_book=self.book))
+                self.assertEqual(
+                    [(record.count, record.running_count) for record in records if record.count != record.running_count], [],
+                )
+                self.assertEqual(
+                    {student_id: hours for (book_id, student_id), hours in compute_attendance_summaries().items()},
+                    self.summaries(),
+                )
+
+
+# Readers over a period: the same answers whichever layout a book's sessions are stored in
+class PackedReaderTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.rows_book, rows_students = make_book(students=4)
+        cls.packed_book, packed_students = make_book(students=4, storage='packed', prefix='P')
+        for book, students in ((cls.rows_book, rows_students), (cls.packed_book, packed_students)):
+            userids = [student.user.userid for student in students]
+            for day in range(3):
+                mark_book_attendance(book, DATE + datetime.timedelta(days=day), '1', userids[:day + 1])
+        # A session marked before the packed book switched storage, then never re-marked
+        cls.packed_book.storage = 'rows'
+        mark_book_attendance(cls.packed_book, DATE + datetime.timedelta(days=3), '1', [])
+        cls.packed_book.storage = 'packed'
+
+    def shortage(self, **dates):
+        return [
+            (row['student__user__userid'], row['attendance_book__book_code'], row['attended_hours'], row['total_hours'])
+            for row in shortage_list(75, **dates).iterator()
+        ]
+
+    def test_shortage_over_a_range_counts_packed_sessions(self):
+        everything = self.shortage()
+        self.assertEqual(len(everything), 6)
+        self.assertEqual(self.shortage(from_date=DATE, to_date=DATE + datetime.timedelta(days=3)), everything)
+        self.assertEqual(self.shortage(from_date=DATE), everything)
+
+    def test_merged_shortage_pages_like_a_list(self):
+        rows = shortage_list(101, from_date=DATE)
+        full = list(rows.iterator())
+        self.assertEqual(rows.count(), len(full))
+        for start in range(len(full) + 1):
+            for stop in range(start, len(full) + 2):
+                self.assertEqual(rows[start:stop], full[start:stop])
+
+    def test_merged_absentee_summary_pages_like_a_list(self):
+        # A student of both books, absent from each on the same day, has one row for the day
+        shared = self.rows_book.students.first()
+        self.packed_book.students.add(shared)
+        later = DATE + datetime.timedelta(days=4)
+        mark_book_attendance(self.rows_book, later, '1', [])
+        mark_book_attendance(self.packed_book, later, '1', [])
+
+        records, packed = filter_absences(DATE, later)
+        summary = absentee_summary(records, packed)
+        full = list(summary)
+        self.assertEqual(summary.count(), len(full))
+        self.assertEqual(len({(row['date'], row['student_id']) for row in full}), len(full))
+        self.assertEqual([row['absent_count'] for row in full if row['student_id'] == shared.pk and row['date'] == later], [2])
+        for start in range(len(full) + 1):
+            for stop in range(start, len(full) + 2):
+                self.assertEqual(summary[start:stop], full[start:stop])
+
+        page = attach_absent_sessions(summary[len(full) - 4:], records, packed)
+        self.assertEqual([len(row['absent_sessions']) for row in page], [row['absent_count'] for row in page])
+        lines = list(stream_absentee_csv(records, packed, chunk_size=2))
+        self.assertEqual(len(lines) - 1, sum(row['absent_count'] for row in full))
+
+    def test_history_includes_packed_sessions(self):
+        columns = [name for lookup, name, type_name in HISTORY_COLUMNS]
+        history = [dict(zip(columns, row)) for row in history_records()]
+
+        self.assertEqual(len(history), 4 * 3 + 4 * 4)
+        self.assertEqual(sum(row['book_code'] == 'PB' for row in history), 16)
+        keys = [(row['date'], row['book_id'], row['session']) for row in history]
+        self.assertEqual(keys, sorted(keys))
+        self.assertEqual(
+            sum(row['present'] for row in history if row['book_code'] == 'PB'),
+            sum(row['present'] for row in history if row['book_code'] == 'TB'),
+        )
+
+
+class RebuildSummaryTests(TestCase):
+    def test_rebuild_recounts_each_book(self):
+        rows_book, rows_students = make_book(students=2)
+        packed_book, packed_students = make_book(students=2, storage='packed', prefix='P')
+        mark_book_attendance(rows_book, DATE, '1', [rows_students[0].user.userid])
+        mark_book_attendance(packed_book, DATE, '1', [packed_students[1].user.userid])
+        expected = compute_attendance_summaries()
+        AttendanceSummary.objects.update(attended_hours=0)
+
+        call_command('rebuild_attendance_summary', stdout=StringIO())
+
+        self.assertEqual(compute_attendance_summaries(book_ids=[packed_book.pk]), {
+            key: hours for key, hours in expected.items() if key[0] == packed_book.pk
+        })
+        self.assertEqual({
+            (summary.attendance_book_id, summary.student_id): (summary.attended_hours, summary.total_hours)
+            for summary in AttendanceSummary.objects.all()
+        }, expected)
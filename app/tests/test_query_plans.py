@@ -0,0 +1,39 @@
+import datetime
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+
+from app.attendance import mark_book_attendance
+from app.models import AttendanceRecord
+from app.tests.helpers import make_book
+
+
+# The indexes the attendance hot paths rely on, checked against the real query plans
+class QueryPlanTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.book, cls.students = make_book(students=3)
+        mark_book_attendance(cls.book, datetime.date(2024, 7, 1), '1', [cls.students[0].user.userid])
+
+    def setUp(self):
+        if connection.vendor not in ('postgresql', 'sqlite'):
+            self.skipTest(f'Query plan checks are not supported on {connection.vendor}.')
+
+    def explain(self, queryset):
+        if connection.vendor == 'postgresql':
+            # As check_query_plans does: tiny test tables would otherwise always be scanned
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+    def test_hot_queries_use_an_index(self):
+        output = StringIO()
+        call_command('check_query_plans', stdout=output, stderr=StringIO())
+        self.assertIn('All hot queries use an index.', output.getvalue())
+
+    def test_absentees_use_the_partial_index(self):
+        absentees = AttendanceRecord.objects.filter(date=datetime.date(2024, 7, 1), status=False)
+        self.assertIn('record_absent_date_student', self.explain(absentees))
+        self.assertIn('record_absent_date_student', self.explain(absentees.values('student').distinct()))
@@ -0,0 +1,49 @@
+import datetime
+from unittest import mock
+
+from django.test import TestCase
+
+from app.attendance import mark_book_attendance
+from app.models import CustomUser, Department, Teacher
+from app.reports import CODE_POINT_COLLATIONS, shortage_list, shortage_order
+from app.tests.helpers import make_book
+
+DATE = datetime.date(2024, 7, 1)
+
+
+class ShortageListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Taught by teachers of departments TD and ZD; the list files the book under TD, the lower id
+        cls.book, cls.students = make_book(students=2)
+        cls.other_department = Department.objects.create(dept_id='ZD', name='Department Z')
+        cls.book.teachers.add(Teacher.objects.create(
+            user=CustomUser.objects.create_user('ZT', 'password', role='teacher', fullname='Teacher Z'),
+            department=cls.other_department, photo_url='',
+        ))
+        mark_book_attendance(cls.book, DATE, '1', [])
+
+    def test_department_filter_matches_the_department_shown(self):
+        for dates in ({}, {'from_date': DATE, 'to_date': DATE}):
+            with self.subTest(**dates):
+                self.assertEqual({row['department'] for row in shortage_list(75, department='TD', **dates)}, {'TD'})
+                self.assertEqual(list(shortage_list(75, department=self.other_department, **dates)), [])
+
+
+class ShortageOrderTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Lower and upper case codes, in rows and packed books: 'Z' sorts before 'a' by code point
+        for prefix, storage in (('a', 'rows'), ('Z', 'packed'), ('b', 'packed'), ('Y', 'rows')):
+            book, students = make_book(students=2, storage=storage, prefix=prefix)
+            mark_book_attendance(book, DATE, '1', [])
+
+    def test_merged_rows_follow_one_order(self):
+        # SQLite compares by code point already; BINARY stands in for PostgreSQL's "C" to exercise the COLLATE path
+        for collations in ({}, {'sqlite': 'BINARY'}):
+            with self.subTest(collations=collations), mock.patch.dict(CODE_POINT_COLLATIONS, collations):
+                rows = shortage_list(75, from_date=DATE)
+                full = list(rows.iterator())
+                self.assertEqual([row['department'] for row in full], ['YD', 'YD', 'ZD', 'ZD', 'aD', 'aD', 'bD', 'bD'])
+                self.assertEqual(full, sorted(full, key=shortage_order))
+                self.assertEqual(rows[3:5], full[3:5])
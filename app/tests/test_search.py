@@ -0,0 +1,28 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from app.search import count_students, search_students
+from app.tests.helpers import make_book
+
+
+# The search index comes from migration 0002: FTS5 on SQLite, a trigram GIN index on PostgreSQL
+class StudentSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        make_book(students=3)
+        make_book(students=2, prefix='P')
+
+    def userids(self, term):
+        rows, next_cursor = search_students(term, limit=10)
+        return [row['user__userid'] for row in rows]
+
+    def test_substring_search(self):
+        self.assertEqual(self.userids('ts00'), ['TS000', 'TS001', 'TS002'])
+        self.assertEqual(self.userids('ps001'), ['PS001'])
+        self.assertEqual(count_students('ts00'), 3)
+
+    def test_rebuild_keeps_the_index_in_step(self):
+        call_command('rebuild_student_search', stdout=StringIO())
+        self.assertEqual(self.userids('student 1'), ['PS001', 'TS001'])
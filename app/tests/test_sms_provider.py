@@ -0,0 +1,78 @@
+from unittest import mock
+
+import requests
+from django.test import SimpleTestCase, override_settings
+
+from app.models import SmsMessage
+from app.sms import TextlocalProvider, send_with_retry
+
+
+def response(json_body):
+    return mock.Mock(json=mock.Mock(return_value=json_body))
+
+
+# How Textlocal responses map onto per-message outcomes, with the HTTP session stubbed out
+@override_settings(SMS_MAX_ATTEMPTS=3, SMS_RETRY_BACKOFF=0)
+class TextlocalProviderTests(SimpleTestCase):
+    def setUp(self):
+        self.provider = TextlocalProvider()
+        self.post = mock.patch.object(self.provider.session, 'post').start()
+        self.addCleanup(mock.patch.stopall)
+
+    def messages(self, *numbers):
+        return [SmsMessage(phone_no=number, message='Absent') for number in numbers]
+
+    def test_success_sends_every_number_whatever_its_format(self):
+        # Recipients come back with the country code; the request had it on one number only
+        self.post.return_value = response({
+            'status': 'success', 'batch_id': 7,
+            'messages': [{'id': '1', 'recipient': 919876500000}, {'id': '2', 'recipient': 919876500001}],
+        })
+        batch = send_with_retry(self.provider, self.messages('9876500000', '919876500001'))
+
+        self.assertEqual([message.status for message in batch], ['sent', 'sent'])
+        self.assertEqual(self.post.call_count, 1)
+
+    def test_success_without_recipients_counts_as_sent(self):
+        self.post.return_value = response({'status': 'success', 'batch_id': 7})
+        batch = send_with_retry(self.provider, self.messages('919876500000', '919876500001'))
+
+        self.assertEqual([message.status for message in batch], ['sent', 'sent'])
+
+    def test_explicitly_rejected_number_is_retried_alone(self):
+        self.post.side_effect = [
+            response({'status': 'success', 'invalid_numbers': ['919876500001']}),
+            response({'status': 'success'}),
+        ]
+        batch = send_with_retry(self.provider, self.messages('919876500000', '919876500001'))
+
+        self.assertEqual([message.status for message in batch], ['sent', 'sent'])
+        self.assertEqual([message.attempts for message in batch], [1, 2])
+        # The retry went out as a bulk_json/ call for the rejected number only
+        self.assertIn('919876500001', self.post.call_args.kwargs['data']['data'])
+        self.assertNotIn('919876500000', self.post.call_args.kwargs['data']['data'])
+
+    def test_unknown_outcome_is_never_resent(self):
+        self.post.side_effect = requests.ReadTimeout('read timed out')
+        batch = send_with_retry(self.provider, self.messages('919876500000', '919876500001'))
+
+        self.assertEqual([message.status for message in batch], ['failed', 'failed'])
+        self.assertTrue(batch[0].response.startswith('Outcome unknown'))
+        self.assertEqual(self.post.call_count, 1)
+
+    def test_unsent_request_is_retried(self):
+        self.post.side_effect = [requests.ConnectTimeout('connect timed out'), response({'status': 'success'})]
+        batch = send_with_retry(self.provider, self.messages('919876500000', '919876500001'))
+
+        self.assertEqual([message.status for message in batch], ['sent', 'sent'])
+        self.assertEqual(self.post.call_count, 2)
+
+    def test_provider_error_is_retried(self):
+        self.post.side_effect = [
+            response({'status': 'failure', 'errors': [{'code': 7, 'message': 'Insufficient credits'}]}),
+            response({'status': 'success'}),
+        ]
+        batch = send_with_retry(self.provider, self.messages('919876500000', '919876500001'))
+
+        self.assertEqual([message.status for message in batch], ['sent', 'sent'])
+        self.assertEqual([message.attempts for message in batch], [2, 2])
@@ -0,0 +1,116 @@
+import datetime
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from app.attendance import mark_book_attendance
+from app.models import SmsJob, SmsMessage
+from app.sms import FakeProvider, claim_messages
+from app.tasks import expire_stale_sms, send_absentee_sms_chunk, send_bulk_sms_to_absentees
+from app.tests.helpers import make_book
+from attendance_master.celery import app as celery_app
+
+DATE = datetime.date(2024, 7, 1)
+
+
+# The scheduled absentee SMS tasks on the in-memory broker, run eagerly, against the fake provider
+@override_settings(
+    CELERY_BROKER_URL='memory://',
+    SMS_PROVIDER='app.sms.FakeProvider',
+    SMS_FAKE_LATENCY=0,
+    SMS_FAKE_FAILURE_RATE=0,
+    SMS_BATCH_SIZE=2,
+    SMS_RETRY_BACKOFF=0,
+)
+class ScheduledSmsTests(TestCase):
+    def setUp(self):
+        config = {'broker_url': 'memory://', 'task_always_eager': True, 'task_eager_propagates': True}
+        previous = {key: celery_app.conf[key] for key in config}
+        celery_app.conf.update(config)
+        self.addCleanup(celery_app.conf.update, previous)
+        FakeProvider.outbox.clear()
+
+        self.book, self.students = make_book(students=5)
+        # Everyone absent except the first student
+        mark_book_attendance(self.book, DATE, '1', [self.students[0].user.userid])
+
+    def test_chunks_fan_out_and_send_every_absentee(self):
+        result = send_bulk_sms_to_absentees.delay(DATE.isoformat()).get()
+
+        self.assertEqual(result['messages'], 4)
+        self.assertEqual(result['chunks'], 2)
+        self.assertEqual(len(FakeProvider.outbox), 4)
+        job = SmsJob.objects.get(pk=result['job_id'])
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(job.messages.filter(status='sent').count(), 4)
+
+    def test_one_scheduled_job_per_date(self):
+        SmsJob.objects.create(date=DATE, source='scheduled')
+        # Manual sends for the same date are not limited
+        SmsJob.objects.create(date=DATE)
+        SmsJob.objects.create(date=DATE)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            SmsJob.objects.create(date=DATE, source='scheduled')
+
+    def test_repeated_beat_sends_nothing_twice(self):
+        first = send_bulk_sms_to_absentees.delay(DATE.isoformat()).get()
+        second = send_bulk_sms_to_absentees.delay(DATE.isoformat()).get()
+
+        self.assertEqual(second['job_id'], first['job_id'])
+        self.assertEqual(second['messages'], 0)
+        self.assertEqual(len(FakeProvider.outbox), 4)
+        self.assertEqual(SmsMessage.objects.count(), 4)
+
+    def test_redelivered_chunk_sends_nothing_twice(self):
+        result = send_bulk_sms_to_absentees.delay(DATE.isoformat()).get()
+        message_ids = list(SmsMessage.objects.values_list('id', flat=True))
+
+        redelivered = send_absentee_sms_chunk.delay(result['job_id'], message_ids).get()
+
+        self.assertEqual(redelivered['claimed'], 0)
+        self.assertEqual(len(FakeProvider.outbox), 4)
+
+    def test_stale_sending_messages_are_failed_unsent(self):
+        job = SmsJob.objects.create(date=DATE, source='scheduled', status='running')
+        message = SmsMessage.objects.create(job=job, student=self.students[1], phone_no='919876500001', message='Absent')
+        # A worker claimed the message and died before saving an outcome
+        claim_messages([message.pk])
+
+        self.assertEqual(expire_stale_sms.delay().get()['expired'], 0)
+        SmsMessage.objects.filter(pk=message.pk).update(claimed_at=timezone.now() - datetime.timedelta(hours=1))
+        self.assertEqual(expire_stale_sms.delay().get()['expired'], 1)
+
+        message.refresh_from_db()
+        job.refresh_from_db()
+        self.assertEqual(message.status, 'failed')
+        self.assertEqual(job.status, 'done')
+        # Redelivering its chunk does not send it after all
+        send_absentee_sms_chunk.delay(job.pk, [message.pk]).get()
+        self.assertEqual(FakeProvider.outbox, [])
+
+
+# A manual job left behind by a stopped process; run_sms_job manages its own connections, hence TransactionTestCase
+@override_settings(SMS_PROVIDER='app.sms.FakeProvider', SMS_FAKE_LATENCY=0, SMS_FAKE_FAILURE_RATE=0, SMS_RETRY_BACKOFF=0)
+class ResumeSmsJobsTests(TransactionTestCase):
+    def setUp(self):
+        FakeProvider.outbox.clear()
+        self.book, self.students = make_book(students=3)
+
+    def test_resume_sends_pending_and_fails_stale_sending(self):
+        job = SmsJob.objects.create(date=DATE, status='running')
+        pending = SmsMessage.objects.create(job=job, student=self.students[0], phone_no='919876500000', message='Absent')
+        stale = SmsMessage.objects.create(
+            job=job, student=self.students[1], phone_no='919876500001', message='Absent',
+            status='sending', claimed_at=timezone.now() - datetime.timedelta(hours=1),
+        )
+
+        call_command('resume_sms_jobs', stdout=StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(SmsMessage.objects.get(pk=pending.pk).status, 'sent')
+        self.assertEqual(SmsMessage.objects.get(pk=stale.pk).status, 'failed')
+        self.assertEqual([sms['numbers'] for sms in FakeProvider.outbox], ['919876500000'])
@@ -13,14 +13,19 @@ urlpatterns = [
     path('reset/<uidb64>/<token>/', auth_views.PasswordResetConfirmView.as_view(), name='password_reset_confirm'),
     path('reset/done/', auth_views.PasswordResetCompleteView.as_view(), name='password_reset_complete'),
     path('administrator/dashboard/', views.admin_dashboard, name='admin_dashboard'),
+    path('administrator/dashboard/events/', views.dashboard_events, name='dashboard_events'),
+    path('administrator/dashboard/metrics/', views.request_metrics, name='request_metrics'),
     path('administrator/dashboard/attendance/<int:pk>/', views.view_attendance_records, name='view_attendance_records'),
     path('administrator/dashboard/attendance/mark/<int:pk>/', views.mark_attendance, name='mark_attendance'),
     path('administrator/dashboard/attendance_books/', views.view_attendnace_books, name='view_attendance_books'),
     path('administrator/dashboard/attendance_report/', views.view_attendnace_report, name='view_attendnace_report'),
+    path('administrator/dashboard/shortage_report/', views.view_shortage_report, name='view_shortage_report'),
     path('administrator/dashboard/send_absentee_sms/', views.send_absentee_sms, name='send_absentee_sms'),
+    path('administrator/dashboard/sms_jobs/<int:pk>/', views.sms_job_status, name='sms_job_status'),
     path('administrator/dashboard/attendance_book/add', views.add_attendance_book, name='add_attendance_book'),
     path('administrator/dashboard/attendance_book/add/teacher/<int:pk>/', views.add_attendance_book_teacher, name='add_attendance_book_teacher'),
     path('administrator/dashboard/attendance_book/add/student/<int:pk>/', views.add_attendance_book_student, name='add_attendance_book_student'),
+    path('administrator/dashboard/attendance_book/<int:pk>/students/', views.attendance_book_students, name='attendance_book_students'),
     path('administrator/dashboard/attendance_book/delete/<int:pk>/', views.delete_attendance_book, name='delete_attendance_book'),
     path('administrator/dashboard/teachers', views.view_teachers, name='view_teachers'),
     path('administrator/dashboard/teacher/add', views.add_teacher, name='add_teacher'),
@@ -31,6 +36,8 @@ urlpatterns = [
     path('administrator/dashboard/students/filter', views.filter_students, name='filter_students'),
     path('administrator/dashboard/student/add', views.add_student, name='add_student'),
     path('administrator/dashboard/student/upload', views.upload_students_csv, name='upload_students_csv'),
+    path('administrator/dashboard/imports/<int:pk>/', views.import_job_status, name='import_job_status'),
+    path('administrator/dashboard/imports/<str:name>/report/', views.download_import_report, name='download_import_report'),
     path('administrator/dashboard/student/edit/<str:student_id>/', views.edit_student, name='edit_student'),
     path('administrator/dashboard/student/delete/<str:student_id>/', views.delete_student, name='delete_student'),
     path('administrator/dashboard/departments', views.view_departments, name='view_departments'),
@@ -0,0 +1,52 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+
+
+# Version counters for cache keys: bumping one retires every entry keyed on the old value at once
+def version_key(name):
+    return f'version:{name}'
+
+
+def get_version(name):
+    # Start from the clock, so a counter lost from the cache never comes back to a value already used
+    return cache.get_or_set(version_key(name), lambda: time.time_ns(), None)
+
+
+def bump_version(name):
+    try:
+        return cache.incr(version_key(name))
+    except ValueError:
+        version = time.time_ns()
+        cache.set(version_key(name), version, None)
+        return version
+
+
+def get_versions(names):
+    """Current version of each name, read with one cache round trip once they are set."""
+    found = cache.get_many([version_key(name) for name in names])
+    return {
+        name: found[version_key(name)] if version_key(name) in found else get_version(name)
+        for name in names
+    }
+
+
+# Bumped when books or enrollments change, which can change the books of any student and every book's rows
+ATTENDANCE_BOOKS_VERSION = 'attendance-books'
+
+
+# Bumped when a session of the book is marked or re-marked
+def book_version_name(book_id):
+    return f'attendance-book:{book_id}'
+
+
+def book_cache_key(prefix, book_ids, *names):
+    """Cache key of a value derived from the marks of book_ids (and whatever the extra version names track).
+
+    Marking any of the books bumps its version, so the next read builds a new
+    key and the old entry is never read again; nothing scans or deletes keys.
+    """
+    versions = get_versions([ATTENDANCE_BOOKS_VERSION, *names, *(book_version_name(book_id) for book_id in book_ids)])
+    digest = hashlib.md5(repr(sorted(versions.items())).encode()).hexdigest()
+    return f'{prefix}:{digest}'
@@ -1,8 +1,11 @@
 from itertools import islice
 import json
+import os
 from django.conf import settings
-from django.http import JsonResponse
+from django.http import FileResponse, Http404, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
 import csv
 from datetime import datetime
 from django.shortcuts import get_object_or_404, redirect, render
@@ -13,18 +16,27 @@ import urllib.request
 import urllib.parse
 
 import urllib3
-from app.forms import AddCourseForm, AddDepartmentForm, AttendanceBookForm, CustomUserCreationForm, NotificationForm, StudentCSVUploadForm, StudentRegistrationForm, TeacherCSVUploadForm, TeacherRegistrationForm,  UserLoginForm
+from app.forms import AccountPasswordChangeForm, AddCourseForm, AddDepartmentForm, AttendanceBookForm, AttendanceReportForm, CustomUserCreationForm, NotificationForm, ShortageReportForm, StudentCSVUploadForm, StudentRegistrationForm, TeacherCSVUploadForm, TeacherRegistrationForm,  UserLoginForm
 from django.contrib.auth.decorators import login_required
 from app.decorators import role_required
 from django.db import transaction
 from django.contrib import messages
 from app.models import Admin, AttendanceBook, AttendanceRecord, Course, CustomUser, Department, Student, Teacher
-from django.contrib.auth.forms import PasswordChangeForm
 from django.shortcuts import render, redirect
-from .models import HOD, AttendanceRecord, Notification
+from .models import HOD, AttendanceRecord, ImportJob, Notification, SmsJob
 from django.core.paginator import Paginator
-from django.db.models import Q
+from django.db.models import Count, Q
 from .tasks import get_absent_details_by_date
+from .attendance import get_attendance_matrix, mark_book_attendance
+from .dashboard import get_dashboard_counts
+from .enrollment import add_students, enroll_by_rules, remove_students, set_roster
+from .events import broker, format_sse
+from .imports import create_import_job, enqueue_import_job
+from .middleware import password_change_url, request_stats
+from .reports import absentee_summary, attach_absent_sessions, filter_absences, shortage_list, stream_absentee_csv, stream_shortage_csv
+from .search import count_students, filter_students_page, search_students
+from .sms import create_absentee_sms_job, enqueue_sms_job
+from .student_attendance import get_student_attendance
 
 # Home Page
 def home_view(request):
@@ -40,6 +52,11 @@ def user_login(request):
             user = authenticate(request, username=username, password=password)
             print(user.role)
             if user is not None:
+                if user.must_change_password:
+                    # Imported accounts start on the shared default password and must replace it first
+                    login(request, user)
+                    messages.warning(request, 'Please choose a new password before continuing.')
+                    return redirect(password_change_url(user))
                 if user.role == 'admin':
                     login(request,user)
                     return redirect('admin_dashboard')
@@ -68,37 +85,54 @@ def user_logout(request):
 @login_required
 @role_required(['admin'])
 def admin_dashboard(request):
-    # Count the total number of each entity
-    total_students = Student.objects.count()
-    total_teachers = Teacher.objects.count()
-    total_admins = Admin.objects.count()
-    total_hods = HOD.objects.count()
-    total_attendance_books = AttendanceBook.objects.count()
-    total_departments = Department.objects.count()
-    total_courses = Course.objects.count()
-    
-    # Get today's date
-    today = timezone.now().date()
-    
-    # Count the number of absent students today
-    absent_students_today = AttendanceRecord.objects.filter(
-        date=today,
-        status=False
-    ).values('student').distinct().count()
-    
-    context = {
-        'total_students': total_students,
-        'total_teachers': total_teachers,
-        'total_admins': total_admins,
-        'total_hods': total_hods,
-        'total_attendance_books': total_attendance_books,
-        'absent_students_today': absent_students_today,
-        'total_departments':total_departments,
-        'total_courses':total_courses
-    }
+    # Entity counts and today's absentees, cached and dropped by signals when the data changes
+    context = get_dashboard_counts()
     return render(request, 'administrator/dashboard.html',context)
 
 
+# Live dashboard counters as Server-Sent Events; async so idle connections do not hold a worker thread
+@login_required
+@role_required(['admin'])
+async def dashboard_events(request):
+    keepalive = settings.DASHBOARD_EVENTS_KEEPALIVE
+
+    async def stream():
+        yield format_sse('metrics', await sync_to_async(get_dashboard_counts)())
+        if not isinstance(request, ASGIRequest):
+            # A WSGI worker cannot hold the stream open; have the browser reconnect for a fresh snapshot instead
+            yield f'retry: {int(keepalive * 1000)}\n\n'
+            return
+
+        subscriber = broker.subscribe()
+        try:
+            while True:
+                event = await broker.listen(subscriber, keepalive)
+                if event is None:
+                    yield ': keepalive\n\n'
+                    continue
+                # Collapse a burst of changes into one counters refresh
+                events = [event] + broker.drain(subscriber)
+                for event in events:
+                    if event['type'] != 'metrics':
+                        yield format_sse(event['type'], event['data'])
+                if any(event['type'] == 'metrics' for event in events):
+                    yield format_sse('metrics', await sync_to_async(get_dashboard_counts)())
+        finally:
+            broker.unsubscribe(subscriber)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+# Rolling request latency percentiles per view
+@login_required
+@role_required(['admin'])
+def request_metrics(request):
+    return JsonResponse({'views': request_stats.snapshot()})
+
+
 # Admin Profile
 @login_required
 @role_required(['admin'])
@@ -111,7 +145,7 @@ def admin_profile(request):
 @login_required
 def admin_change_password(request):
     if request.method == 'POST':
-        form = PasswordChangeForm(request.user, request.POST)
+        form = AccountPasswordChangeForm(request.user, request.POST)
         if form.is_valid():
             user = form.save()
             update_session_auth_hash(request, user) 
@@ -120,7 +154,7 @@ def admin_change_password(request):
         else:
             messages.error(request, 'Please correct the error below.')
     else:
-        form = PasswordChangeForm(request.user)
+        form = AccountPasswordChangeForm(request.user)
     return render(request, 'administrator/change_password.html', {
         'form': form
     })
@@ -196,55 +230,18 @@ def delete_teacher(request, teacher_id):
 # Upload Teacher via CSV
 @login_required
 @role_required(['admin'])
-@transaction.atomic
 def upload_teachers_csv(request):
+    job = None
     if request.method == 'POST':
         form = TeacherCSVUploadForm(request.POST, request.FILES)
         if form.is_valid():
-            csv_file = request.FILES['csv_file']
-            try:
-                # Process CSV file
-                csv_reader = csv.DictReader(csv_file.read().decode('utf-8').splitlines())
-                for row in csv_reader:
-                    userid = row.get('userid')
-                    fullname = row.get('fullname')
-                    phone_no = row.get('phone_no')
-                    email = row.get('email')
-                    dept_id = row.get('dept_id')
-                    photo_url = row.get('photo_url')
-                    
-                    # Check if user already exists
-                    if CustomUser.objects.filter(userid=userid).exists():
-                        continue
-                    
-                    # Create user
-                    user = CustomUser(
-                        userid=userid,
-                        fullname=fullname,
-                        phone_no=phone_no,
-                        email=email,
-                        role='teacher'
-                    )
-                    user.set_password('Welcome@12345')
-                    user.save()
-
-                    # Get or create department
-                    department, created = Department.objects.get_or_create(dept_id=dept_id)
-                    
-                    # Create teacher
-                    Teacher.objects.create(
-                        user=user,
-                        department=department,
-                        photo_url=photo_url
-                    )
-                    
-                messages.success(request, 'Teachers uploaded successfully!')
-            except Exception as e:
-                messages.error(request, f'Error processing file: {e}')
-            return redirect('view_teachers')
+            # Saved to disk and imported in the background; the page polls the job for progress
+            job = create_import_job('teachers', request.FILES['csv_file'])
+            enqueue_import_job(job)
+            form = TeacherCSVUploadForm()
     else:
         form = TeacherCSVUploadForm()
-    return render(request, 'administrator/upload_teachers_csv.html', {'form': form})
+    return render(request, 'administrator/upload_teachers_csv.html', {'form': form, 'job': job})
 
 # @login_required
 # @role_required(['admin'])
@@ -357,51 +354,37 @@ def add_student(request):
 @role_required(['admin'])
 def view_students(request):
     if request.headers.get('x-requested-with') == 'XMLHttpRequest':
-        start = int(request.GET.get('start', 0))
         length = int(request.GET.get('length', 10))
-        search_value = request.GET.get('search[value]', '')
-
-        # Filter and fetch students from the database based on search criteria across multiple fields
-        students = Student.objects.filter(
-            Q(user__fullname__icontains=search_value) |
-            Q(user__userid__icontains=search_value) |
-            Q(course__course_id__icontains=search_value) |
-            Q(year__icontains=search_value) |
-            Q(section__icontains=search_value) |
-            Q(user__email__icontains=search_value) |
-            Q(parent_phoneno__icontains=search_value) |
-            Q(user__phone_no__icontains=search_value)
-        ).select_related('user', 'course')
-
-        total_records = students.count()
-
-        # Implement pagination
-        paginator = Paginator(students, length)
-        page_number = (start // length) + 1
-        page_obj = paginator.get_page(page_number)
+        search_value = request.GET.get('search[value]', '').strip()
+
+        # Keyset page over the search index: 'after' is the last userid of the previous page
+        rows, next_cursor = search_students(search_value, request.GET.get('after', ''), length)
+        total_records = count_students(search_value)
 
         # Prepare data for DataTables
+        year_display = dict(Student.YEAR_CHOICES)
         data = [
             {
-                "userid": student.user.userid,
-                "photo_url": student.photo_url,
-                "fullname": student.user.fullname,
-                "course": student.course.course_id,
-                "year": student.get_year_display(),
-                "section": student.section,
-                "email": student.user.email,
-                "parent_phoneno": student.parent_phoneno,
-                "phone_no": student.user.phone_no,
-                "edit_url": reverse('edit_student', args=[student.user.userid]),
-                "delete_url": reverse('delete_student', args=[student.user.userid])
+                "userid": row['user__userid'],
+                "photo_url": row['photo_url'],
+                "fullname": row['user__fullname'],
+                "course": row['course_id'],
+                "year": year_display.get(row['year'], row['year']),
+                "section": row['section'],
+                "email": row['user__email'],
+                "parent_phoneno": row['parent_phoneno'],
+                "phone_no": row['user__phone_no'],
+                "edit_url": reverse('edit_student', args=[row['user__userid']]),
+                "delete_url": reverse('delete_student', args=[row['user__userid']])
             }
-            for student in page_obj
+            for row in rows
         ]
 
         response = {
             "draw": int(request.GET.get('draw', 0)),
             "recordsTotal": total_records,
             "recordsFiltered": total_records,
+            "next_cursor": next_cursor,
             "data": data,
         }
         return JsonResponse(response)
@@ -607,95 +590,47 @@ def delete_student(request, student_id):
 
 @login_required
 @role_required(['admin'])
-@transaction.atomic
 def upload_students_csv(request):
+    job = None
     if request.method == 'POST':
         form = StudentCSVUploadForm(request.POST, request.FILES)
         if form.is_valid():
-            csv_file = request.FILES['csv_file']
-            try:
-                csv_reader = csv.DictReader(csv_file.read().decode('utf-8').splitlines())
-                users_to_create = []
-                students_to_create = []
-                course_cache = {}  # Cache to avoid repeated DB hits for courses
-
-                for i, row in enumerate(csv_reader):
-                    userid = row.get('userid')
-                    fullname = row.get('fullname')
-                    phone_no = row.get('phone_no')
-                    parent_phoneno = row.get('parent_phoneno')
-                    email = row.get('email')
-                    course_id = row.get('course_id')
-                    usn = row.get('usn')
-                    year = row.get('year')
-                    section = row.get('section')
-                    gender = row.get('gender')
-                    dob = row.get('dob')
-                    photo_url = row.get('photo_url')
-
-                    try:
-                        dob = datetime.strptime(dob, '%d/%m/%Y').date()
-                    except ValueError:
-                        messages.error(request, f"Invalid date format for user {userid}. Expected DD/MM/YYYY.")
-                        continue
-
-                    if CustomUser.objects.filter(userid=userid).exists():
-                        messages.warning(request, f"User {userid} already exists. Skipping.")
-                        continue
-
-                    if course_id not in course_cache:
-                        course, created = Course.objects.get_or_create(course_id=course_id)
-                        course_cache[course_id] = course
-                    else:
-                        course = course_cache[course_id]
-
-                    user = CustomUser(
-                        userid=userid,
-                        fullname=fullname,
-                        phone_no=phone_no,
-                        email=email,
-                        role='student'
-                    )
-                    user.set_password('Welcome@12345')
-                    users_to_create.append(user)
-
-                    student = Student(
-                        user=user,
-                        usn=usn,
-                        parent_phoneno=parent_phoneno,
-                        course=course,
-                        year=year,
-                        section=section,
-                        gender=gender,
-                        dob=dob,
-                        photo_url=photo_url
-                    )
-                    students_to_create.append(student)
-
-                    # Insert in batches of 1000
-                    if len(users_to_create) == 100:
-                        CustomUser.objects.bulk_create(users_to_create)
-                        for j, student in enumerate(students_to_create):
-                            student.user = users_to_create[j]
-                        Student.objects.bulk_create(students_to_create)
-                        users_to_create.clear()
-                        students_to_create.clear()
-
-                # Insert remaining records if less than 1000
-                if users_to_create:
-                    CustomUser.objects.bulk_create(users_to_create)
-                    for j, student in enumerate(students_to_create):
-                        student.user = users_to_create[j]
-                    Student.objects.bulk_create(students_to_create)
-
-                messages.success(request, 'Students uploaded successfully!')
-
-            except Exception as e:
-                messages.error(request, f'Error processing file: {e}')
-            return redirect('view_students')
+            # Saved to disk and imported in the background; the page polls the job for progress
+            job = create_import_job('students', request.FILES['csv_file'])
+            enqueue_import_job(job)
+            form = StudentCSVUploadForm()
     else:
         form = StudentCSVUploadForm()
-    return render(request, 'administrator/upload_students_csv.html', {'form': form})
+    return render(request, 'administrator/upload_students_csv.html', {'form': form, 'job': job})
+
+
+# Progress of a background CSV import, polled by the upload pages
+@login_required
+@role_required(['admin'])
+def import_job_status(request, pk):
+    job = get_object_or_404(ImportJob, pk=pk)
+    return JsonResponse({
+        'job_id': job.pk,
+        'kind': job.kind,
+        'status': job.status,
+        'total_rows': job.total_rows,
+        'processed_rows': job.processed_rows,
+        'imported': job.imported,
+        'skipped': job.skipped,
+        'error_count': job.error_count,
+        'error': job.error,
+        'report_url': reverse('download_import_report', args=[job.report_name]) if job.report_name else None,
+    })
+
+
+# Per-row problem report of a CSV import
+@login_required
+@role_required(['admin'])
+def download_import_report(request, name):
+    path = os.path.join(settings.IMPORT_ROOT, os.path.basename(name))
+    if not name.endswith('.csv') or not os.path.exists(path):
+        raise Http404('Import report not found.')
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=f'import_report_{name}')
 
 
 # Add Admin Notifications
@@ -777,75 +712,93 @@ def add_attendance_book_teacher(request, pk):
 @role_required(['admin'])
 def add_attendance_book_student(request, pk):
     attendance_book = get_object_or_404(AttendanceBook, pk=pk)
-    students = Student.objects.all()[:150]  # Initial load with a limit for performance
+    students = Student.objects.select_related('user', 'course').order_by('user__userid')[:150]  # Initial load with a limit for performance
 
     if request.method == 'POST':
         # Get selected students as a comma-separated string and split into a list
-        selected_students = request.POST.get('students', '').split(',')
-        
-        # Filter students by their user ID and update attendance book
-        selected_students_objs = Student.objects.filter(user__userid__in=selected_students)
-        
-        # Check if the selected students were found
-        if not selected_students_objs.exists():
-            print(f"No students found with the given IDs: {selected_students}")
-        
-        attendance_book.students.set(selected_students_objs)
-        attendance_book.save()
+        selected_students = [userid for userid in request.POST.get('students', '').split(',') if userid]
+        try:
+            rules = json.loads(request.POST.get('rules') or '[]')
+        except ValueError as e:
+            messages.error(request, f'Invalid roster rule: {e}')
+            return redirect('add_attendance_book_student', pk=pk)
+        if not rules and not selected_students:
+            # An empty submission would remove every student from the book
+            messages.error(request, 'Select at least one student or add a roster rule.')
+            return redirect('add_attendance_book_student', pk=pk)
+
+        try:
+            with transaction.atomic():
+                # The roster becomes the rules plus the picked students, resolved and diffed in the database
+                added, removed = set_roster(attendance_book, rules, selected_students)
+        except ValueError as e:
+            messages.error(request, f'Invalid roster rule: {e}')
+            return redirect('add_attendance_book_student', pk=pk)
+
+        messages.success(request, f'{added} students added to and {removed} removed from {attendance_book.name}.')
         return redirect('view_attendance_books')
 
     return render(request, 'administrator/add_attendance_book_student.html', {
         'attendance_book': attendance_book,
-        'students': students
+        'students': students,
+        'courses': Course.objects.all(),
+        'year_choices': Student.YEAR_CHOICES,
     })
 
 
-
+# Incremental enrollment: {"add": [userids], "remove": [userids], "rules": [{"course", "year", "section"}]}
 @login_required
 @role_required(['admin'])
-def filter_students(request):
-    query = request.GET.get('query', '')
-    queryCourse = request.GET.get('queryCourse', '')
-    queryYear = request.GET.get('queryYear', '')
-    querySection = request.GET.get('querySection', '')
-
-    # Adjusted filtering logic to apply multiple filters correctly
-    students = Student.objects.all()
-
-    # Apply the search filters based on input fields
-    if query:
-        students = students.filter(
-            Q(user__fullname__icontains=query) |
-            Q(user__userid__icontains=query)
-        )
+def attendance_book_students(request, pk):
+    attendance_book = get_object_or_404(AttendanceBook, pk=pk)
+    if request.method != 'POST':
+        return JsonResponse({'total': attendance_book.students.count()})
+
+    try:
+        changes = json.loads(request.body)
+        with transaction.atomic():
+            added = enroll_by_rules(attendance_book, changes.get('rules', [])) if changes.get('rules') else 0
+            added += add_students(attendance_book, changes.get('add', [])) if changes.get('add') else 0
+            removed = remove_students(attendance_book, changes.get('remove', [])) if changes.get('remove') else 0
+    except (ValueError, AttributeError) as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+    return JsonResponse({
+        'success': True,
+        'added': added,
+        'removed': removed,
+        'total': attendance_book.students.count(),
+    })
 
-    if queryCourse:
-        students = students.filter(course__name__icontains=queryCourse)
 
-    if queryYear:
-        students = students.filter(year__icontains=queryYear)
 
-    if querySection:
-        students = students.filter(section__icontains=querySection)
+@login_required
+@role_required(['admin'])
+def filter_students(request):
+    query = request.GET.get('query', '').strip()
+    queryCourse = request.GET.get('queryCourse', '').strip()
+    queryYear = request.GET.get('queryYear', '').strip()
+    querySection = request.GET.get('querySection', '').strip()
 
-    # Paginate the filtered results
-    paginator = Paginator(students, 150)  # Show 50 students per page
-    page_number = request.GET.get('page', 1)
-    page_obj = paginator.get_page(page_number)
+    # Projection-only keyset page, cached per filter combination until the students change
+    rows, next_cursor = filter_students_page(
+        query, queryCourse, queryYear, querySection, request.GET.get('after', ''), 150
+    )
 
     # Prepare data for JSON response
+    year_display = dict(Student.YEAR_CHOICES)
     students_data = [
         {
-            'userid': student.user.userid,
-            'fullname': student.user.fullname,
-            'photo_url': student.photo_url,
-            'course': student.course.name,  # Assuming course has a name field
-            'year': student.get_year_display(),
-            'section': student.section,
-        } for student in page_obj
+            'userid': row['user__userid'],
+            'fullname': row['user__fullname'],
+            'photo_url': row['photo_url'],
+            'course': row['course__name'],
+            'year': year_display.get(row['year'], row['year']),
+            'section': row['section'],
+        } for row in rows
     ]
 
-    return JsonResponse({'students': students_data, 'has_next': page_obj.has_next()})
+    return JsonResponse({'students': students_data, 'has_next': next_cursor is not None, 'next_cursor': next_cursor})
    
 # View All Attendance Books
 @login_required
@@ -955,84 +908,14 @@ def view_attendnace_books(request):
 @role_required(['admin'])
 def mark_attendance(request, pk):
     attendance_book = get_object_or_404(AttendanceBook, pk=pk)
-    students = attendance_book.students.all()
-    attendance_records = AttendanceRecord.objects.filter(attendance_book=attendance_book).order_by('date', 'session')
-
-    # Create a dictionary to organize records by date and session
-    records_by_date_session = {}
-    for record in attendance_records:
-        records_by_date_session.setdefault(record.date, {}).setdefault(record.session, {})[record.student.user.userid] = record.get_status_display
-
-    # Calculate total sessions and attendance count for each student
-    increment_value = int(attendance_book.book_type)
-    total_sessions = len(set((record.date, record.session) for record in attendance_records)) * increment_value
-
-    student_attendance = {
-        student.user.userid: {
-            'count': AttendanceRecord.objects.filter(
-                attendance_book=attendance_book,
-                student=student,
-                status=True
-            ).count() * increment_value,
-            'percentage': round(
-                (AttendanceRecord.objects.filter(
-                    attendance_book=attendance_book,
-                    student=student,
-                    status=True
-                ).count() * increment_value / total_sessions) * 100, 2) if total_sessions > 0 else 0
-        }
-        for student in students
-    }
 
     if request.method == 'POST':
-        selected_students = set(request.POST.getlist('attendance'))
+        selected_students = request.POST.getlist('attendance')
         current_date = request.POST.get('date')
         session = request.POST.get('session')
 
-        # Prepare bulk create and update data
-        update_data = []
-        create_data = []
-        
-        for student in students:
-            status = student.user.userid in selected_students
-
-            record_data = {
-                'attendance_book': attendance_book,
-                'student': student,
-                'date': current_date,
-                'session': session,
-                'status': status,
-                'count': student.attendancerecord_set.filter(status=True).count() + (increment_value if status else 0)
-            }
-            
-            if AttendanceRecord.objects.filter(
-                attendance_book=attendance_book,
-                student=student,
-                date=current_date,
-                session=session
-            ).exists():
-                # Collect data for bulk updates
-                update_data.append(AttendanceRecord(
-                    id=AttendanceRecord.objects.get(
-                        attendance_book=attendance_book,
-                        student=student,
-                        date=current_date,
-                        session=session
-                    ).id,
-                    **record_data
-                ))
-            else:
-                # Collect data for bulk creation
-                create_data.append(AttendanceRecord(**record_data))
-
         try:
-            with transaction.atomic():
-                # Perform bulk update and create operations
-                if update_data:
-                    AttendanceRecord.objects.bulk_update(update_data, ['status', 'count'])
-                if create_data:
-                    AttendanceRecord.objects.bulk_create(create_data)
-
+            mark_book_attendance(attendance_book, current_date, session, selected_students)
             messages.success(request, 'Attendance Marked Successfully')
 
         except Exception as e:
@@ -1040,13 +923,11 @@ def mark_attendance(request, pk):
 
         return redirect('view_attendance_records', pk=pk)
 
+    matrix = get_attendance_matrix(attendance_book)
+
     return render(request, 'administrator/mark_attendance.html', {
         'attendance_book': attendance_book,
-        'students': students,
-        'attendance_records': attendance_records,
-        'records_by_date_session': records_by_date_session,
-        'student_attendance': student_attendance,
-        'total_sessions': total_sessions,
+        'matrix': matrix,
     })
 
 
@@ -1055,42 +936,11 @@ def mark_attendance(request, pk):
 @role_required(['admin', 'teacher'])
 def view_attendance_records(request, pk):
     attendance_book = get_object_or_404(AttendanceBook, pk=pk)
-    students = attendance_book.students.all()
-    attendance_records = AttendanceRecord.objects.filter(attendance_book=attendance_book).order_by('date', 'session')
-
-    # Create a dictionary to organize records by date and session
-    records_by_date_session = {}
-    for record in attendance_records:
-        if record.date not in records_by_date_session:
-            records_by_date_session[record.date] = {}
-        if record.session not in records_by_date_session[record.date]:
-            records_by_date_session[record.date][record.session] = {}
-        records_by_date_session[record.date][record.session][record.student.user.userid] = record.get_status_display
-
-    # Calculate total sessions and attendance count for each student
-    increment_value = int(attendance_book.book_type)
-    # print(increment_value)
-    student_attendance = {}
-    total_sessions = len(set((record.date, record.session) for record in attendance_records))*increment_value
-    # total_sessions = (total_sessions*increment_value)
-
-    for student in students:
-        attendance_count = AttendanceRecord.objects.filter(
-            attendance_book=attendance_book, student=student, status=True
-        ).count()
-        attendance_count = (attendance_count * increment_value)
-        # print(attendance_count)
-        attendance_percentage = (attendance_count / total_sessions) * 100 if total_sessions > 0 else 0
-        student_attendance[student.user.userid] = {
-            'count': attendance_count,
-            'percentage': round(attendance_percentage, 2),
-        }
+    matrix = get_attendance_matrix(attendance_book)
+
     return render(request, 'administrator/view_attendance_records.html', {
         'attendance_book': attendance_book,
-        'students': students,
-        'records_by_date_session': records_by_date_session,
-        'student_attendance': student_attendance,
-        'total_sessions':total_sessions
+        'matrix': matrix,
     })
 
 
@@ -1199,20 +1049,6 @@ def delete_course(request, course_id):
     return render(request, 'administrator/delete_course.html', {'course': course})
 
 
-# USED
-def send_sms(phone_number, message):
-    """Send SMS via Textlocal API."""
-    url = "https://api.textlocal.in/send/"
-    payload = {
-        'apikey': settings.TEXTLOCAL_API_KEY,
-        'numbers': phone_number,
-        'message': message,
-        'sender': settings.TEXTLOCAL_SENDER_ID,
-    }
-    
-    response = requests.post(url, data=payload)
-    return response.json()
-
 # Helper function to send SMS via Textlocal API
 #USED
 # def send_bulk_sms(absentee_details, selected_date):
@@ -1336,147 +1172,126 @@ def send_sms(phone_number, message):
 
 #     return True, sent_count
 
-def send_bulk_sms(absentee_details, selected_date):
-    api_key = settings.TEXTLOCAL_API_KEY
-    sender = settings.TEXTLOCAL_SENDER_ID  # Ensure you are using a registered sender ID
-    messages = []
-
-    # Convert selected_date from '2024-10-31' to '31/10/24'
-    formatted_date = datetime.strptime(selected_date, '%Y-%m-%d').strftime('%d/%m/%Y')
-    print(formatted_date)
-
-    for student_id, student_data in absentee_details.items():
-        # Dynamically calculate the number of absent sessions (classes)
-        absent_class_count = len(student_data['absent_sessions'])
-
-        # print(student_data['absent_sessions'])
-        absent_sessions = ",".join(
-                    [f"{session['session']}"
-                    for session in student_data['absent_sessions']]
-                )
-
-        # absent_class_count = 7
-        print(absent_sessions)
-        
-        # Construct the message
-        # message = (
-        #     f"Dear Parent,\nThis is to inform you that {student_data['full_name']} ({student_id}) was absent for {absent_class_count} classes on {formatted_date}.\nRegards,\nPrincipal, BCK"
-        # )
-
-        message = (
-            f"Dear Parent,\nThis is to inform you that {student_data['full_name'][:20]} ( {student_id[:15]}) was absent for {str(absent_class_count)[:1]} classes ( {absent_sessions[:14]}) on {formatted_date[:8]}.\nRegards,\nPrincipal, BCK"
-        )
-
-        print(message)
-
-        # Append the message and recipient details
-        messages.append({
-            'recipient': "91" + student_data['parent_phoneno'],
-            'message': message
-        })
-
-    # Send messages
-    sent_count = 0
-    # for msg in islice(messages, 100):
-    for msg in messages:
-        # Prepare the data for the GET request by constructing the query string
-        params = {
-            'message': msg['message']
-        }
-        
-        # URL encode the parameters
-        query_string = urllib.parse.urlencode(params)
-        url = f" https://api.textlocal.in/send/?apiKey={api_key}&sender={sender}&numbers={msg['recipient']}&{query_string}"
-        # url = f"test"
-        # print(url)
-
-        # Make the GET request to Textlocal API
-        try:
-            with urllib.request.urlopen(url) as response:
-                response_text = response.read().decode('utf-8')
-                response_json = json.loads(response_text)
-                
-                # Check the status of the response
-                if response_json.get('status') == 'success':
-                    sent_count += 1
-                else:
-                    error_message = response_json.get('errors', [{'message': 'Unknown error'}])[0]['message']
-                    return False, error_message
-        except Exception as e:
-            return False, str(e)
-
-    return True, sent_count
-
 # USED
+@login_required
+@role_required(['admin'])
 def send_absentee_sms(request):
     if request.method == 'POST':
         selected_date = request.POST.get('selected_date')
         absentee_details = get_absent_details_by_date(selected_date)
 
-        # Call the helper function to send SMS
-        success, result = send_bulk_sms(absentee_details, selected_date)
+        # Queue the messages; a background worker sends them
+        job = create_absentee_sms_job(absentee_details, selected_date)
+        enqueue_sms_job(job)
 
-        if success:
-            return JsonResponse({'success': True, 'sent_count': result})
-        else:
-            return JsonResponse({'success': False, 'error': result})
+        return JsonResponse({
+            'success': True,
+            'job_id': job.pk,
+            'queued_count': job.messages.count(),
+            'status_url': reverse('sms_job_status', args=[job.pk]),
+        })
     
     return JsonResponse({'success': False, 'error': 'Invalid request method'})
 
 
+# Progress of a queued absentee SMS job
+@login_required
+@role_required(['admin'])
+def sms_job_status(request, pk):
+    job = get_object_or_404(SmsJob, pk=pk)
+    counts = dict(job.messages.values('status').annotate(total=Count('id')).values_list('status', 'total'))
+    return JsonResponse({
+        'job_id': job.pk,
+        'status': job.status,
+        'pending': counts.get('pending', 0) + counts.get('sending', 0),
+        'sent_count': counts.get('sent', 0),
+        'failed_count': counts.get('failed', 0),
+        'failed': list(job.messages.filter(status='failed').values('student__user__userid', 'phone_no', 'response')),
+    })
+
+
 # USED
+@login_required
+@role_required(['admin'])
 def view_attendnace_report(request):
-    absentee_details = None
-    selected_date = None
-    sms_sent_count = 0
-
-    if request.method == 'POST':
+    # Sending SMS still works on one date at a time
+    if request.method == 'POST' and 'send_sms' in request.POST:
         selected_date = request.POST.get('selected_date')
-        # Convert selected_date from '2024-10-31' to '31/10/24'
-        formatted_date = datetime.strptime(selected_date, '%Y-%m-%d').strftime('%d/%m/%y')
-        
-        # Get absentees by selected date
         absentee_details = get_absent_details_by_date(selected_date)
-        
-        # Check if the 'send_sms' button was clicked
-        if 'send_sms' in request.POST and absentee_details:
-            for student_id, student_data in absentee_details.items():
-                # Create SMS message
-                absent_sessions = "\n".join(
-                    [f"{session['subject_name']} (Code: {session['subject_code']}) Session: {session['session']}"
-                    for session in student_data['absent_sessions']]
-                )
-
-                absent_class_count = 7
-                message = (
-                    f"Dear Parent,\n"
-                    f"This is to inform you that {student_data['full_name']} ({student_id}) was absent for {absent_class_count} classes on {selected_date}.\n"
-                    f"Regards,\n"
-                    f"Principal, BCK"
-                )
-
-                print(message)
-                
-                # Send SMS
-                response = send_sms("91"+student_data['parent_phoneno'], message)
-                if response['status'] == 'success':
-                    sms_sent_count += 1
-                else:
-                    messages.error(request, f"Failed to send SMS to {student_data['full_name']}.")
-
-            # Display success message
-            if sms_sent_count:
-                messages.success(request, f"SMS sent to {sms_sent_count} parents successfully.")
-            else:
-                messages.error(request, "No SMS was sent due to errors.")
+        if absentee_details:
+            job = create_absentee_sms_job(absentee_details, selected_date)
+            enqueue_sms_job(job)
+            messages.success(request, f"SMS queued for {job.messages.count()} parents.")
+        return redirect(f"{reverse('view_attendnace_report')}?from_date={selected_date}&to_date={selected_date}")
+
+    form = AttendanceReportForm(request.GET if 'from_date' in request.GET else None)
+    page_obj = None
+    selected_date = None
+
+    if form.is_valid():
+        # Absent rows, plus the absences of books stored as packed sessions
+        records, packed = filter_absences(**form.cleaned_data)
+
+        # Whole range as CSV, streamed row by row so a month across the college stays in constant memory
+        if request.GET.get('export') == 'csv':
+            filename = f"absentees_{form.cleaned_data['from_date']}_{form.cleaned_data['to_date']}.csv"
+            response = StreamingHttpResponse(stream_absentee_csv(records, packed), content_type='text/csv')
+            response['Content-Disposition'] = f'attachment; filename="{filename}"'
+            return response
+
+        paginator = Paginator(absentee_summary(records, packed), 50)
+        page_obj = paginator.get_page(request.GET.get('page'))
+        attach_absent_sessions(page_obj.object_list, records, packed)
+        if form.cleaned_data['from_date'] == form.cleaned_data['to_date']:
+            selected_date = form.cleaned_data['from_date'].isoformat()
+
+    # Filters without the page number, for the pagination and export links
+    query = request.GET.copy()
+    query.pop('page', None)
+    query.pop('export', None)
 
     context = {
-        'absentee_details': absentee_details,
+        'form': form,
+        'page_obj': page_obj,
         'selected_date': selected_date,
+        'query_string': query.urlencode(),
     }
     return render(request, 'administrator/view_attendance_report.html', context)
 
 
+# Attendance Shortage Report
+@login_required
+@role_required(['admin'])
+def view_shortage_report(request):
+    # The list opens on the configured threshold over everything marked so far
+    form = ShortageReportForm(request.GET or {'threshold': settings.ATTENDANCE_SHORTAGE_THRESHOLD})
+    page_obj = None
+
+    if form.is_valid():
+        rows = shortage_list(**form.cleaned_data)
+
+        if request.GET.get('export') == 'csv':
+            response = StreamingHttpResponse(stream_shortage_csv(rows), content_type='text/csv')
+            response['Content-Disposition'] = f'attachment; filename="attendance_shortage_{form.cleaned_data["threshold"]}.csv"'
+            return response
+
+        paginator = Paginator(rows, 100)
+        page_obj = paginator.get_page(request.GET.get('page'))
+
+    query = request.GET.copy()
+    query.pop('page', None)
+    query.pop('export', None)
+    if 'threshold' not in query:
+        query['threshold'] = settings.ATTENDANCE_SHORTAGE_THRESHOLD
+
+    context = {
+        'form': form,
+        'page_obj': page_obj,
+        'query_string': query.urlencode(),
+    }
+    return render(request, 'administrator/view_shortage_report.html', context)
+
+
 def send_absent_sms_view(request):
     if request.method == 'POST':
         selected_date = request.POST.get('selected_date')  # Assume date input in 'YYYY-MM-DD' format
@@ -1537,7 +1352,7 @@ def teacher_profile(request):
 @login_required
 def teacher_change_password(request):
     if request.method == 'POST':
-        form = PasswordChangeForm(request.user, request.POST)
+        form = AccountPasswordChangeForm(request.user, request.POST)
         if form.is_valid():
             user = form.save()
             update_session_auth_hash(request, user) 
@@ -1546,7 +1361,7 @@ def teacher_change_password(request):
         else:
             messages.error(request, 'Please correct the error below.')
     else:
-        form = PasswordChangeForm(request.user)
+        form = AccountPasswordChangeForm(request.user)
     return render(request, 'teacher/change_password.html', {
         'form': form
     })
@@ -1569,84 +1384,14 @@ def teacher_view_attendance_books(request):
 @role_required(['teacher'])
 def teacher_mark_attendance(request, pk):
     attendance_book = get_object_or_404(AttendanceBook, pk=pk)
-    students = attendance_book.students.all()
-    attendance_records = AttendanceRecord.objects.filter(attendance_book=attendance_book).order_by('date', 'session')
-
-    # Create a dictionary to organize records by date and session
-    records_by_date_session = {}
-    for record in attendance_records:
-        records_by_date_session.setdefault(record.date, {}).setdefault(record.session, {})[record.student.user.userid] = record.get_status_display
-
-    # Calculate total sessions and attendance count for each student
-    increment_value = int(attendance_book.book_type)
-    total_sessions = len(set((record.date, record.session) for record in attendance_records)) * increment_value
-
-    student_attendance = {
-        student.user.userid: {
-            'count': AttendanceRecord.objects.filter(
-                attendance_book=attendance_book,
-                student=student,
-                status=True
-            ).count() * increment_value,
-            'percentage': round(
-                (AttendanceRecord.objects.filter(
-                    attendance_book=attendance_book,
-                    student=student,
-                    status=True
-                ).count() * increment_value / total_sessions) * 100, 2) if total_sessions > 0 else 0
-        }
-        for student in students
-    }
 
     if request.method == 'POST':
-        selected_students = set(request.POST.getlist('attendance'))
+        selected_students = request.POST.getlist('attendance')
         current_date = request.POST.get('date')
         session = request.POST.get('session')
 
-        # Prepare bulk create and update data
-        update_data = []
-        create_data = []
-        
-        for student in students:
-            status = student.user.userid in selected_students
-
-            record_data = {
-                'attendance_book': attendance_book,
-                'student': student,
-                'date': current_date,
-                'session': session,
-                'status': status,
-                'count': student.attendancerecord_set.filter(status=True).count() + (increment_value if status else 0)
-            }
-            
-            if AttendanceRecord.objects.filter(
-                attendance_book=attendance_book,
-                student=student,
-                date=current_date,
-                session=session
-            ).exists():
-                # Collect data for bulk updates
-                update_data.append(AttendanceRecord(
-                    id=AttendanceRecord.objects.get(
-                        attendance_book=attendance_book,
-                        student=student,
-                        date=current_date,
-                        session=session
-                    ).id,
-                    **record_data
-                ))
-            else:
-                # Collect data for bulk creation
-                create_data.append(AttendanceRecord(**record_data))
-
         try:
-            with transaction.atomic():
-                # Perform bulk update and create operations
-                if update_data:
-                    AttendanceRecord.objects.bulk_update(update_data, ['status', 'count'])
-                if create_data:
-                    AttendanceRecord.objects.bulk_create(create_data)
-
+            mark_book_attendance(attendance_book, current_date, session, selected_students)
             messages.success(request, 'Attendance Marked Successfully')
 
         except Exception as e:
@@ -1654,13 +1399,11 @@ def teacher_mark_attendance(request, pk):
 
         return redirect('teacher_view_attendance_records', pk=pk)
 
+    matrix = get_attendance_matrix(attendance_book)
+
     return render(request, 'teacher/mark_attendance.html', {
         'attendance_book': attendance_book,
-        'students': students,
-        'attendance_records': attendance_records,
-        'records_by_date_session': records_by_date_session,
-        'student_attendance': student_attendance,
-        'total_sessions': total_sessions,
+        'matrix': matrix,
     })
 
 
@@ -1668,42 +1411,11 @@ def teacher_mark_attendance(request, pk):
 @role_required(['teacher'])
 def teacher_view_attendance_records(request, pk):
     attendance_book = get_object_or_404(AttendanceBook, pk=pk)
-    students = attendance_book.students.all()
-    attendance_records = AttendanceRecord.objects.filter(attendance_book=attendance_book).order_by('date', 'session')
-
-    # Create a dictionary to organize records by date and session
-    records_by_date_session = {}
-    for record in attendance_records:
-        if record.date not in records_by_date_session:
-            records_by_date_session[record.date] = {}
-        if record.session not in records_by_date_session[record.date]:
-            records_by_date_session[record.date][record.session] = {}
-        records_by_date_session[record.date][record.session][record.student.user.userid] = record.get_status_display
-
-    # Calculate total sessions and attendance count for each student
-    increment_value = int(attendance_book.book_type)
-    print(increment_value)
-    student_attendance = {}
-    total_sessions = len(set((record.date, record.session) for record in attendance_records))*increment_value
-    # total_sessions = (total_sessions*increment_value)
-
-    for student in students:
-        attendance_count = AttendanceRecord.objects.filter(
-            attendance_book=attendance_book, student=student, status=True
-        ).count()
-        attendance_count = (attendance_count * increment_value)
-        print(attendance_count)
-        attendance_percentage = (attendance_count / total_sessions) * 100 if total_sessions > 0 else 0
-        student_attendance[student.user.userid] = {
-            'count': attendance_count,
-            'percentage': round(attendance_percentage, 2),
-        }
+    matrix = get_attendance_matrix(attendance_book)
+
     return render(request, 'teacher/view_attendance_records.html', {
         'attendance_book': attendance_book,
-        'students': students,
-        'records_by_date_session': records_by_date_session,
-        'student_attendance': student_attendance,
-        'total_sessions':total_sessions
+        'matrix': matrix,
     })
 
 
@@ -1755,30 +1467,16 @@ def student_login(request):
 
         try:
             # Fetch the student using USN and DOB
-            student = Student.objects.get(usn=usn, dob=dob)
+            student = Student.objects.select_related('user').get(usn=usn, dob=dob)
             print(student,usn,dob)
             
-            # Retrieve all attendance books assigned to this student
-            attendance_books = student.attendancebook_set.all()
-            
-            # Calculate total, attended classes, and percentage for each book
-            attendance_data = []
-            for book in attendance_books:
-                total_classes = AttendanceRecord.objects.filter(attendance_book=book, student=student).count()
-                attended_classes = AttendanceRecord.objects.filter(attendance_book=book, student=student, status=True).count()
-                percentage = (attended_classes / total_classes) * 100 if total_classes > 0 else 0
-
-                attendance_data.append({
-                    'book': book,
-                    'total_classes': total_classes,
-                    'attended_classes': attended_classes,
-                    'percentage': round(percentage, 2),
-                })
+            # Total, attended classes, and percentage for each book assigned to this student, plus the weighted overall
+            attendance = get_student_attendance(student.pk)
             
             # Add success message
             messages.success(request, f'Welcome {student.user.fullname}, your attendance records have been loaded successfully.')
 
-            return render(request, 'student/attendance.html', {'attendance_data': attendance_data, 'student': student})
+            return render(request, 'student/attendance.html', {'attendance_data': attendance['books'], 'overall': attendance, 'student': student})
         
         except Student.DoesNotExist:
             # Add error message
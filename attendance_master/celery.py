@@ -0,0 +1,11 @@
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'attendance_master.settings')
+
+app = Celery('attendance_master')
+
+# Every CELERY_* setting in settings.py configures the app
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()